@@ -0,0 +1,342 @@
+"""Occupancy, revenue and RevPAR analytics over NumPy arrays of reservation dates.
+
+Rooms and blocking reservations are loaded once per dataset generation into
+arrays (room of each stay, first night and checkout day as days since the
+epoch). A query clips the stays to the requested range and turns them into
+daily occupied room counts with a difference array: +1 on the first night,
+-1 on the checkout day, then a cumulative sum. The cost grows with the
+number of stays and days, never with their product; revenue is the same
+sum weighted by the nightly room price.
+"""
+import asyncio
+import copy
+import os
+
+from starlette.concurrency import run_in_threadpool
+
+from .cache import generations
+from .datasets import BLOCKING_STATUSES, feed_in_threadpool, reservation_period
+from .rooms import iter_documents
+from .snapshot import engine as snapshots
+from .startup import LazyModule
+
+# Imported by the first analytics request
+np = LazyModule("numpy")
+pa = LazyModule("pyarrow")
+
+GRANULARITIES = ("day", "week", "month", "year")
+GROUPINGS = ("total", "hotel", "type")
+
+# Longest range a single query may cover
+ANALYTICS_MAX_DAYS = int(os.getenv("ANALYTICS_MAX_DAYS", str(20 * 366)))
+
+_RESERVATION_FIELDS = {
+    "_id": 0, "hotel_name": 1, "room_number": 1,
+    "start_date": 1, "end_date": 1, "check_in": 1, "check_out": 1,
+}
+
+
+def to_days(values):
+    """Parse ISO dates into days since 1970-01-01; missing or invalid dates become NaT."""
+    values = [str(value)[:10] if value else "NaT" for value in values]
+    try:
+        return np.array(values, dtype="datetime64[D]")
+    except ValueError:
+        parsed = np.empty(len(values), dtype="datetime64[D]")
+        for i, value in enumerate(values):
+            try:
+                parsed[i] = np.datetime64(value, "D")
+            except ValueError:
+                parsed[i] = np.datetime64("NaT")
+        return parsed
+
+
+class BookingArraysBuilder:
+    """Collects hotels and reservations, possibly batch by batch, into BookingArrays."""
+
+    def __init__(self):
+        self.room_index = {}
+        self.hotel_names = {}
+        self.room_types = {}
+        self.room_hotel = []
+        self.room_type = []
+        self.room_price = []
+        self.stay_room = []
+        self.starts = []
+        self.ends = []
+
+    def add_hotels(self, hotels):
+        for hotel in hotels:
+            hotel_code = self.hotel_names.setdefault(hotel.get("name"), len(self.hotel_names))
+            for room in hotel.get("rooms") or []:
+                self.room_index[(hotel.get("name"), room.get("number"))] = len(self.room_hotel)
+                self.room_hotel.append(hotel_code)
+                self.room_type.append(self.room_types.setdefault(room.get("type") or "unknown", len(self.room_types)))
+                self.room_price.append(room.get("price"))
+
+    def add_reservations(self, reservations):
+        for reservation in reservations:
+            room = self.room_index.get((reservation.get("hotel_name"), reservation.get("room_number")))
+            if room is None:
+                continue
+            start, end = reservation_period(reservation)
+            self.stay_room.append(room)
+            self.starts.append(start)
+            self.ends.append(end)
+
+    def build(self, generation, stay_room=None, starts=None, ends=None):
+        """Build the arrays; stays collected elsewhere may be given as arrays (room, datetime64 start and end)."""
+        if stay_room is None:
+            stay_room, starts, ends = np.array(self.stay_room, dtype=np.int32), to_days(self.starts), to_days(self.ends)
+        valid = ~np.isnat(starts) & ~np.isnat(ends) & (ends > starts)
+        prices = np.array([np.nan if price is None else price for price in self.room_price], dtype=np.float64)
+        return BookingArrays(
+            generation,
+            room_index=self.room_index,
+            hotel_names=list(self.hotel_names),
+            type_names=list(self.room_types),
+            room_hotel=np.array(self.room_hotel, dtype=np.int32),
+            room_type=np.array(self.room_type, dtype=np.int32),
+            room_price=np.nan_to_num(prices),
+            stay_room=stay_room[valid],
+            starts=starts[valid].astype(np.int32),
+            ends=ends[valid].astype(np.int32),
+        )
+
+
+class BookingArrays:
+    """Immutable arrays of rooms and blocking stays for one dataset generation."""
+
+    def __init__(self, generation, room_index, hotel_names, type_names, room_hotel, room_type, room_price, stay_room, starts, ends):
+        self.generation = generation
+        self.room_index = room_index
+        self.hotel_names = hotel_names
+        self.type_names = type_names
+        self.room_hotel = room_hotel
+        self.room_type = room_type
+        self.room_price = room_price
+        self.stay_room = stay_room
+        self.starts = starts
+        self.ends = ends
+
+    def with_room_changes(self, generation, changes):
+        """Return a copy for `generation` with changed room prices; all other arrays are shared."""
+        arrays = copy.copy(self)
+        arrays.generation = generation
+        arrays.room_price = self.room_price.copy()
+        for key, values in changes.items():
+            room = self.room_index.get(key)
+            if room is not None and values.get("price") is not None:
+                arrays.room_price[room] = values["price"]
+        return arrays
+
+
+def period_starts(days, granularity):
+    """Map a datetime64[D] array to the first day of the day/week/month/year containing each day."""
+    if granularity == "day":
+        return days
+    if granularity == "week":
+        # 1970-01-01 was a Thursday; ISO weeks start on Monday
+        return days - (days.astype(np.int64) + 3) % 7
+    unit = "M" if granularity == "month" else "Y"
+    return days.astype(f"datetime64[{unit}]").astype("datetime64[D]")
+
+
+def _daily_sums(group, first, last, groups, days, weights=None):
+    """Sum `weights` (or 1) per group and day over the nights [first, last) of every stay."""
+    width = days + 1
+    size = groups * width
+    total = np.bincount(group * width + first, weights, minlength=size) - np.bincount(group * width + last, weights, minlength=size)
+    return total.reshape(groups, width)[:, :days].cumsum(axis=1)
+
+
+def _metrics(occupied, available, revenue):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return {
+            "available_room_nights": available,
+            "occupied_room_nights": occupied,
+            "occupancy_rate": np.round(np.where(available > 0, occupied / available, 0.0), 4),
+            "revenue": np.round(revenue, 2),
+            "adr": np.round(np.where(occupied > 0, revenue / occupied, 0.0), 2),
+            "revpar": np.round(np.where(available > 0, revenue / available, 0.0), 2),
+        }
+
+
+def occupancy(arrays, date_from, date_to, granularity="day", group_by="total", hotel=None):
+    """Occupancy, revenue, ADR and RevPAR per period for the nights [date_from, date_to).
+
+    Rates are per group (all rooms, each hotel or each room type); `hotel`
+    restricts the computation to the rooms of one hotel.
+    """
+    first = np.datetime64(date_from, "D")
+    days = int((np.datetime64(date_to, "D") - first).astype(np.int64))
+    first_day = int(first.astype(np.int64))
+
+    # Rooms in scope and their group
+    in_scope = np.ones(len(arrays.room_hotel), dtype=bool)
+    if hotel is not None:
+        code = arrays.hotel_names.index(hotel) if hotel in arrays.hotel_names else -1
+        in_scope = arrays.room_hotel == code
+    if group_by == "hotel":
+        room_group, names = arrays.room_hotel, arrays.hotel_names
+    elif group_by == "type":
+        room_group, names = arrays.room_type, arrays.type_names
+    else:
+        room_group, names = np.zeros(len(arrays.room_hotel), dtype=np.int32), ["total"]
+    groups = len(names)
+    rooms = np.bincount(room_group[in_scope], minlength=groups)
+
+    # Stays clipped to the range, as night offsets from its first day
+    starts = np.maximum(arrays.starts, first_day) - first_day
+    ends = np.minimum(arrays.ends, first_day + days) - first_day
+    keep = (starts < ends) & in_scope[arrays.stay_room]
+    stay_room = arrays.stay_room[keep]
+    starts, ends = starts[keep].astype(np.int64), ends[keep].astype(np.int64)
+    group = room_group[stay_room].astype(np.int64)
+
+    occupied = _daily_sums(group, starts, ends, groups, days)
+    revenue = _daily_sums(group, starts, ends, groups, days, arrays.room_price[stay_room])
+
+    # Days are consecutive, so every period is one contiguous slice
+    labels = period_starts(first + np.arange(days), granularity)
+    bounds = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1]])
+    nights = np.diff(np.r_[bounds, days])
+    occupied = np.rint(np.add.reduceat(occupied, bounds, axis=1)).astype(np.int64)
+    revenue = np.add.reduceat(revenue, bounds, axis=1)
+    available = rooms[:, None] * nights[None, :]
+
+    periods = _metrics(occupied, available, revenue)
+    totals = _metrics(occupied.sum(axis=1), available.sum(axis=1), revenue.sum(axis=1))
+    period_labels = [str(label) for label in labels[bounds]]
+    period_nights = nights.tolist()
+    columns = {name: values.tolist() for name, values in periods.items()}
+    total_columns = {name: values.tolist() for name, values in totals.items()}
+
+    result = []
+    for g, name in enumerate(names):
+        if not rooms[g]:
+            continue
+        result.append({
+            "key": name,
+            "rooms": int(rooms[g]),
+            "totals": {metric: values[g] for metric, values in total_columns.items()},
+            "periods": [
+                {"period": label, "nights": period_nights[p], **{metric: values[g][p] for metric, values in columns.items()}}
+                for p, label in enumerate(period_labels)
+            ],
+        })
+    return {
+        "from": date_from.isoformat(),
+        "to": date_to.isoformat(),
+        "granularity": granularity,
+        "group_by": group_by,
+        "statuses": list(BLOCKING_STATUSES),
+        "groups": result,
+    }
+
+
+async def load_arrays(db, generation):
+    """Load rooms and blocking reservations of the live collections with narrow projections."""
+    builder = BookingArraysBuilder()
+    await feed_in_threadpool(iter_documents(db, "hotels", {"_id": 0, "name": 1, "rooms": 1}), builder.add_hotels)
+    cursor = db["reservations"].find({"status": {"$in": list(BLOCKING_STATUSES)}}, _RESERVATION_FIELDS, batch_size=10_000)
+    await feed_in_threadpool(cursor, builder.add_reservations)
+    # Converting every stay to day numbers is O(N) Python work
+    return await run_in_threadpool(builder.build, generation)
+
+
+def _snapshot_codes(snapshot, name):
+    """Dictionary values and int codes (-1 where missing) of a string field of the snapshot reservations."""
+    array, kind = snapshot.column("reservations", name)
+    if kind != "string":
+        return None
+    codes = array.indices.to_numpy(zero_copy_only=False)
+    if array.null_count:
+        codes = np.where(np.isnan(codes), -1, codes)
+    return array.dictionary.to_pylist(), codes.astype(np.int64)
+
+
+def _snapshot_days(snapshot, *names):
+    """First present date of the given fields per reservation, or None if one is not stored as dates."""
+    days = None
+    for name in names:
+        array, kind = snapshot.column("reservations", name)
+        if kind is None:
+            continue
+        if kind != "date":
+            return None
+        values = array.to_numpy(zero_copy_only=False)
+        days = values if days is None else np.where(np.isnat(days), values, days)
+    if days is None:
+        return np.full(snapshot.count("reservations"), np.datetime64("NaT"), dtype="datetime64[D]")
+    return days
+
+
+def arrays_from_snapshot(snapshot, generation):
+    """Build booking arrays from the columns of a dataset snapshot without a per-reservation loop.
+
+    Reservations are matched to rooms once per distinct (hotel, room number)
+    pair; snapshots whose reservation fields are not stored as plain strings,
+    integers and dates are read document by document instead.
+    """
+    builder = BookingArraysBuilder()
+    builder.add_hotels(snapshot.documents("hotels"))
+    hotels = _snapshot_codes(snapshot, "hotel_name")
+    statuses = _snapshot_codes(snapshot, "status")
+    numbers, kind = snapshot.column("reservations", "room_number")
+    starts = _snapshot_days(snapshot, "start_date", "check_in")
+    ends = _snapshot_days(snapshot, "end_date", "check_out")
+    if hotels is None or statuses is None or kind != "value" or numbers.null_count or not numbers.type.equals(pa.int64()) or starts is None or ends is None:
+        builder.add_reservations(
+            reservation for reservation in snapshot.documents("reservations")
+            if reservation.get("status") in BLOCKING_STATUSES
+        )
+        return builder.build(generation)
+
+    hotel_names, hotel_codes = hotels
+    status_names, status_codes = statuses
+    blocking = np.isin(status_codes, [code for code, status in enumerate(status_names) if status in BLOCKING_STATUSES])
+    # One integer per (hotel, room number) pair
+    numbers = numbers.to_numpy()
+    low = int(numbers.min()) if len(numbers) else 0
+    width = int(numbers.max()) - low + 1 if len(numbers) else 1
+    pairs, pair_of_stay = np.unique((hotel_codes + 1) * width + (numbers - low), return_inverse=True)
+    pair_room = np.array(
+        [builder.room_index.get((hotel_names[pair // width - 1] if pair >= width else None, pair % width + low), -1) for pair in pairs.tolist()],
+        dtype=np.int32,
+    )
+    stay_room = pair_room[pair_of_stay.reshape(-1)] if len(pair_room) else np.empty(0, dtype=np.int32)
+    keep = blocking & (stay_room >= 0)
+    return builder.build(generation, stay_room[keep], starts[keep], ends[keep])
+
+
+async def load_snapshot_arrays(db, generation):
+    """Booking arrays from the shared snapshot of `generation`, or None while it is not available."""
+    snapshot = await snapshots.get(db)
+    if snapshot is None or snapshot.generation != generation:
+        return None
+    return await run_in_threadpool(arrays_from_snapshot, snapshot, generation)
+
+
+class AnalyticsEngine:
+    """Per-worker holder of the booking arrays, reloaded when the dataset generation changes."""
+
+    def __init__(self):
+        self.arrays = None
+        self._lock = asyncio.Lock()
+
+    async def get_arrays(self, db):
+        generation = await generations.get(db)
+        if self.arrays is None or self.arrays.generation != generation:
+            async with self._lock:
+                if self.arrays is None or self.arrays.generation != generation:
+                    self.arrays = await load_snapshot_arrays(db, generation) or await load_arrays(db, generation)
+        return self.arrays
+
+    def apply_room_changes(self, previous, generation, changes):
+        """Carry the arrays of generation `previous` over to one that only changed room fields."""
+        if self.arrays is not None and self.arrays.generation == previous:
+            self.arrays = self.arrays.with_room_changes(generation, changes)
+
+
+engine = AnalyticsEngine()
@@ -0,0 +1,71 @@
+"""Streamed ZIP export of the live collections, compressed member by member as it is written."""
+import io
+import zipfile
+
+from starlette.concurrency import run_in_threadpool
+
+from .exporters import SECTION_RENDERERS
+from .pagination import STREAM_BATCH_SIZE
+from .snapshot import iter_section
+
+
+class ZipStream(io.RawIOBase):
+    """Write-only, unseekable sink collecting what ZipFile writes until it is drained."""
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _write(member, sink, render, *args):
+    text = render(*args)
+    if text:
+        member.write(text.encode("utf-8"))
+    return sink.drain()
+
+
+async def iter_zip_export(db, sections, format, batch_size=STREAM_BATCH_SIZE):
+    """Yield a ZIP archive with one `<section>.<format>` member per section.
+
+    Documents are read in batches from Mongo cursors, or from the dataset
+    snapshot in read-replica mode; rendering and deflate run in a worker
+    thread and only compressed bytes are kept between yields.
+    """
+    sink = ZipStream()
+    archive = zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED)
+    for section in sections:
+        renderer = SECTION_RENDERERS[format](section)
+        # The size is unknown up front, so members may need ZIP64 headers
+        member = archive.open(f"{section}.{renderer.extension}", "w", force_zip64=True)
+        chunks = [await run_in_threadpool(_write, member, sink, renderer.header)]
+
+        batch = []
+        async for document in iter_section(db, section, batch_size):
+            batch.append(document)
+            if len(batch) >= batch_size:
+                chunks.append(await run_in_threadpool(_write, member, sink, renderer.rows, batch))
+                batch = []
+                # Deflate buffers internally, so a batch may not produce output yet
+                if any(chunks):
+                    yield b"".join(chunks)
+                    chunks = []
+        if batch:
+            chunks.append(await run_in_threadpool(_write, member, sink, renderer.rows, batch))
+        chunks.append(await run_in_threadpool(_write, member, sink, renderer.footer))
+        member.close()
+        chunks.append(sink.drain())
+        yield b"".join(chunks)
+    archive.close()
+    yield sink.drain()
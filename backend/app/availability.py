@@ -0,0 +1,164 @@
+"""Date-range room availability backed by per-room interval indexes."""
+import asyncio
+from array import array
+from bisect import bisect_left
+from datetime import date
+
+from starlette.concurrency import run_in_threadpool
+
+from .cache import generations
+from .datasets import BLOCKING_STATUSES, feed_in_threadpool, reservation_period
+from .rooms import iter_documents
+
+_RESERVATION_FIELDS = {
+    "_id": 0, "hotel_name": 1, "room_number": 1, "status": 1,
+    "start_date": 1, "end_date": 1, "check_in": 1, "check_out": 1,
+}
+
+
+def to_day(value):
+    """Convert an ISO date string or date to a proleptic ordinal day number."""
+    if isinstance(value, date):
+        return value.toordinal()
+    return date.fromisoformat(str(value)[:10]).toordinal()
+
+
+class RoomIntervals:
+    """Reservations of one room as half-open [start, end) day intervals sorted by start.
+
+    `max_end[i]` is the latest end among the first i + 1 intervals, so an
+    overlap test is one binary search regardless of how many bookings exist.
+    """
+
+    __slots__ = ("starts", "max_end")
+
+    def __init__(self, intervals):
+        intervals.sort()
+        self.starts = array("i", (start for start, _ in intervals))
+        self.max_end = array("i")
+        latest = 0
+        for _, end in intervals:
+            latest = max(latest, end)
+            self.max_end.append(latest)
+
+    def is_free(self, start, end):
+        count = bisect_left(self.starts, end)
+        return count == 0 or self.max_end[count - 1] <= start
+
+
+class IndexBuilder:
+    """Collects hotels and reservations, possibly batch by batch, into an AvailabilityIndex."""
+
+    def __init__(self):
+        self.rooms = []
+        self.intervals = {}
+
+    def add_hotels(self, hotels):
+        for hotel in hotels:
+            for room in hotel.get("rooms", []):
+                self.rooms.append({
+                    "hotel_name": hotel.get("name"),
+                    "location": hotel.get("location"),
+                    "stars": hotel.get("stars"),
+                    "room_number": room.get("number"),
+                    "type": room.get("type"),
+                    "price": room.get("price"),
+                    "available": room.get("available"),
+                })
+
+    def add_reservations(self, reservations):
+        for reservation in reservations:
+            if reservation.get("status") not in BLOCKING_STATUSES:
+                continue
+            start, end = reservation_period(reservation)
+            try:
+                interval = (to_day(start), to_day(end))
+            except (TypeError, ValueError):
+                continue
+            key = (reservation.get("hotel_name"), reservation.get("room_number"))
+            self.intervals.setdefault(key, []).append(interval)
+
+    def build(self, generation):
+        intervals = {key: RoomIntervals(value) for key, value in self.intervals.items()}
+        return AvailabilityIndex(generation, self.rooms, intervals)
+
+
+class AvailabilityIndex:
+    """Immutable snapshot of room metadata and reservation intervals for one dataset generation."""
+
+    def __init__(self, generation, rooms, intervals):
+        self.generation = generation
+        self.rooms = rooms
+        self.intervals = intervals
+        self.rooms_by_hotel = {}
+        for room in rooms:
+            self.rooms_by_hotel.setdefault(room["hotel_name"], []).append(room)
+
+    def free_rooms(self, start, end, hotel=None, room_type=None, max_price=None):
+        """Return available rooms with no blocking reservation overlapping the nights [start, end).
+
+        Rooms marked `available: false` are out of service and never free.
+        """
+        start, end = to_day(start), to_day(end)
+        rooms = self.rooms if hotel is None else self.rooms_by_hotel.get(hotel, [])
+        result = []
+        for room in rooms:
+            if not room["available"]:
+                continue
+            if room_type is not None and room["type"] != room_type:
+                continue
+            if max_price is not None and (room["price"] is None or room["price"] > max_price):
+                continue
+            booked = self.intervals.get((room["hotel_name"], room["room_number"]))
+            if booked is None or booked.is_free(start, end):
+                result.append(room)
+        return result
+
+    def with_room_changes(self, generation, changes):
+        """Return a copy for `generation` with changed room fields; reservations are shared."""
+        rooms = []
+        for room in self.rooms:
+            values = changes.get((room["hotel_name"], room["room_number"]))
+            rooms.append(dict(room, **values) if values else room)
+        return AvailabilityIndex(generation, rooms, self.intervals)
+
+
+async def build_index(db, generation):
+    """Build an index for the live collections by streaming them with narrow projections.
+
+    The documents are added and the index is built in worker threads.
+    """
+    builder = IndexBuilder()
+    hotels = iter_documents(db, "hotels", {"_id": 0, "name": 1, "location": 1, "stars": 1, "rooms": 1})
+    await feed_in_threadpool(hotels, builder.add_hotels)
+    cursor = db["reservations"].find({"status": {"$in": list(BLOCKING_STATUSES)}}, _RESERVATION_FIELDS, batch_size=10_000)
+    await feed_in_threadpool(cursor, builder.add_reservations)
+    return await run_in_threadpool(builder.build, generation)
+
+
+class AvailabilityEngine:
+    """Per-worker holder of the current index, rebuilt when the dataset generation changes."""
+
+    def __init__(self):
+        self.index = None
+        self._lock = asyncio.Lock()
+
+    def publish(self, index):
+        """Install an index built during an import in this worker."""
+        self.index = index
+
+    def apply_room_changes(self, previous, generation, changes):
+        """Carry the index of generation `previous` over to one that only changed room fields."""
+        if self.index is not None and self.index.generation == previous:
+            self.index = self.index.with_room_changes(generation, changes)
+
+    async def get_index(self, db):
+        generation = await generations.get(db)
+        if self.index is None or self.index.generation != generation:
+            async with self._lock:
+                if self.index is None or self.index.generation != generation:
+                    self.index = await build_index(db, generation)
+        return self.index
+
+
+engine = AvailabilityEngine()
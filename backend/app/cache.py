@@ -0,0 +1,194 @@
+"""In-process response cache for read endpoints, keyed by dataset generation."""
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+
+from fastapi import Response
+from starlette.concurrency import run_in_threadpool
+
+from .compression import COMPRESSION_MIN_BYTES, compress, negotiate
+from .datasets import DatasetView, live_dataset
+from .metrics import span
+from .responses import dumps
+
+# Total size of cached response bodies per worker
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# How long a worker trusts its last look at the dataset generation
+GENERATION_TTL = float(os.getenv("GENERATION_TTL", "1.0"))
+
+
+class GenerationTracker:
+    """Remembers the live dataset, re-reading its pointer at most every `ttl` seconds.
+
+    The live dataset is a `DatasetView` pinned to one generation and the
+    collections storing it. Imports and rollbacks done by this worker refresh
+    it immediately; changes made by other workers or scripts are picked up
+    within `ttl`.
+    """
+
+    def __init__(self, ttl=GENERATION_TTL):
+        self.ttl = ttl
+        self.live = None
+        self.checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    @property
+    def generation(self):
+        return self.live.generation if self.live is not None else None
+
+    def set(self, live, unaffected=()):
+        """Switch to the `live` dataset; cached responses of the `unaffected` paths stay valid for it."""
+        self.live = live
+        self.checked_at = time.monotonic()
+        if unaffected:
+            cache.carry_over(live.generation, unaffected)
+        cache.discard_older(live.generation)
+
+    async def refresh(self, db, unaffected=()):
+        """Re-read the live dataset now, after this worker changed it."""
+        self.set(await live_dataset(db), unaffected)
+        return self.live
+
+    async def resolve(self, db):
+        """The live dataset, as a view every read of one request goes through."""
+        if self.live is None or time.monotonic() - self.checked_at > self.ttl:
+            async with self._lock:
+                if self.live is None or time.monotonic() - self.checked_at > self.ttl:
+                    self.set(await live_dataset(db))
+        return self.live
+
+    async def get(self, db):
+        """The generation `db` reads: the one a resolved view is pinned to, else the live one."""
+        if isinstance(db, DatasetView) and db.generation is not None:
+            return db.generation
+        return (await self.resolve(db)).generation
+
+
+class CachedResponse:
+    """A serialized body and its compressed variants, each compressed once on first request."""
+
+    __slots__ = ("body", "etag", "media_type", "generation", "encoded")
+
+    def __init__(self, body, etag, media_type, generation):
+        self.body = body
+        self.etag = etag
+        self.media_type = media_type
+        self.generation = generation
+        self.encoded = {}
+
+    @property
+    def size(self):
+        return len(self.body) + sum(len(body) for body in self.encoded.values())
+
+    def encoding_for(self, request):
+        """The content encoding to answer `request` with, None for the plain body."""
+        if len(self.body) < COMPRESSION_MIN_BYTES:
+            return None
+        return negotiate(request.headers.get("accept-encoding"))
+
+    def to_response(self, request, encoding=None):
+        # Every representation has its own validator
+        etag = self.etag if encoding is None else f'{self.etag[:-1]}-{encoding}"'
+        headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+        if encoding is None:
+            return Response(content=self.body, media_type=self.media_type, headers=headers)
+        headers["Content-Encoding"] = encoding
+        return Response(content=self.encoded[encoding], media_type=self.media_type, headers=headers)
+
+
+class ResponseCache:
+    """LRU of pre-serialized response bodies bounded by their total size in bytes."""
+
+    def __init__(self, max_bytes=CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(request, generation):
+        params = sorted(request.query_params.multi_items())
+        return (request.url.path, tuple(params), generation)
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    @staticmethod
+    def make_entry(key, body, media_type="application/json"):
+        digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()[:16]
+        return CachedResponse(body, f'"g{key[-1]}-{digest}"', media_type, key[-1])
+
+    def put(self, key, body, media_type="application/json"):
+        entry = self.make_entry(key, body, media_type)
+        if len(body) > self.max_bytes:
+            return entry
+        if key in self.entries:
+            self.size -= self.entries.pop(key).size
+        self.entries[key] = entry
+        self.grow(entry.size)
+        return entry
+
+    def grow(self, amount):
+        """Account for `amount` more bytes of cached bodies, evicting the least recently used."""
+        self.size += amount
+        while self.size > self.max_bytes and self.entries:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= evicted.size
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+
+    def carry_over(self, generation, paths):
+        """Re-key cached responses of `paths` to `generation`; their content did not change."""
+        for key in [key for key in self.entries if key[0] in paths and key[-1] != generation]:
+            entry = self.entries.pop(key)
+            entry.generation = generation
+            self.entries[key[:-1] + (generation,)] = entry
+
+    def discard_older(self, generation):
+        for key in [key for key, entry in self.entries.items() if entry.generation != generation]:
+            self.size -= self.entries.pop(key).size
+
+
+cache = ResponseCache()
+generations = GenerationTracker()
+
+
+async def cached_json(request, db, build):
+    """Serve the JSON produced by awaiting `build()` from the cache of the generation `db` reads.
+
+    The body is serialized once per generation and compressed once per
+    encoding clients ask for; later requests are answered from the cached bytes.
+    """
+    generation = await generations.get(db)
+    key = cache.key(request, generation)
+    entry = cache.get(key)
+    if entry is None:
+        content = await build()
+        with span("serialize"):
+            body = dumps(content)
+        # A request still reading a replaced generation answers without caching for it
+        entry = cache.put(key, body) if generation == generations.generation else cache.make_entry(key, body)
+    encoding = entry.encoding_for(request)
+    if encoding is not None and encoding not in entry.encoded:
+        with span("compress"):
+            encoded = await run_in_threadpool(compress, entry.body, encoding)
+        # A concurrent request may have compressed it first
+        if encoding not in entry.encoded:
+            entry.encoded[encoding] = encoded
+            if cache.entries.get(key) is entry:
+                cache.grow(len(encoded))
+    return entry.to_response(request, encoding)
@@ -0,0 +1,172 @@
+"""Columnar (Arrow IPC / Parquet) export of rooms, guests and reservations.
+
+Tables are built from Mongo cursors in record batches with typed columns, so
+only one batch of rows is held in memory. Arrow IPC files are written
+uncompressed and can be memory-mapped for zero-copy loading (`read_table`).
+"""
+import asyncio
+import os
+from datetime import date
+from functools import lru_cache
+
+from .datasets import reservation_period
+from .rooms import iter_documents
+from .startup import LazyModule
+
+# Imported by the first columnar export
+pa = LazyModule("pyarrow")
+pq = LazyModule("pyarrow.parquet")
+
+# Rows per record batch (and Parquet row group)
+COLUMNAR_BATCH_SIZE = int(os.getenv("COLUMNAR_BATCH_SIZE", "65536"))
+
+FORMATS = {"arrow": ".arrow", "parquet": ".parquet"}
+
+TABLES = ("rooms", "guests", "reservations")
+
+
+@lru_cache(maxsize=None)
+def get_schema(table):
+    """Arrow schema of a table, built once pyarrow is needed."""
+    schemas = {
+        "rooms": pa.schema([
+            ("hotel_name", pa.string()),
+            ("location", pa.string()),
+            ("stars", pa.int8()),
+            ("room_number", pa.int32()),
+            ("type", pa.string()),
+            ("price", pa.float64()),
+            ("available", pa.bool_()),
+        ]),
+        "guests": pa.schema([
+            ("first_name", pa.string()),
+            ("last_name", pa.string()),
+            ("email", pa.string()),
+            ("phone", pa.string()),
+        ]),
+        "reservations": pa.schema([
+            ("guest_email", pa.string()),
+            ("hotel_name", pa.string()),
+            ("room_number", pa.int32()),
+            ("start_date", pa.date32()),
+            ("end_date", pa.date32()),
+            ("status", pa.string()),
+        ]),
+    }
+    return schemas[table]
+
+
+def _to_date(value):
+    try:
+        return date.fromisoformat(str(value)[:10]) if value else None
+    except ValueError:
+        return None
+
+
+def _room_rows(hotel):
+    for room in hotel.get("rooms") or []:
+        yield {
+            "hotel_name": hotel.get("name"),
+            "location": hotel.get("location"),
+            "stars": hotel.get("stars"),
+            "room_number": room.get("number"),
+            "type": room.get("type"),
+            "price": room.get("price"),
+            "available": room.get("available"),
+        }
+
+
+def _guest_rows(guest):
+    yield guest
+
+
+def _reservation_rows(reservation):
+    start, end = reservation_period(reservation)
+    yield {
+        "guest_email": reservation.get("guest_email"),
+        "hotel_name": reservation.get("hotel_name"),
+        "room_number": reservation.get("room_number"),
+        "start_date": _to_date(start),
+        "end_date": _to_date(end),
+        "status": reservation.get("status"),
+    }
+
+
+# Source collection and row builder of each table
+_SOURCES = {
+    "rooms": ("hotels", _room_rows),
+    "guests": ("guests", _guest_rows),
+    "reservations": ("reservations", _reservation_rows),
+}
+
+
+class BatchBuilder:
+    """Collects rows into typed column lists and cuts them into record batches."""
+
+    def __init__(self, table):
+        self.schema = get_schema(table)
+        self.columns = {name: [] for name in self.schema.names}
+        self.size = 0
+
+    def add(self, row):
+        for name, values in self.columns.items():
+            values.append(row.get(name))
+        self.size += 1
+
+    def flush(self):
+        batch = pa.RecordBatch.from_pydict(self.columns, schema=self.schema)
+        self.columns = {name: [] for name in self.schema.names}
+        self.size = 0
+        return batch
+
+
+async def iter_record_batches(db, table, batch_size=COLUMNAR_BATCH_SIZE):
+    """Yield record batches of a table read from its collection with an async cursor."""
+    collection, rows = _SOURCES[table]
+    builder = BatchBuilder(table)
+    async for document in iter_documents(db, collection, {"_id": 0}, min(batch_size, 10_000)):
+        for row in rows(document):
+            builder.add(row)
+        if builder.size >= batch_size:
+            yield builder.flush()
+    if builder.size:
+        yield builder.flush()
+
+
+def open_writer(sink, table, format="arrow"):
+    """Open an Arrow IPC file or Parquet writer for a table on a path or file object."""
+    schema = get_schema(table)
+    if format == "parquet":
+        return pq.ParquetWriter(sink, schema)
+    return pa.ipc.new_file(sink, schema)
+
+
+async def write_table(db, table, sink, format="arrow"):
+    """Write one table to `sink` batch by batch; return the number of rows."""
+    writer = open_writer(sink, table, format)
+    rows = 0
+    try:
+        async for batch in iter_record_batches(db, table):
+            # Encoding and compression run in a worker thread
+            await asyncio.to_thread(writer.write_batch, batch)
+            rows += batch.num_rows
+    finally:
+        writer.close()
+    return rows
+
+
+async def export_tables(db, directory, format="arrow", tables=TABLES):
+    """Write every table to `<directory>/<table>.<format>`; return {table: (path, rows)}."""
+    os.makedirs(directory, exist_ok=True)
+    written = {}
+    for table in tables:
+        path = os.path.join(directory, table + FORMATS[format])
+        written[table] = (path, await write_table(db, table, path, format))
+    return written
+
+
+def read_table(path):
+    """Load an exported table; Arrow IPC files are memory-mapped without copying."""
+    if path.endswith(FORMATS["parquet"]):
+        return pq.read_table(path, memory_map=True)
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
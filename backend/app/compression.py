@@ -0,0 +1,145 @@
+"""Response compression negotiated from `Accept-Encoding` (gzip or deflate).
+
+Whole bodies below `COMPRESSION_MIN_BYTES` are sent as they are. Streamed
+bodies (NDJSON, CSV/HTML conversions, job downloads) are compressed chunk by
+chunk, so nothing is buffered beyond what zlib holds. Every response that
+could be compressed carries `Vary: Accept-Encoding`, whether or not this one
+was, so shared caches keep the representations apart. Formats that are
+already compressed (ZIP exports, Parquet) and responses that carry their own
+`Content-Encoding`, such as pre-compressed cached bodies, pass through.
+"""
+import os
+import zlib
+
+# Smallest whole body worth compressing
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+
+# zlib level: 1 is fastest, 9 smallest
+COMPRESSION_LEVEL = int(os.getenv("COMPRESSION_LEVEL", "6"))
+
+# Preferred first when the client accepts several with the same weight
+ENCODINGS = ("gzip", "deflate")
+
+_WBITS = {"gzip": 31, "deflate": 15}
+
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/x-ndjson",
+    "application/yaml",
+    "text/",
+)
+
+
+def negotiate(accept_encoding):
+    """Pick the encoding with the highest non-zero weight in an `Accept-Encoding` header, or None."""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name.strip().lower()] = weight
+    best, best_weight = None, 0.0
+    for encoding in ENCODINGS:
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+def compressor(encoding, level=COMPRESSION_LEVEL):
+    return zlib.compressobj(level, zlib.DEFLATED, _WBITS[encoding])
+
+
+def compress(body, encoding, level=COMPRESSION_LEVEL):
+    """Compress a whole body with `encoding`."""
+    engine = compressor(encoding, level)
+    return engine.compress(body) + engine.flush()
+
+
+def is_compressible(media_type):
+    return media_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def vary_on_encoding(headers):
+    """Raw response headers with `Accept-Encoding` listed in `Vary`, merged into an existing one."""
+    headers = list(headers)
+    for position, (name, value) in enumerate(headers):
+        if name.lower() == b"vary":
+            listed = {token.strip().lower() for token in value.decode("latin-1").split(",")}
+            if not listed & {"accept-encoding", "*"}:
+                headers[position] = (name, value + b", Accept-Encoding")
+            return headers
+    return headers + [(b"vary", b"Accept-Encoding")]
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing response bodies with the encoding the client accepts."""
+
+    def __init__(self, app, minimum_size=COMPRESSION_MIN_BYTES, level=COMPRESSION_LEVEL):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.level = level
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        encoding = negotiate(headers.get(b"accept-encoding", b"").decode("latin-1"))
+
+        state = {"start": None, "engine": None, "passthrough": False}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                response_headers = dict(message.get("headers", []))
+                media_type = response_headers.get(b"content-type", b"").decode("latin-1")
+                if b"content-encoding" in response_headers or not is_compressible(media_type):
+                    state["passthrough"] = True
+                    await send(message)
+                elif encoding is None:
+                    state["passthrough"] = True
+                    await send({**message, "headers": vary_on_encoding(message.get("headers", []))})
+                else:
+                    # Held until the first body chunk tells whether it is worth compressing
+                    state["start"] = message
+                return
+            if message["type"] != "http.response.body" or state["passthrough"]:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            start = state["start"]
+            if start is not None:
+                state["start"] = None
+                if not more_body and len(body) < self.minimum_size:
+                    state["passthrough"] = True
+                    await send({**start, "headers": vary_on_encoding(start.get("headers", []))})
+                    await send(message)
+                    return
+                state["engine"] = compressor(encoding, self.level)
+                response_headers = [(name, value) for name, value in start.get("headers", []) if name != b"content-length"]
+                response_headers = vary_on_encoding(response_headers) + [(b"content-encoding", encoding.encode("latin-1"))]
+                if not more_body:
+                    body = state["engine"].compress(body) + state["engine"].flush()
+                    response_headers.append((b"content-length", str(len(body)).encode("latin-1")))
+                    await send({**start, "headers": response_headers})
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                await send({**start, "headers": response_headers})
+
+            engine = state["engine"]
+            chunk = engine.compress(body)
+            if not more_body:
+                chunk += engine.flush()
+            if chunk or not more_body:
+                await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,166 @@
+"""Referential and double-booking checks for reservations, vectorized with pandas."""
+import os
+
+from .datasets import BLOCKING_STATUSES, reservation_period
+from .startup import LazyModule
+
+# Imported by the first upload that runs the checks
+np = LazyModule("numpy")
+pd = LazyModule("pandas")
+
+QUARANTINE_COLLECTION = "reservations_quarantine"
+
+# Entries listed per check in API responses; counts are always complete
+CONFLICT_REPORT_LIMIT = int(os.getenv("CONFLICT_REPORT_LIMIT", "100"))
+
+
+class ConflictChecker:
+    """Collects the columns needed for the checks, possibly batch by batch, then runs them at once.
+
+    Reservations are identified by their position in the input; their
+    `id_field` (the Mongo `_id` by default), when present, is carried along so
+    rows can be quarantined. Guests repeating an earlier email are reported by
+    their position among the guests and kept out of the import, as the unique
+    email index would reject them.
+    """
+
+    def __init__(self, id_field="_id"):
+        self.id_field = id_field
+        self.guest_emails = set()
+        self.guest_count = 0
+        self.duplicate_guests = []
+        self.hotel_names = set()
+        self.rooms = set()
+        self.columns = {name: [] for name in ("id", "guest_email", "hotel_name", "room_number", "start", "end", "status")}
+
+    def add_hotels(self, hotels):
+        for hotel in hotels:
+            self.hotel_names.add(hotel.get("name"))
+            for room in hotel.get("rooms", []):
+                self.rooms.add((hotel.get("name"), room.get("number")))
+
+    def add_guests(self, guests):
+        """Record a batch of guests; returns those whose email was not seen before."""
+        unique = []
+        for guest in guests:
+            email = guest.get("email")
+            if email in self.guest_emails:
+                self.duplicate_guests.append({"index": self.guest_count, "email": email})
+            else:
+                self.guest_emails.add(email)
+                unique.append(guest)
+            self.guest_count += 1
+        return unique
+
+    def add_reservations(self, reservations):
+        columns = self.columns
+        for reservation in reservations:
+            start, end = reservation_period(reservation)
+            columns["id"].append(reservation.get(self.id_field))
+            columns["guest_email"].append(reservation.get("guest_email"))
+            columns["hotel_name"].append(reservation.get("hotel_name"))
+            columns["room_number"].append(reservation.get("room_number"))
+            columns["start"].append(start)
+            columns["end"].append(end)
+            columns["status"].append(reservation.get("status"))
+
+    def check(self):
+        """Return a conflict report; every entry names the offending reservation by `index`."""
+        df = pd.DataFrame({k: v for k, v in self.columns.items() if k != "id"})
+        df["index"] = np.arange(len(df))
+        report = {
+            "unknown_guest": _rows(df, ~df["guest_email"].isin(self.guest_emails), ["guest_email"]),
+            "unknown_hotel": _rows(df, ~df["hotel_name"].isin(self.hotel_names), ["hotel_name"]),
+            "unknown_room": [],
+            "invalid_dates": [],
+            "overlaps": [],
+        }
+        if df.empty:
+            report["duplicate_guest"] = self.duplicate_guests
+            report["total"] = len(self.duplicate_guests)
+            return report
+
+        known_hotel = df["hotel_name"].isin(self.hotel_names)
+        room_keys = pd.MultiIndex.from_frame(df[["hotel_name", "room_number"]])
+        known_room = room_keys.isin(list(self.rooms)) if self.rooms else np.zeros(len(df), dtype=bool)
+        report["unknown_room"] = _rows(df, known_hotel & ~known_room, ["hotel_name", "room_number"])
+
+        df["start_day"] = _to_days(df["start"])
+        df["end_day"] = _to_days(df["end"])
+        invalid = df["start_day"].isna() | df["end_day"].isna() | (df["end_day"] <= df["start_day"])
+        report["invalid_dates"] = _rows(df, invalid, ["start", "end"])
+
+        report["overlaps"] = _overlaps(df[~invalid & df["status"].isin(BLOCKING_STATUSES)])
+        report["duplicate_guest"] = self.duplicate_guests
+        report["total"] = sum(len(entries) for entries in report.values())
+        return report
+
+    def offending(self, report):
+        """Map the id of every reservation named in a report to the checks it failed."""
+        reasons = {}
+        for check, entries in report.items():
+            if isinstance(entries, list) and check != "duplicate_guest":
+                for entry in entries:
+                    reasons.setdefault(self.columns["id"][entry["index"]], []).append(check)
+        return reasons
+
+
+def _to_days(values):
+    return pd.to_datetime(values.astype("string").str.slice(0, 10), format="%Y-%m-%d", errors="coerce")
+
+
+def _rows(df, mask, fields):
+    return df.loc[mask, ["index", *fields]].to_dict("records")
+
+
+def _overlaps(df):
+    """Sort-and-sweep per room: a booking conflicts if it starts before the latest end seen so far.
+
+    The partner reported is the earlier booking holding that latest end.
+    """
+    if df.empty:
+        return []
+    df = df.sort_values(["hotel_name", "room_number", "start_day", "end_day"], kind="mergesort")
+    keys = [df["hotel_name"], df["room_number"]]
+    running_end = df.groupby(keys, sort=False)["end_day"].cummax()
+    previous_end = running_end.groupby(keys, sort=False).shift()
+    holder = df["index"].where(df["end_day"] == running_end).groupby(keys, sort=False).ffill()
+    previous_holder = holder.groupby(keys, sort=False).shift()
+
+    clash = df["start_day"] < previous_end
+    overlaps = df.loc[clash, ["index", "hotel_name", "room_number", "start", "end"]].copy()
+    overlaps["conflicts_with"] = previous_holder[clash].astype("int64")
+    return overlaps.to_dict("records")
+
+
+def find_conflicts(data):
+    """Run all checks on a loaded dataset with `hotels`, `guests` and `reservations` lists."""
+    checker = ConflictChecker()
+    checker.add_hotels(data.get("hotels") or [])
+    checker.add_guests(data.get("guests") or [])
+    checker.add_reservations(data.get("reservations") or [])
+    return checker.check()
+
+
+def summarize(report, limit=CONFLICT_REPORT_LIMIT):
+    """Shorten a report to per-check counts and the first `limit` entries."""
+    summary = {"total": report["total"]}
+    for check, entries in report.items():
+        if isinstance(entries, list):
+            summary[check] = {"count": len(entries), "items": entries[:limit]}
+    return summary
+
+
+async def quarantine_reservations(db, reservations, reasons, generation, chunk_size=1000):
+    """Move offending reservations from a staging collection into the quarantine collection."""
+    quarantine = db[QUARANTINE_COLLECTION]
+    ids = list(reasons)
+    for start in range(0, len(ids), chunk_size):
+        chunk = ids[start:start + chunk_size]
+        documents = await reservations.find({"_id": {"$in": chunk}}).to_list(None)
+        for document in documents:
+            document["quarantine"] = {"generation": generation, "reasons": reasons[document["_id"]]}
+        if documents:
+            await quarantine.insert_many(documents, ordered=False)
+        await reservations.delete_many({"_id": {"$in": chunk}})
+    return len(ids)
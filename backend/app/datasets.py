@@ -0,0 +1,346 @@
+"""Generation-based staging and atomic promotion of the hotel dataset.
+
+An import writes into `<section>__staging_<generation>` collections. Once it
+is complete they are renamed to `<section>__gen_<generation>`, which readers
+do not look at yet, and a single write of the `current` document in
+`dataset_meta` switches every collection over at once: readers resolve the
+dataset collections through that pointer (see `DatasetView`), so they never
+see a half-loaded or missing collection, nor hotels of one generation with
+reservations of another. The replaced generation stays in place for rollback,
+which is the same one-document switch back, until it is garbage-collected.
+Before the first staged import the live data is in the unversioned
+collections (`hotels`, `guests`, ...).
+"""
+import os
+import re
+import time
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ReturnDocument
+from starlette.concurrency import run_in_threadpool
+
+SECTIONS = ("hotels", "guests", "reservations")
+
+# Rooms stored apart from their hotels (normalized layout, see rooms.py) and the
+# per-hotel statistics (see stats.py) are staged with them
+ROOMS_COLLECTION = "rooms"
+STATS_COLLECTION = "stats"
+COLLECTIONS = SECTIONS + (ROOMS_COLLECTION, STATS_COLLECTION)
+
+META_COLLECTION = "dataset_meta"
+
+# Number of replaced generations kept around for rollback
+KEEP_GENERATIONS = int(os.getenv("KEEP_GENERATIONS", "1"))
+
+# Reservations with these statuses hold their room: they count as double bookings,
+# make it unavailable and are booked room-nights in the analytics
+BLOCKING_STATUSES = ("confirmed", "pending")
+
+# Staging collections of an import that has not renewed its lease for this long are abandoned
+IMPORT_LEASE_SECONDS = float(os.getenv("IMPORT_LEASE_SECONDS", "3600"))
+
+# Natural key and content hash stored with every document for delta imports (see delta.py)
+KEY_FIELD = "_key"
+HASH_FIELD = "_hash"
+
+# Projection hiding the bookkeeping fields from API responses and exports
+PUBLIC_PROJECTION = {"_id": 0, KEY_FIELD: 0, HASH_FIELD: 0}
+
+_GENERATION_NAME = re.compile(r"^(?P<section>\w+?)__(?P<kind>gen|staging)_(?P<generation>\d+)$")
+
+
+def reservation_period(reservation):
+    """Return the (start, end) ISO dates of a reservation.
+
+    Feeds use either `start_date`/`end_date` or the older `check_in`/`check_out`.
+    """
+    start = reservation.get("start_date") or reservation.get("check_in")
+    end = reservation.get("end_date") or reservation.get("check_out")
+    return start, end
+
+
+async def feed_in_threadpool(documents, add, batch_size=10_000):
+    """Pass the documents of an async iterator to `add` in lists of `batch_size`, each call in a worker thread.
+
+    Keeps the per-document work of in-memory index builders off the event loop.
+    """
+    batch = []
+    async for document in documents:
+        batch.append(document)
+        if len(batch) >= batch_size:
+            await run_in_threadpool(add, batch)
+            batch = []
+    if batch:
+        await run_in_threadpool(add, batch)
+
+
+def lease_id(generation):
+    return f"import_{generation}"
+
+
+def staging_name(section, generation):
+    return f"{section}__staging_{generation}"
+
+
+def archive_name(section, generation):
+    return f"{section}__gen_{generation}"
+
+
+def collection_name(section, storage):
+    """Name of the collection holding `section` of the generation stored under `storage`.
+
+    `None` stands for the unversioned collections used before the first staged import.
+    """
+    return section if storage is None else archive_name(section, storage)
+
+
+class DatasetView:
+    """A database whose dataset collections resolve to those of one stored generation.
+
+    `view["hotels"]` is the hotels collection of that generation; every other
+    name and attribute is passed through to the database. `generation` is the
+    dataset generation the view was resolved for (None for staging views).
+    """
+
+    def __init__(self, database, names, storage=None, generation=None):
+        self.database = database
+        self.names = names
+        self.storage = storage
+        self.generation = generation
+
+    def __getitem__(self, name):
+        return self.database[self.names.get(name, name)]
+
+    def __getattr__(self, name):
+        return getattr(self.database, name)
+
+
+def unwrap(db):
+    """The database behind a `DatasetView`, or `db` itself."""
+    return db.database if isinstance(db, DatasetView) else db
+
+
+def dataset_view(db, storage, generation=None):
+    names = {section: collection_name(section, storage) for section in COLLECTIONS}
+    return DatasetView(unwrap(db), names, storage, generation)
+
+
+def staging_view(db, generation):
+    names = {section: staging_name(section, generation) for section in COLLECTIONS}
+    return DatasetView(unwrap(db), names)
+
+
+async def read_current(db):
+    """The `current` pointer document of `dataset_meta` ({} before the first import)."""
+    return await unwrap(db)[META_COLLECTION].find_one({"_id": "current"}) or {}
+
+
+async def current_generation(db):
+    """Return the generation number of the live dataset (0 before the first staged import)."""
+    return (await read_current(db)).get("generation", 0)
+
+
+async def live_dataset(db):
+    """Resolve the live dataset: a view on the collections the `current` pointer names."""
+    current = await read_current(db)
+    return dataset_view(db, current.get("storage"), current.get("generation", 0))
+
+
+def live_collection(db, section):
+    """The live collection of `section` for scripts using the synchronous pymongo client."""
+    current = db[META_COLLECTION].find_one({"_id": "current"}) or {}
+    return db[collection_name(section, current.get("storage"))]
+
+
+async def _next_generation(db):
+    return (await unwrap(db)[META_COLLECTION].find_one_and_update(
+        {"_id": "sequence"},
+        {"$inc": {"value": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    ))["value"]
+
+
+async def begin_import(db):
+    """Allocate a new generation and create its empty staging collections.
+
+    Indexes present on the live collections are recreated on the staging ones,
+    so the promoted collections are fully indexed from the first read.
+    Returns the generation and a `DatasetView` of its staging collections.
+    """
+    database = unwrap(db)
+    live = await live_dataset(database)
+    generation = await _next_generation(database)
+    # Taken before any staging collection exists, so garbage collection never sees them unleased
+    await ImportLease(database, generation).renew(force=True)
+
+    staging = staging_view(database, generation)
+    for section in COLLECTIONS:
+        name = staging_name(section, generation)
+        await database.drop_collection(name)
+        await database.create_collection(name)
+        for index_name, info in (await live[section].index_information()).items():
+            if index_name == "_id_":
+                continue
+            keys = info.pop("key")
+            info.pop("v", None)
+            info.pop("ns", None)
+            await staging[section].create_index(keys, name=index_name, **info)
+    return generation, staging
+
+
+class ImportLease:
+    """The claim of a running import on its staging collections, stored in `dataset_meta`.
+
+    Garbage collection leaves staging collections alone while their lease has
+    not expired. `renew()` can be called for every batch: it only writes once
+    a quarter of the lease has passed.
+    """
+
+    def __init__(self, db, generation, seconds=IMPORT_LEASE_SECONDS):
+        self.db = unwrap(db)
+        self.generation = generation
+        self.seconds = seconds
+        self.renewed_at = None
+
+    async def renew(self, force=False):
+        if not force and self.renewed_at is not None and time.monotonic() - self.renewed_at < self.seconds / 4:
+            return
+        await self.db[META_COLLECTION].update_one(
+            {"_id": lease_id(self.generation)},
+            {"$set": {"generation": self.generation, "expires_at": datetime.now(timezone.utc) + timedelta(seconds=self.seconds)}},
+            upsert=True,
+        )
+        self.renewed_at = time.monotonic()
+
+
+async def abort_import(db, generation):
+    """Drop the staging collections of an import that did not complete."""
+    database = unwrap(db)
+    for section in COLLECTIONS:
+        await database.drop_collection(staging_name(section, generation))
+    await database[META_COLLECTION].delete_one({"_id": lease_id(generation)})
+
+
+async def promote(db, generation):
+    """Make the staged generation live; the one it replaces stays stored for rollback.
+
+    The staging collections are renamed to their generation's names first;
+    readers switch over only with the single update of the `current` pointer.
+    Returns the storage of the replaced generation.
+    """
+    database = unwrap(db)
+    current = await read_current(database)
+    previous = current.get("storage")
+
+    for section in COLLECTIONS:
+        await database[staging_name(section, generation)].rename(archive_name(section, generation), dropTarget=True)
+
+    await database[META_COLLECTION].update_one(
+        {"_id": "current"},
+        {"$set": {"generation": generation, "storage": generation, "previous": previous, "promoted_at": datetime.now(timezone.utc)}},
+        upsert=True,
+    )
+    await database[META_COLLECTION].delete_one({"_id": lease_id(generation)})
+    return previous
+
+
+async def bump_generation(db):
+    """Give the live collections a new generation number after they were changed in place.
+
+    Everything keyed by generation (response cache, availability index) is
+    invalidated; the stored collections and the generation kept for rollback
+    stay the same.
+    """
+    database = unwrap(db)
+    generation = await _next_generation(database)
+    await database[META_COLLECTION].update_one(
+        {"_id": "current"},
+        {"$set": {"generation": generation, "promoted_at": datetime.now(timezone.utc)}, "$setOnInsert": {"storage": None}},
+        upsert=True,
+    )
+    return generation
+
+
+async def rollback_target(db):
+    """A view on the stored generation `rollback()` would restore.
+
+    Raises LookupError if there is none.
+    """
+    database = unwrap(db)
+    current = await read_current(database)
+    existing = set(await database.list_collection_names())
+    storage = current.get("storage")
+    previous = current.get("previous", storage)
+    if previous == storage or any(collection_name(s, previous) not in existing for s in SECTIONS):
+        raise LookupError("No previous generation available for rollback")
+    return dataset_view(database, previous)
+
+
+async def rollback(db):
+    """Point readers back at the most recently replaced generation; returns the new generation number.
+
+    The rolled-back dataset gets a fresh generation number, so nothing cached
+    for the dataset it replaces is served for it.
+    """
+    database = unwrap(db)
+    target = await rollback_target(database)
+    storage = (await read_current(database)).get("storage")
+
+    generation = await _next_generation(database)
+    await database[META_COLLECTION].update_one(
+        {"_id": "current"},
+        {"$set": {"generation": generation, "storage": target.storage, "previous": storage, "promoted_at": datetime.now(timezone.utc)}},
+    )
+    return generation
+
+
+async def collect_garbage(db, keep=KEEP_GENERATIONS):
+    """Drop stored generations beyond the newest `keep` and abandoned staging collections.
+
+    The live generation is never dropped and the one a rollback would restore
+    is always counted first. Staging collections are dropped only when their
+    import's lease has expired or is gone (the import crashed before
+    `abort_import`), whatever their generation number: an older import may
+    still be loading while a newer one has been promoted.
+    """
+    database = unwrap(db)
+    current = await read_current(database)
+    live, previous = current.get("storage"), current.get("previous")
+    now = datetime.now(timezone.utc)
+    leased = {
+        lease["generation"]
+        async for lease in database[META_COLLECTION].find({"_id": {"$regex": "^import_"}})
+        if _aware(lease["expires_at"]) > now
+    }
+    stored = {}
+    dropped = []
+    for name in await database.list_collection_names():
+        if name in COLLECTIONS:
+            # Unversioned collections from before the first staged import
+            stored.setdefault(None, []).append(name)
+            continue
+        match = _GENERATION_NAME.match(name)
+        if not match or match["section"] not in COLLECTIONS:
+            continue
+        generation = int(match["generation"])
+        if match["kind"] == "staging":
+            if generation not in leased:
+                await database.drop_collection(name)
+                dropped.append(name)
+        else:
+            stored.setdefault(generation, []).append(name)
+    await database[META_COLLECTION].delete_many({"_id": {"$regex": "^import_"}, "expires_at": {"$lte": now}})
+
+    stored.pop(live, None)
+    newest_first = sorted(stored, key=lambda g: (g != previous, g is None, -(g or 0)))
+    for generation in newest_first[keep:]:
+        for name in stored[generation]:
+            await database.drop_collection(name)
+            dropped.append(name)
+    return dropped
+
+
+def _aware(moment):
+    # PyMongo returns naive UTC datetimes unless the client is timezone-aware
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
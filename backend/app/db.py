@@ -0,0 +1,86 @@
+"""Async MongoDB access for the API, with the client owned by the app lifespan."""
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
+from pymongo import AsyncMongoClient
+
+from .cache import generations
+from .datasets import live_dataset
+from .indexes import ensure_indexes
+from .metrics import event_listeners
+from .stats import ensure_stats
+from .startup import startup_timer
+
+logger = logging.getLogger(__name__)
+
+
+def _int_env(name, default):
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def create_client():
+    """Create an async client with the connection pool tuned from the environment.
+
+    The client is lazy: sockets are only opened by the first operation, so it
+    is safe to call this in each worker process after it has been forked.
+    Command and pool events feed the metrics served on `/metrics`.
+    """
+    return AsyncMongoClient(
+        os.getenv("MONGO_URI"),
+        maxPoolSize=_int_env("MONGO_MAX_POOL_SIZE", 100),
+        minPoolSize=_int_env("MONGO_MIN_POOL_SIZE", 0),
+        maxIdleTimeMS=_int_env("MONGO_MAX_IDLE_TIME_MS", 60_000),
+        waitQueueTimeoutMS=_int_env("MONGO_WAIT_QUEUE_TIMEOUT_MS", 10_000),
+        connectTimeoutMS=_int_env("MONGO_CONNECT_TIMEOUT_MS", 5_000),
+        serverSelectionTimeoutMS=_int_env("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5_000),
+        socketTimeoutMS=_int_env("MONGO_SOCKET_TIMEOUT_MS", 0) or None,
+        event_listeners=event_listeners(),
+    )
+
+
+def get_database(client):
+    return client[os.getenv("DB_NAME")]
+
+
+async def _verify_dataset(db):
+    try:
+        live = await live_dataset(db)
+        await ensure_indexes(live)
+        # Generations promoted before the statistics were staged with them have none yet
+        await ensure_stats(live)
+    except Exception as e:
+        logger.warning("Could not verify MongoDB indexes and statistics on startup: %s", e)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open the MongoDB client when the worker starts and close it on shutdown.
+
+    The declared indexes and the statistics of the live dataset are verified
+    in the background, so a worker accepts requests without waiting for the
+    server; an unreachable server is logged rather than preventing the API
+    from starting.
+    """
+    client = create_client()
+    app.state.mongo_client = client
+    app.state.db = get_database(client)
+    verification = asyncio.create_task(_verify_dataset(app.state.db))
+    startup_timer.ready()
+    try:
+        yield
+    finally:
+        verification.cancel()
+        await client.close()
+
+
+async def get_db(request: Request):
+    """FastAPI dependency returning the live dataset of the running app.
+
+    The view is resolved once per request, so all its reads see the same
+    generation even if an import is promoted meanwhile.
+    """
+    return await generations.resolve(request.app.state.db)
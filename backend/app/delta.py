@@ -0,0 +1,150 @@
+"""Delta imports: apply a full feed to the live collections by writing only what changed.
+
+Every document carries its natural key and a hash of its content. A feed is
+compared batch by batch against the stored hashes; unchanged documents are
+only counted, changed and new ones are upserted and documents missing from
+the feed are deleted, all through unordered `bulk_write` batches. A changed
+room rewrites its hotel document (embedded layout) or the rooms of that one
+hotel (normalized layout, see rooms.py).
+"""
+import hashlib
+import json
+import os
+
+from pymongo import DeleteMany, DeleteOne, InsertOne, ReplaceOne
+
+from .conflicts import QUARANTINE_COLLECTION
+from .datasets import HASH_FIELD, KEY_FIELD, ROOMS_COLLECTION, SECTIONS, reservation_period
+from .rooms import ROOMS_LAYOUT, split_hotels
+
+# Maximum number of write operations sent to MongoDB in a single bulk_write
+DELTA_BATCH_SIZE = int(os.getenv("DELTA_BATCH_SIZE", "1000"))
+
+
+def natural_key(section, document):
+    """Return the key identifying a document across feeds."""
+    if section == "guests":
+        parts = [document.get("email")]
+    elif section == "hotels":
+        parts = [document.get("name")]
+    else:
+        parts = [
+            document.get("guest_email"),
+            document.get("hotel_name"),
+            document.get("room_number"),
+            reservation_period(document)[0],
+        ]
+    return json.dumps(parts, ensure_ascii=False, default=str)
+
+
+def content_hash(document):
+    """Hash the content of a document, ignoring `_id` and the bookkeeping fields."""
+    content = {k: v for k, v in document.items() if k not in ("_id", KEY_FIELD, HASH_FIELD)}
+    serialized = json.dumps(content, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(serialized.encode("utf-8")).hexdigest()
+
+
+def fingerprint(section, documents):
+    """Store the natural key and content hash in each document of a batch."""
+    for document in documents:
+        document[KEY_FIELD] = natural_key(section, document)
+        document[HASH_FIELD] = content_hash(document)
+    return documents
+
+
+def _chunks(items, size=DELTA_BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class DeltaImport:
+    """Plans and applies the writes that turn the live collections into an incoming feed.
+
+    Batches must be fingerprinted before they are added. Only changed
+    documents are kept in memory until `apply()`; nothing is written before.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.seen = {section: set() for section in SECTIONS}
+        self.pending = {section: {} for section in SECTIONS}
+        self.counts = {section: {"unchanged": 0, "upserted": 0, "removed": 0} for section in SECTIONS}
+        self.touched_hotels = set()
+
+    async def add(self, section, documents):
+        keys = [document[KEY_FIELD] for document in documents]
+        existing = {
+            document[KEY_FIELD]: document.get(HASH_FIELD)
+            async for document in self.db[section].find({KEY_FIELD: {"$in": keys}}, {"_id": 0, KEY_FIELD: 1, HASH_FIELD: 1})
+        }
+        pending = self.pending[section]
+        for document in documents:
+            key = document[KEY_FIELD]
+            self.seen[section].add(key)
+            if existing.get(key) == document[HASH_FIELD]:
+                pending.pop(key, None)
+            else:
+                # A key repeated within the feed keeps its last version
+                pending[key] = document
+
+    async def quarantine(self, reasons, generation):
+        """Keep offending reservations (by natural key) out of the live data and store them in quarantine.
+
+        Live copies of offending reservations are removed by `apply()`.
+        """
+        pending = self.pending["reservations"]
+        documents = [pending.pop(key) for key in reasons if key in pending]
+        stored = [key for key in reasons if key not in {document[KEY_FIELD] for document in documents}]
+        for chunk in _chunks(stored):
+            documents += await self.db["reservations"].find({KEY_FIELD: {"$in": chunk}}, {"_id": 0}).to_list(None)
+        self.seen["reservations"].difference_update(reasons)
+        for document in documents:
+            document["quarantine"] = {"generation": generation, "reasons": reasons[document[KEY_FIELD]]}
+        if documents:
+            await self.db[QUARANTINE_COLLECTION].insert_many(documents, ordered=False)
+        return len(reasons)
+
+    def _touch(self, section, document):
+        if section == "hotels":
+            self.touched_hotels.add(document.get("name"))
+        elif section == "reservations":
+            self.touched_hotels.add(document.get("hotel_name"))
+
+    async def apply(self, sections=SECTIONS):
+        """Write the planned upserts and delete documents of `sections` that were not in the feed."""
+        for section in sections:
+            collection = self.db[section]
+            counts = self.counts[section]
+            pending = self.pending[section]
+            counts["unchanged"] = len(self.seen[section]) - len(pending)
+
+            operations = []
+            room_operations = []
+            for key, document in pending.items():
+                if section == "hotels" and ROOMS_LAYOUT == "normalized":
+                    (document,), rooms = split_hotels([document])
+                    room_operations += [InsertOne(room) for room in rooms]
+                operations.append(ReplaceOne({KEY_FIELD: key}, document, upsert=True))
+                self._touch(section, document)
+            # Documents stored before hashing was introduced have no key and are replaced too
+            async for document in collection.find({}, {KEY_FIELD: 1, "name": 1, "hotel_name": 1}):
+                if document.get(KEY_FIELD) not in self.seen[section]:
+                    operations.append(DeleteOne({"_id": document["_id"]}))
+                    self._touch(section, document)
+                    counts["removed"] += 1
+
+            for chunk in _chunks(operations):
+                await collection.bulk_write(chunk, ordered=False)
+            counts["upserted"] = len(pending)
+
+            if section == "hotels" and self.touched_hotels:
+                # Stored rooms of changed and removed hotels are replaced in either layout
+                names = list(self.touched_hotels)
+                room_operations = [DeleteMany({"hotel_name": {"$in": chunk}}) for chunk in _chunks(names)] + room_operations
+                for chunk in _chunks(room_operations):
+                    await self.db[ROOMS_COLLECTION].bulk_write(chunk, ordered=True)
+        return self.counts
+
+    @property
+    def changed(self):
+        return any(counts["upserted"] or counts["removed"] for counts in self.counts.values())
@@ -0,0 +1,264 @@
+"""Streaming CSV, HTML, JSON and YAML rendering of hotel, guest and reservation records."""
+import csv
+import html
+import io
+import json
+
+import yaml
+
+from .datasets import reservation_period
+from .responses import dumps
+
+CSV_COLUMNS = [
+    "section",
+    "hotel_name", "hotel_location", "hotel_stars",
+    "room_number", "room_type", "room_price", "room_available",
+    "first_name", "last_name", "email", "phone",
+    "guest_email", "start_date", "end_date", "status",
+]
+
+# Rendered text is handed to the client once this many characters are buffered
+FLUSH_SIZE = 64 * 1024
+
+HTML_HEAD = """<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <title>Hotel Data Export</title>
+    <style>
+        body { font-family: Arial, sans-serif; margin: 20px; }
+        h2 { color: #333; margin-top: 30px; }
+        table { border-collapse: collapse; width: 100%; margin-bottom: 30px; }
+        th, td { border: 1px solid #ddd; padding: 8px; text-align: left; }
+        th { background-color: #f5f5f5; }
+        tr:nth-child(even) { background-color: #f9f9f9; }
+        tr:hover { background-color: #f0f0f0; }
+    </style>
+</head>
+<body>
+"""
+
+HTML_TAIL = """</body>
+</html>
+"""
+
+# Heading and (column title, row field) pairs of each HTML table
+HTML_TABLES = {
+    "hotels": ("Hotels and Rooms", [
+        ("Hotel Name", "hotel_name"), ("Location", "hotel_location"), ("Stars", "hotel_stars"),
+        ("Room Number", "room_number"), ("Room Type", "room_type"), ("Price", "room_price"),
+        ("Available", "room_available"),
+    ]),
+    "guests": ("Guests", [
+        ("First Name", "first_name"), ("Last Name", "last_name"), ("Email", "email"), ("Phone", "phone"),
+    ]),
+    "reservations": ("Reservations", [
+        ("Guest Email", "guest_email"), ("Room Number", "room_number"), ("Hotel Name", "hotel_name"),
+        ("Start Date", "start_date"), ("End Date", "end_date"), ("Status", "status"),
+    ]),
+}
+
+
+def _compile_table(heading, columns):
+    header = "".join(f"<th>{html.escape(title)}</th>" for title, _ in columns)
+    start = f"<h2>{html.escape(heading)}</h2>\n<table>\n<tr>{header}</tr>\n"
+    row = "<tr>" + "<td>{}</td>" * len(columns) + "</tr>\n"
+    return start, row, [field for _, field in columns]
+
+
+# Table openings and row templates are built once at import time
+_HTML_TEMPLATES = {section: _compile_table(*spec) for section, spec in HTML_TABLES.items()}
+
+
+def flatten_records(records):
+    """Yield one flat row per room, guest and reservation from (section, document) pairs."""
+    for section, document in records:
+        if section == "hotels":
+            for room in document.get("rooms") or []:
+                yield {
+                    "section": "hotels",
+                    "hotel_name": document.get("name"),
+                    "hotel_location": document.get("location"),
+                    "hotel_stars": document.get("stars"),
+                    "room_number": room.get("number"),
+                    "room_type": room.get("type"),
+                    "room_price": room.get("price"),
+                    "room_available": room.get("available"),
+                }
+        elif section == "guests":
+            yield {
+                "section": "guests",
+                "first_name": document.get("first_name", ""),
+                "last_name": document.get("last_name", ""),
+                "email": document.get("email", ""),
+                "phone": document.get("phone", ""),
+            }
+        elif section == "reservations":
+            start, end = reservation_period(document)
+            yield {
+                "section": "reservations",
+                "guest_email": document.get("guest_email", ""),
+                "room_number": document.get("room_number", ""),
+                "hotel_name": document.get("hotel_name", ""),
+                "start_date": start or "",
+                "end_date": end or "",
+                "status": document.get("status", ""),
+            }
+
+
+def iter_csv(records, flush_size=FLUSH_SIZE):
+    """Render records as UTF-8 CSV (with BOM) in chunks of roughly `flush_size` characters."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(CSV_COLUMNS)
+    encoding = "utf-8-sig"
+    for row in flatten_records(records):
+        writer.writerow([row.get(column, "") for column in CSV_COLUMNS])
+        if buffer.tell() >= flush_size:
+            yield buffer.getvalue().encode(encoding)
+            encoding = "utf-8"
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode(encoding)
+
+
+def _html_value(field, value):
+    if field == "room_available":
+        return "Yes" if value else "No"
+    return html.escape("" if value is None else str(value))
+
+
+def iter_html(records, sections=None, page=1, page_size=None, flush_size=FLUSH_SIZE):
+    """Render records as an HTML report in chunks of roughly `flush_size` characters.
+
+    `sections` restricts the report to some tables; with `page_size` each
+    table only contains the rows of the given 1-based `page`.
+    """
+    first_row = (page - 1) * page_size if page_size else 0
+    parts = [HTML_HEAD]
+    size = len(HTML_HEAD)
+    current = None
+    for row in flatten_records(records):
+        section = row["section"]
+        if sections and section not in sections:
+            continue
+        if section != current:
+            if current is not None:
+                parts.append("</table>\n")
+            table_start, template, fields = _HTML_TEMPLATES[section]
+            parts.append(table_start)
+            size += len(table_start)
+            current = section
+            row_number = 0
+
+        row_number += 1
+        if page_size and not first_row < row_number <= first_row + page_size:
+            continue
+        rendered = template.format(*(_html_value(field, row.get(field)) for field in fields))
+        parts.append(rendered)
+        size += len(rendered)
+        if size >= flush_size:
+            yield "".join(parts).encode("utf-8")
+            parts = []
+            size = 0
+
+    if current is not None:
+        parts.append("</table>\n")
+    parts.append(HTML_TAIL)
+    yield "".join(parts).encode("utf-8")
+
+
+class SectionRenderer:
+    """Renders the documents of one section, batch by batch, as a standalone file."""
+
+    extension = None
+
+    def __init__(self, section):
+        self.section = section
+
+    def header(self):
+        return ""
+
+    def rows(self, documents):
+        raise NotImplementedError
+
+    def footer(self):
+        return ""
+
+
+class CsvSection(SectionRenderer):
+    extension = "csv"
+
+    def __init__(self, section):
+        super().__init__(section)
+        self.fields = [field for _, field in HTML_TABLES[section][1]]
+
+    def header(self):
+        # BOM so that spreadsheet applications detect UTF-8
+        return "\ufeff" + ",".join(self.fields) + "\n"
+
+    def rows(self, documents):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        for row in flatten_records((self.section, document) for document in documents):
+            writer.writerow([row.get(field, "") for field in self.fields])
+        return buffer.getvalue()
+
+
+class HtmlSection(SectionRenderer):
+    extension = "html"
+
+    def header(self):
+        return HTML_HEAD + _HTML_TEMPLATES[self.section][0]
+
+    def rows(self, documents):
+        _, template, fields = _HTML_TEMPLATES[self.section]
+        return "".join(
+            template.format(*(_html_value(field, row.get(field)) for field in fields))
+            for row in flatten_records((self.section, document) for document in documents)
+        )
+
+    def footer(self):
+        return "</table>\n" + HTML_TAIL
+
+
+class JsonSection(SectionRenderer):
+    extension = "json"
+
+    def __init__(self, section):
+        super().__init__(section)
+        self.separator = "\n"
+
+    def header(self):
+        return "{" + json.dumps(self.section) + ": ["
+
+    def rows(self, documents):
+        parts = []
+        for document in documents:
+            parts.append(self.separator + dumps(document).decode("utf-8"))
+            self.separator = ",\n"
+        return "".join(parts)
+
+    def footer(self):
+        return "\n]}\n"
+
+
+class YamlSection(SectionRenderer):
+    """The YAML members of one export concatenate into a file the upload endpoint accepts."""
+
+    extension = "yaml"
+
+    def header(self):
+        return f"{self.section}:\n"
+
+    def rows(self, documents):
+        dumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+        return yaml.dump(list(documents), Dumper=dumper, allow_unicode=True, sort_keys=False)
+
+
+SECTION_RENDERERS = {
+    "csv": CsvSection,
+    "html": HtmlSection,
+    "json": JsonSection,
+    "yaml": YamlSection,
+}
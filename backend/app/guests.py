@@ -0,0 +1,284 @@
+"""Guest search by name, email or phone prefix, and the reservation history of a guest.
+
+Every guest is split into normalized search tokens: the words of the first
+and last name, the email and the pieces of its local part, and the
+phone digits with and without the country code. The tokens are kept sorted
+with the guests that have them laid out contiguously, so all tokens starting
+with a term are one binary search and a slice. A query of several terms
+scans the guests of its rarest term and stops once `limit` guests match, so
+its cost does not depend on the number of guests.
+"""
+import asyncio
+import re
+import unicodedata
+from array import array
+from bisect import bisect_left
+from functools import lru_cache
+
+from starlette.concurrency import run_in_threadpool
+
+from .cache import generations
+from .datasets import PUBLIC_PROJECTION, ROOMS_COLLECTION, feed_in_threadpool, reservation_period
+from .startup import LazyModule
+
+# Imported by the first index build
+np = LazyModule("numpy")
+
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+
+# Digits of a national phone number, matched without the country code
+NATIONAL_DIGITS = 9
+
+_GUEST_FIELDS = {"_id": 0, "first_name": 1, "last_name": 1, "email": 1, "phone": 1}
+
+# Letters NFKD does not decompose into a base letter and an accent
+_FOLD = str.maketrans({"ł": "l", "Ł": "L", "ø": "o", "Ø": "O", "ß": "ss", "đ": "d", "Đ": "D"})
+
+_WORD_SEPARATORS = re.compile(r"[\s\-']+")
+_EMAIL_SEPARATORS = re.compile(r"[._+\-]+")
+_PHONE = re.compile(r"^[+\d\s\-()]+$")
+
+
+def normalize(text):
+    """Lower-case `text` and strip accents, so "Łucja Żak" is searched as "lucja zak"."""
+    if text.isascii():
+        return text.lower().strip()
+    text = unicodedata.normalize("NFKD", text.translate(_FOLD))
+    return "".join(char for char in text if not unicodedata.combining(char)).casefold().strip()
+
+
+# First and last names repeat across guests
+@lru_cache(maxsize=65536)
+def _name_tokens(name):
+    name = normalize(name)
+    if not name:
+        return ()
+    return (name, *(word for word in _WORD_SEPARATORS.split(name) if word))
+
+
+def guest_tokens(guest):
+    """The normalized tokens a guest can be found by.
+
+    The email is one token: its local part and the first piece of it are
+    prefixes of it. The phone is indexed with and without the country code.
+    """
+    tokens = {*_name_tokens(str(guest.get("first_name") or "")), *_name_tokens(str(guest.get("last_name") or ""))}
+    email = normalize(str(guest.get("email") or ""))
+    if email:
+        tokens.add(email)
+        tokens.update(part for part in _EMAIL_SEPARATORS.split(email.partition("@")[0])[1:] if part)
+    digits = "".join(filter(str.isdigit, str(guest.get("phone") or "")))
+    if digits:
+        tokens.add(digits)
+        tokens.add(digits[-NATIONAL_DIGITS:])
+    return tokens
+
+
+def query_terms(q):
+    """Split a search query into normalized prefix terms; phone-like queries become one digit string."""
+    if _PHONE.match(q.strip()) and any(char.isdigit() for char in q):
+        return [re.sub(r"\D", "", q)]
+    return [term for term in (normalize(word) for word in q.split()) if term]
+
+
+class GuestIndexBuilder:
+    """Collects guests, possibly batch by batch, into a GuestSearchIndex.
+
+    Tokens are numbered as they are first seen and every guest keeps the
+    numbers of its tokens in one flat array, so memory grows with the
+    number of distinct tokens rather than with one list per token.
+    """
+
+    def __init__(self):
+        self.emails = []
+        self.token_numbers = {}
+        self.guest_tokens = array("i")
+        self.guest_offsets = array("i", [0])
+
+    def add_guests(self, guests):
+        numbers = self.token_numbers
+        for guest in guests:
+            if not guest.get("email"):
+                continue
+            self.emails.append(guest["email"])
+            self.guest_tokens.extend(numbers.setdefault(token, len(numbers)) for token in guest_tokens(guest))
+            self.guest_offsets.append(len(self.guest_tokens))
+
+    def build(self, generation):
+        keys = sorted(self.token_numbers)
+        numbers = np.fromiter((self.token_numbers[key] for key in keys), dtype=np.int32, count=len(keys))
+        rank = np.empty(len(keys), dtype=np.int32)
+        rank[numbers] = np.arange(len(keys), dtype=np.int32)
+        guest_keys = rank[np.frombuffer(self.guest_tokens, dtype=np.int32)]
+
+        # Guests of each key laid out contiguously in key order
+        owners = np.repeat(np.arange(len(self.emails), dtype=np.int32), np.diff(np.frombuffer(self.guest_offsets, dtype=np.int32)))
+        guest_ids = owners[np.argsort(guest_keys, kind="stable")]
+        offsets = np.zeros(len(keys) + 1, dtype=np.int32)
+        np.cumsum(np.bincount(guest_keys, minlength=len(keys)), out=offsets[1:])
+        return GuestSearchIndex(
+            generation, self.emails, keys,
+            offsets=array("i", offsets.tobytes()),
+            guest_ids=array("i", guest_ids.tobytes()),
+            guest_keys=array("i", guest_keys.tobytes()),
+            guest_offsets=self.guest_offsets,
+        )
+
+
+class GuestSearchIndex:
+    """Immutable prefix index over the guests of one dataset generation.
+
+    `keys` are the sorted distinct tokens; the guests having `keys[k]` are
+    `guest_ids[offsets[k]:offsets[k + 1]]`, and the keys of guest `g` are
+    `guest_keys[guest_offsets[g]:guest_offsets[g + 1]]`.
+    """
+
+    def __init__(self, generation, emails, keys, offsets, guest_ids, guest_keys, guest_offsets):
+        self.generation = generation
+        self.emails = emails
+        self.keys = keys
+        self.offsets = offsets
+        self.guest_ids = guest_ids
+        self.guest_keys = guest_keys
+        self.guest_offsets = guest_offsets
+
+    def key_range(self, term):
+        """The range of keys starting with `term`."""
+        first = bisect_left(self.keys, term)
+        return first, bisect_left(self.keys, term + "\U0010ffff", first)
+
+    def search(self, q, limit=SEARCH_DEFAULT_LIMIT):
+        """Emails of up to `limit` guests matching every term of `q`, and whether there are more."""
+        terms = query_terms(q)
+        if not terms:
+            return [], False
+        offsets = self.offsets
+        ranges = sorted((self.key_range(term) for term in terms), key=lambda keys: offsets[keys[1]] - offsets[keys[0]])
+        first, last = ranges[0]
+        others = ranges[1:]
+
+        emails, seen = [], set()
+        for position in range(offsets[first], offsets[last]):
+            guest_id = self.guest_ids[position]
+            if guest_id in seen:
+                continue
+            seen.add(guest_id)
+            if others:
+                keys = self.guest_keys[self.guest_offsets[guest_id]:self.guest_offsets[guest_id + 1]]
+                if not all(any(low <= key < high for key in keys) for low, high in others):
+                    continue
+            if len(emails) == limit:
+                return emails, True
+            emails.append(self.emails[guest_id])
+        return emails, False
+
+
+async def build_index(db, generation):
+    """Build a search index of the live guests, streamed with a narrow projection and tokenized in worker threads."""
+    builder = GuestIndexBuilder()
+    await feed_in_threadpool(db["guests"].find({}, _GUEST_FIELDS, batch_size=10_000), builder.add_guests)
+    return await run_in_threadpool(builder.build, generation)
+
+
+class GuestSearchEngine:
+    """Per-worker holder of the guest search index, rebuilt when the dataset generation changes."""
+
+    def __init__(self):
+        self.index = None
+        self._lock = asyncio.Lock()
+
+    def publish(self, index):
+        """Install an index built during an import in this worker."""
+        self.index = index
+
+    def carry_over(self, previous, generation):
+        """Keep the index of generation `previous` for one that did not change guests."""
+        if self.index is not None and self.index.generation == previous:
+            self.index.generation = generation
+
+    async def get_index(self, db):
+        generation = await generations.get(db)
+        if self.index is None or self.index.generation != generation:
+            async with self._lock:
+                if self.index is None or self.index.generation != generation:
+                    self.index = await build_index(db, generation)
+        return self.index
+
+
+engine = GuestSearchEngine()
+
+
+async def find_guests(db, q, limit=SEARCH_DEFAULT_LIMIT):
+    """Guests matching `q` in index order, fetched by email in one query, and whether there are more."""
+    index = await engine.get_index(db)
+    emails, more = index.search(q, limit)
+    if not emails:
+        return [], more
+    found = {}
+    async for guest in db["guests"].find({"email": {"$in": emails}}, PUBLIC_PROJECTION):
+        found[guest["email"]] = guest
+    return [found[email] for email in emails if email in found], more
+
+
+def _room_of(hotel, rooms, number):
+    for room in hotel.get("rooms") or rooms:
+        if room.get("number") == number:
+            return {name: value for name, value in room.items() if name not in ("_id", "hotel_name")}
+    return None
+
+
+async def guest_reservations(db, email):
+    """Reservations of a guest by start date, each with its hotel and room, in one aggregation.
+
+    Each lookup matches the booked hotel by name (the `name` index) or the
+    booked room of a normalized hotel (the `hotel_number` index) and returns
+    only the fields shown, so the work per reservation does not grow with the
+    size of the hotels and rooms collections; the booked room is picked from
+    whichever layout the hotel is stored in.
+    """
+    booking = {"hotel_name": "$hotel_name", "room_number": "$room_number"}
+    pipeline = [
+        {"$match": {"guest_email": email}},
+        {"$project": PUBLIC_PROJECTION},
+        {"$lookup": {
+            "from": db["hotels"].name,
+            "let": booking,
+            "pipeline": [
+                {"$match": {"$expr": {"$eq": ["$name", "$$hotel_name"]}}},
+                {"$limit": 1},
+                {"$project": {
+                    "_id": 0, "name": 1, "location": 1, "stars": 1,
+                    "rooms": {"$filter": {
+                        "input": {"$ifNull": ["$rooms", []]},
+                        "as": "room",
+                        "cond": {"$eq": ["$$room.number", "$$room_number"]},
+                    }},
+                }},
+            ],
+            "as": "hotel",
+        }},
+        {"$lookup": {
+            "from": db[ROOMS_COLLECTION].name,
+            "let": booking,
+            "pipeline": [
+                {"$match": {"$expr": {"$and": [
+                    {"$eq": ["$hotel_name", "$$hotel_name"]},
+                    {"$eq": ["$number", "$$room_number"]},
+                ]}}},
+                {"$limit": 1},
+                {"$project": {"_id": 0, "hotel_name": 0}},
+            ],
+            "as": "hotel_rooms",
+        }},
+    ]
+    reservations = []
+    async for reservation in await db["reservations"].aggregate(pipeline):
+        hotels, rooms = reservation.pop("hotel"), reservation.pop("hotel_rooms")
+        hotel = hotels[0] if hotels else {}
+        reservation["hotel"] = {field: hotel.get(field) for field in ("name", "location", "stars")} if hotel else None
+        reservation["room"] = _room_of(hotel, rooms, reservation.get("room_number"))
+        reservations.append(reservation)
+    # Dates may be stored as start_date or check_in
+    reservations.sort(key=lambda reservation: str(reservation_period(reservation)[0] or ""))
+    return reservations
@@ -0,0 +1,93 @@
+"""Declared MongoDB indexes for the dataset collections and query plan diagnostics."""
+import logging
+
+from pymongo import ASCENDING, IndexModel
+
+from .datasets import KEY_FIELD, ROOMS_COLLECTION
+
+logger = logging.getLogger(__name__)
+
+# Lookup of stored content hashes by natural key during delta imports
+_NATURAL_KEY = IndexModel([(KEY_FIELD, ASCENDING)], name="natural_key")
+
+# Every index the application relies on, per collection
+REQUIRED_INDEXES = {
+    "hotels": [
+        IndexModel([("name", ASCENDING)], name="name"),
+        IndexModel([("rooms.number", ASCENDING)], name="rooms_number"),
+        _NATURAL_KEY,
+    ],
+    # Normalized layout only (see rooms.py); empty while rooms are embedded in hotels
+    ROOMS_COLLECTION: [
+        IndexModel([("hotel_name", ASCENDING), ("number", ASCENDING)], name="hotel_number"),
+        IndexModel([("available", ASCENDING), ("price", ASCENDING)], name="available_price"),
+        IndexModel([("type", ASCENDING), ("price", ASCENDING)], name="type_price"),
+    ],
+    "guests": [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        _NATURAL_KEY,
+    ],
+    "reservations": [
+        IndexModel(
+            [("hotel_name", ASCENDING), ("room_number", ASCENDING), ("start_date", ASCENDING)],
+            name="hotel_room_start",
+        ),
+        IndexModel([("guest_email", ASCENDING), ("start_date", ASCENDING)], name="guest_start"),
+        IndexModel([("status", ASCENDING)], name="status"),
+        _NATURAL_KEY,
+    ],
+}
+
+# Queries issued by the API and scripts/queries.py; each must be answered by an index scan
+KNOWN_QUERIES = [
+    ("hotels", "hotel by name", {"name": "Hotel Giewont"}, None),
+    ("hotels", "hotel by room number", {"rooms.number": 101}, None),
+    (ROOMS_COLLECTION, "room of a hotel", {"hotel_name": "Hotel Giewont", "number": 101}, None),
+    (ROOMS_COLLECTION, "available rooms in a price range", {"available": True, "price": {"$gte": 200, "$lte": 500}}, None),
+    (ROOMS_COLLECTION, "rooms of a type in a price range", {"type": "double", "price": {"$lte": 500}}, None),
+    ("guests", "guest by email", {"email": "anna.nowak@example.com"}, None),
+    ("reservations", "reservations of a guest", {"guest_email": "anna.nowak@example.com"}, [("start_date", ASCENDING)]),
+    ("reservations", "reservations of a room", {"hotel_name": "Hotel Giewont", "room_number": 101}, [("start_date", ASCENDING)]),
+    ("reservations", "reservations by status", {"status": "confirmed"}, None),
+    ("guests", "guest by natural key (delta import)", {KEY_FIELD: '["anna.nowak@example.com"]'}, None),
+]
+
+
+async def ensure_indexes(db, collections=None):
+    """Create all declared indexes; existing identical indexes make this a no-op.
+
+    `collections` maps section names to collections (e.g. staging ones) and
+    defaults to the live collections of `db`.
+    """
+    created = {}
+    for section, indexes in REQUIRED_INDEXES.items():
+        collection = collections[section] if collections else db[section]
+        created[section] = await collection.create_indexes(indexes)
+    return created
+
+
+def _plan_stages(plan):
+    yield plan.get("stage")
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from _plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from _plan_stages(child)
+
+
+async def explain_known_queries(db):
+    """Explain every known query and report the winning plan stages and COLLSCAN fallbacks."""
+    results = []
+    for section, description, query, sort in KNOWN_QUERIES:
+        cursor = db[section].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explanation = await cursor.explain()
+        stages = [stage for stage in _plan_stages(explanation["queryPlanner"]["winningPlan"]) if stage]
+        results.append({
+            "collection": section,
+            "query": description,
+            "stages": stages,
+            "collscan": "COLLSCAN" in stages,
+        })
+    return results
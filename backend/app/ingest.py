@@ -0,0 +1,164 @@
+"""Streaming YAML ingestion for hotel reservation uploads."""
+import io
+import time
+from datetime import date
+
+import yaml
+from yaml.composer import Composer
+from yaml.events import MappingEndEvent, MappingStartEvent, ScalarEvent, SequenceEndEvent, SequenceStartEvent
+
+from .datasets import SECTIONS
+
+# Size of the chunks pulled from the uploaded file by the parser
+READ_CHUNK_SIZE = 64 * 1024
+
+# Prefer the C LibYAML parser, fall back to the pure Python one
+_BaseLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+class _RecordLoader(_BaseLoader, Composer):
+    """Safe loader that can compose one node at a time from the event stream."""
+
+    def __init__(self, stream):
+        _BaseLoader.__init__(self, stream)
+        Composer.__init__(self)
+
+
+def convert_dates_to_iso(data):
+    """Convert date objects to ISO format strings in the data structure."""
+    if isinstance(data, dict):
+        return {k: convert_dates_to_iso(v) for k, v in data.items()}
+    elif isinstance(data, list):
+        return [convert_dates_to_iso(item) for item in data]
+    elif isinstance(data, date):
+        return data.isoformat()
+    return data
+
+
+class ChunkedReader:
+    """File-like wrapper that hands out at most `chunk_size` bytes per read and counts them."""
+
+    def __init__(self, stream, chunk_size=READ_CHUNK_SIZE):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.chunk_size:
+            size = self.chunk_size
+        chunk = self.stream.read(size)
+        self.bytes_read += len(chunk)
+        return chunk
+
+
+def detach_upload(upload):
+    """Take ownership of an UploadFile's spooled file so it outlives the endpoint.
+
+    FastAPI closes uploaded files as soon as the endpoint returns, which is
+    before a streaming response body is sent. The caller must close the
+    returned file, typically in the response's background task.
+    """
+    stream = upload.file
+    upload.file = io.BytesIO()
+    return stream
+
+
+def iter_records(stream, sections_seen=None):
+    """Yield (section, document) pairs from a YAML stream without loading the whole tree.
+
+    Only the top-level mapping and the section sequences are walked on the
+    event level; each list item is composed and constructed on its own and
+    converted to an ISO-dated document before the next one is parsed.
+    Names of the sections found are added to `sections_seen` when given.
+    A stream with more than one YAML document raises `yaml.YAMLError`.
+    """
+    loader = _RecordLoader(stream)
+    try:
+        loader.get_event()  # StreamStartEvent
+        if loader.check_event(yaml.StreamEndEvent):
+            return
+        loader.get_event()  # DocumentStartEvent
+        if not loader.check_event(MappingStartEvent):
+            raise yaml.YAMLError("Top-level YAML node must be a mapping")
+        loader.get_event()
+
+        while not loader.check_event(MappingEndEvent):
+            if not loader.check_event(ScalarEvent):
+                raise yaml.YAMLError("Top-level keys must be scalars")
+            section = loader.get_event().value
+
+            # A known section is present whatever its value, as in a loaded tree;
+            # unknown sections and non-list values hold no records and are parsed and discarded
+            if section in SECTIONS and sections_seen is not None:
+                sections_seen.add(section)
+            if section not in SECTIONS or not loader.check_event(SequenceStartEvent):
+                loader.compose_node(None, None)
+                continue
+
+            loader.get_event()
+            while not loader.check_event(SequenceEndEvent):
+                node = loader.compose_node(None, None)
+                yield section, convert_dates_to_iso(loader.construct_document(node))
+            loader.get_event()
+
+        # A dataset is one document; further documents are not silently dropped
+        loader.get_event()  # MappingEndEvent
+        loader.get_event()  # DocumentEndEvent
+        if not loader.check_event(yaml.StreamEndEvent):
+            raise yaml.YAMLError("Multi-document YAML is not supported: expected a single document")
+    finally:
+        loader.dispose()
+
+
+def iter_tree_records(yaml_data):
+    """Yield (section, document) pairs from an already loaded YAML tree.
+
+    Like `iter_records`, sections whose value is not a list hold no records.
+    """
+    for section in SECTIONS:
+        documents = yaml_data.get(section)
+        if isinstance(documents, list):
+            yield from ((section, document) for document in documents)
+
+
+def iter_batches(records, batch_size):
+    """Group consecutive records of the same section into lists of at most `batch_size`."""
+    current_section = None
+    batch = []
+    for section, document in records:
+        if batch and (section != current_section or len(batch) >= batch_size):
+            yield current_section, batch
+            batch = []
+        current_section = section
+        batch.append(document)
+    if batch:
+        yield current_section, batch
+
+
+class IngestStats:
+    """Document counts and throughput of a single ingest run."""
+
+    def __init__(self):
+        self.counts = {section: 0 for section in SECTIONS}
+        self.sections_seen = set()
+        self.batches = 0
+        self.bytes_read = 0
+        self.started = time.perf_counter()
+
+    def add_batch(self, section, size):
+        self.counts[section] += size
+        self.batches += 1
+
+    def missing_sections(self):
+        return [section for section in SECTIONS if section not in self.sections_seen]
+
+    def throughput(self):
+        elapsed = time.perf_counter() - self.started
+        documents = sum(self.counts.values())
+        return {
+            "elapsed_seconds": round(elapsed, 3),
+            "bytes_read": self.bytes_read,
+            "batches": self.batches,
+            "documents_per_second": round(documents / elapsed, 1) if elapsed else None,
+            "megabytes_per_second": round(self.bytes_read / elapsed / 1_000_000, 2) if elapsed else None,
+        }
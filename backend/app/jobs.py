@@ -0,0 +1,185 @@
+"""Background jobs for large uploads and conversions.
+
+The uploaded file is spooled to `<JOBS_DIR>/<job id>/` and the request
+returns at once; at most `JOB_WORKERS` jobs run concurrently per worker
+process, the rest wait in line. Job state is mirrored to `job.json` next to
+the input, so any API worker sharing the directory can report it. Jobs are
+coroutines on the event loop: their CPU-bound steps (parsing, hashing,
+conflict checks, index builds) must go to worker threads or processes so
+that running jobs never stall the requests served meanwhile.
+"""
+import asyncio
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import time
+import uuid
+
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+
+from .ingest import ChunkedReader, iter_records
+
+logger = logging.getLogger(__name__)
+
+JOBS_DIR = os.getenv("JOBS_DIR") or os.path.join(tempfile.gettempdir(), "hotel_reservations_jobs")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+
+# Finished jobs and their files are removed after this many seconds
+JOB_TTL_SECONDS = int(os.getenv("JOB_TTL_SECONDS", "3600"))
+
+# Progress is written to job.json at most this often
+PROGRESS_SAVE_INTERVAL = 1.0
+
+_JOB_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+class Job:
+    """State of one background job; `progress` is updated by the running work."""
+
+    def __init__(self, kind, directory):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.directory = os.path.join(directory, self.id)
+        self.status = "queued"
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.artifact = None
+        self.media_type = None
+        self.filename = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._saved_at = 0.0
+
+    @property
+    def input_path(self):
+        return os.path.join(self.directory, "input")
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": self.progress,
+            "result": self.result,
+            "error": self.error,
+            "artifact": os.path.basename(self.artifact) if self.artifact else None,
+            "media_type": self.media_type,
+            "filename": self.filename,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+    def save(self):
+        path = os.path.join(self.directory, "job.json")
+        with open(path + ".tmp", "w", encoding="utf-8") as file:
+            json.dump(self.to_dict(), file, ensure_ascii=False, default=str)
+        os.replace(path + ".tmp", path)
+        self._saved_at = time.monotonic()
+
+    def report(self, **progress):
+        self.progress.update(progress)
+        if time.monotonic() - self._saved_at >= PROGRESS_SAVE_INTERVAL:
+            self.save()
+
+
+def write_artifact(job, render, suffix):
+    """Render the spooled YAML input chunk by chunk into `output<suffix>` (runs in a worker thread)."""
+    path = os.path.join(job.directory, "output" + suffix)
+    with open(job.input_path, "rb") as source, open(path, "wb") as target:
+        reader = ChunkedReader(source)
+        for chunk in render(iter_records(reader)):
+            target.write(chunk)
+            job.report(bytes_read=reader.bytes_read)
+    job.artifact = path
+    return path
+
+
+class JobQueue:
+    """Runs jobs as tasks of the event loop, at most `workers` at a time."""
+
+    def __init__(self, directory=JOBS_DIR, workers=JOB_WORKERS):
+        self.directory = directory
+        self.jobs = {}
+        self._slots = asyncio.Semaphore(workers)
+        self._tasks = set()
+
+    async def create(self, kind, upload):
+        """Register a job and spool the uploaded file into its directory."""
+        await run_in_threadpool(self.collect_expired)
+        job = Job(kind, self.directory)
+        os.makedirs(job.directory)
+
+        def spool():
+            upload.file.seek(0)
+            with open(job.input_path, "wb") as target:
+                shutil.copyfileobj(upload.file, target, 1024 * 1024)
+            job.progress["bytes_total"] = os.path.getsize(job.input_path)
+            job.save()
+
+        await run_in_threadpool(spool)
+        self.jobs[job.id] = job
+        return job
+
+    def start(self, job, work):
+        """Run `await work(job)` once a slot is free; its return value becomes the job result."""
+        task = asyncio.create_task(self._run(job, work))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, job, work):
+        async with self._slots:
+            job.status = "running"
+            job.save()
+            try:
+                job.result = await work(job)
+                job.status = "succeeded"
+            except HTTPException as e:
+                job.status = "failed"
+                job.error = {"status_code": e.status_code, "detail": e.detail}
+            except Exception as e:
+                logger.exception("Job %s failed", job.id)
+                job.status = "failed"
+                job.error = {"status_code": 500, "detail": str(e)}
+            finally:
+                job.finished_at = time.time()
+                if os.path.exists(job.input_path):
+                    os.remove(job.input_path)
+                job.save()
+
+    def get(self, job_id):
+        """Return the job state as a dict, from memory or from the shared job directory."""
+        if not _JOB_ID.match(job_id):
+            return None
+        job = self.jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        try:
+            with open(os.path.join(self.directory, job_id, "job.json"), "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def artifact_path(self, job_id):
+        state = self.get(job_id)
+        if not state or state["status"] != "succeeded" or not state["artifact"]:
+            return None, state
+        return os.path.join(self.directory, job_id, state["artifact"]), state
+
+    def collect_expired(self, ttl=JOB_TTL_SECONDS):
+        """Remove finished jobs older than `ttl` seconds together with their files."""
+        if not os.path.isdir(self.directory):
+            return
+        now = time.time()
+        for job_id in os.listdir(self.directory):
+            state = self.get(job_id)
+            if state and state["finished_at"] and now - state["finished_at"] > ttl:
+                shutil.rmtree(os.path.join(self.directory, job_id), ignore_errors=True)
+                self.jobs.pop(job_id, None)
+
+
+jobs = JobQueue()
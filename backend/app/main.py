@@ -1,37 +1,70 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Form
+# Imported first, so the worker import time covers FastAPI and every app module
+from .startup import startup_timer
+from fastapi import FastAPI, UploadFile, File, HTTPException, Form, BackgroundTasks, Depends, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, Response
-from pydantic import BaseModel
-from typing import List, Optional
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+from pydantic import BaseModel, Field, model_validator
+from typing import List, Optional, Union
 import yaml
 import json
-from pymongo import MongoClient
 import os
 from dotenv import load_dotenv
 import tempfile
 from datetime import date
 import bson
-import pandas as pd
-import zipfile
 import io
+import asyncio
+import itertools
+import logging
+from pymongo.errors import PyMongoError
+
+from .analytics import ANALYTICS_MAX_DAYS, GRANULARITIES, GROUPINGS, engine as analytics_engine, occupancy
+from .archive import iter_zip_export
+from .availability import IndexBuilder, engine as availability_engine
+from .cache import cached_json, generations
+from .columnar import TABLES, write_table
+from .compression import CompressionMiddleware
+from .conflicts import ConflictChecker, quarantine_reservations, summarize
+from .datasets import KEY_FIELD, PUBLIC_PROJECTION, SECTIONS, ImportLease, abort_import, begin_import, bump_generation, collect_garbage, live_dataset, promote, rollback, rollback_target
+from .delta import DeltaImport, fingerprint
+from .db import get_db, lifespan
+from .exporters import SECTION_RENDERERS, iter_csv, iter_html
+from .guests import SEARCH_DEFAULT_LIMIT, SEARCH_MAX_LIMIT, GuestIndexBuilder, engine as guest_search_engine, find_guests, guest_reservations
+from .indexes import ensure_indexes
+from .jobs import jobs, write_artifact
+from .metrics import TimingMiddleware, record_bytes, render as render_metrics, span
+from .rooms import attach_rooms, find_rooms, hotels_projection, insert_hotels, iter_documents, room_filter, update_rooms, wants_rooms
+from .ingest import ChunkedReader, IngestStats, convert_dates_to_iso, detach_upload, iter_batches, iter_records, iter_tree_records
+from .stats import STATS_COLLECTION, StatsBuilder, refresh_stats, summarize_stats, write_stats
+from .validation import BatchValidator, summarize_errors
+from .pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, STREAM_BATCH_SIZE, fetch_page, iter_ndjson, parse_fields
+from .responses import FastJSONResponse
+from .snapshot import engine as snapshots, iter_section
 
 # Load environment variables
 load_dotenv()
 
-# MongoDB configuration
-MONGO_URI = os.getenv("MONGO_URI")
-DB_NAME = os.getenv("DB_NAME")
+logger = logging.getLogger(__name__)
+
+# Maximum number of documents sent to MongoDB in a single insert
+UPLOAD_BATCH_SIZE = int(os.getenv("UPLOAD_BATCH_SIZE", "1000"))
+
+# Maximum number of room changes accepted by PATCH /api/rooms
+ROOM_CHANGES_MAX = int(os.getenv("ROOM_CHANGES_MAX", "10000"))
+
+# Cached responses a room change cannot affect
+ROOM_INDEPENDENT_PATHS = ("/api/data/guests", "/api/data/reservations", "/api/guests/search")
 
-# Establish MongoDB connection
-client = MongoClient(MONGO_URI)
-db = client[DB_NAME]
+# The MongoDB client is created per worker by the lifespan handler (see db.py)
+app = FastAPI(title="Hotel Reservations API", lifespan=lifespan, default_response_class=FastJSONResponse)
 
-# Collections
-hotels_collection = db["hotels"]
-guests_collection = db["guests"]
-reservations_collection = db["reservations"]
+# gzip/deflate as negotiated with the client; inside the timing middleware so it counts the bytes sent
+app.add_middleware(CompressionMiddleware)
 
-app = FastAPI(title="Hotel Reservations API")
+# Request latency, in-flight requests and body sizes per route (see /metrics)
+app.add_middleware(TimingMiddleware)
 
 # Enable CORS
 app.add_middleware(
@@ -43,291 +76,660 @@ app.add_middleware(
 )
 
 
-def convert_dates_to_iso(data):
-    """Convert date objects to ISO format strings in the data structure."""
-    if isinstance(data, dict):
-        return {k: convert_dates_to_iso(v) for k, v in data.items()}
-    elif isinstance(data, list):
-        return [convert_dates_to_iso(item) for item in data]
-    elif isinstance(data, date):
-        return data.isoformat()
-    return data
-
-
 @app.get("/")
 async def root():
     return {"message": "Welcome to Hotel Reservations API"}
 
 
+@app.get("/metrics")
+async def metrics():
+    return Response(content=render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def job_accepted(job):
+    return JSONResponse(status_code=202, content={
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/api/jobs/{job.id}",
+        "result_url": f"/api/jobs/{job.id}/result"
+    })
+
+
 @app.post("/api/reservations/upload")
-async def upload_reservations(file: UploadFile = File(...)):
+async def upload_reservations(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    stream: bool = False,
+    on_conflict: str = Query("report", pattern="^(report|reject|quarantine)$"),
+    validation: str = Query("report", pattern="^(report|reject|off)$"),
+    mode: str = Query("replace", pattern="^(replace|delta)$"),
+    background: bool = False,
+    db=Depends(get_db),
+):
+    if not background:
+        return await import_upload(db, file.file, background_tasks, stream, on_conflict, validation, mode)
+    
+    # Spool the file to disk and import it as a job; the result is the usual response
+    job = await jobs.create("upload", file)
+    
+    async def work(job):
+        tasks = BackgroundTasks()
+        with open(job.input_path, "rb") as source:
+            result = await import_upload(db, source, tasks, stream, on_conflict, validation, mode, job.report)
+        await tasks()
+        return result
+    
+    jobs.start(job, work)
+    return job_accepted(job)
+
+
+async def import_upload(db, source, background_tasks, stream, on_conflict, validation, mode, progress=None):
+    """Import a YAML dataset from a binary file object; return the upload response."""
+    stats = IngestStats()
     try:
-        # Read the uploaded YAML file
-        content = await file.read()
-        yaml_data = yaml.safe_load(content)
+        if stream:
+            # Parse the spooled upload record by record
+            reader = ChunkedReader(source)
+            records = iter_records(reader, stats.sections_seen)
+        else:
+            # Read the uploaded YAML file
+            with span("upload.read"):
+                content = await run_in_threadpool(source.read)
+            stats.bytes_read = len(content)
+            # Parsing and date conversion are CPU-bound and run in a worker thread, off the event loop
+            with span("upload.parse", len(content)):
+                yaml_data = await run_in_threadpool(yaml.safe_load, content)
+            
+            # Validate the data structure
+            required_sections = ["hotels", "guests", "reservations"]
+            for section in required_sections:
+                if section not in yaml_data:
+                    raise HTTPException(status_code=400, detail=f"Missing required section: {section}")
+            stats.sections_seen.update(required_sections)
+            
+            # Convert dates to ISO format strings
+            with span("upload.convert_dates"):
+                yaml_data = await run_in_threadpool(convert_dates_to_iso, yaml_data)
+            records = iter_tree_records(yaml_data)
         
-        # Validate the data structure
-        required_sections = ["hotels", "guests", "reservations"]
-        for section in required_sections:
-            if section not in yaml_data:
-                raise HTTPException(status_code=400, detail=f"Missing required section: {section}")
+        if mode == "delta":
+            # Compare with the live collections and write only the differences at the end
+            db = await live_dataset(db)
+            delta = DeltaImport(db)
+            generation, collections = db.generation, None
+        else:
+            # Load into fresh staging collections while readers keep the live data
+            delta = None
+            with span("upload.begin_import"):
+                generation, collections = await begin_import(db)
+            lease = ImportLease(db, generation)
+        index_builder = IndexBuilder()
+        guest_index_builder = GuestIndexBuilder()
+        conflict_checker = ConflictChecker(KEY_FIELD if delta else "_id")
+        stats_builder = StatsBuilder()
+        validator = BatchValidator() if validation != "off" else None
+        schema_errors = []
+        quarantined = 0
         
-        # Convert dates to ISO format strings
-        yaml_data = convert_dates_to_iso(yaml_data)
+        def prepare(batches):
+            for section, batch in batches:
+                fingerprint(section, batch)
+                if section == "guests":
+                    # Repeated emails are reported as conflicts instead of failing the unique email index
+                    batch = conflict_checker.add_guests(batch)
+                if batch:
+                    yield section, batch
         
-        # Clear existing collections
-        hotels_collection.delete_many({})
-        guests_collection.delete_many({})
-        reservations_collection.delete_many({})
+        def absorb(section, batch):
+            # Reservations are added to the conflict check once insert_many has given them their _id
+            if section == "hotels":
+                index_builder.add_hotels(batch)
+                conflict_checker.add_hotels(batch)
+                stats_builder.add_hotels(batch)
+            elif section == "guests":
+                guest_index_builder.add_guests(batch)
+            else:
+                index_builder.add_reservations(batch)
+                conflict_checker.add_reservations(batch)
+                stats_builder.add_reservations(batch)
         
-        # Insert new data
-        hotels_collection.insert_many(yaml_data["hotels"])
-        guests_collection.insert_many(yaml_data["guests"])
-        reservations_collection.insert_many(yaml_data["reservations"])
+        try:
+            # Insert new data in bounded unordered batches; parsing, hashing and the derived
+            # data are computed in worker threads so the event loop keeps serving requests
+            # (upload.load covers parsing and everything below, upload.write only the writes)
+            with span("upload.load"):
+                async for section, batch in iterate_in_threadpool(prepare(iter_batches(records, UPLOAD_BATCH_SIZE))):
+                    with span("upload.write"):
+                        if delta:
+                            await delta.add(section, batch)
+                        elif section == "hotels":
+                            await insert_hotels(collections, batch)
+                        else:
+                            await collections[section].insert_many(batch, ordered=False)
+                        if not delta:
+                            # Keeps garbage collection off the staging collections of a long import
+                            await lease.renew()
+                    stats.add_batch(section, len(batch))
+                    if progress:
+                        progress(documents=sum(stats.counts.values()), bytes_read=reader.bytes_read if stream else stats.bytes_read)
+                    if validator:
+                        validator.submit(section, batch)
+                    await run_in_threadpool(absorb, section, batch)
+            
+            if stream:
+                stats.bytes_read = reader.bytes_read
+                record_bytes("upload.load", reader.bytes_read)
+                missing = stats.missing_sections()
+                if missing:
+                    raise HTTPException(status_code=400, detail=f"Missing required section: {missing[0]}")
+            
+            # Collect JSON Schema errors of all records
+            if validator:
+                with span("upload.validate"):
+                    schema_errors = await validator.result()
+                if schema_errors and validation == "reject":
+                    raise HTTPException(status_code=422, detail={"message": "Schema validation failed", "errors": summarize_errors(schema_errors)})
+            
+            # Check references and double bookings before the data goes live
+            with span("upload.conflicts"):
+                conflicts = await run_in_threadpool(conflict_checker.check)
+            if conflicts["total"] and on_conflict == "reject":
+                raise HTTPException(status_code=409, detail={"message": "Conflicting reservations", "conflicts": summarize(conflicts)})
+            if conflicts["total"] and on_conflict == "quarantine":
+                if delta:
+                    quarantined = await delta.quarantine(conflict_checker.offending(conflicts), generation)
+                else:
+                    quarantined = await quarantine_reservations(
+                        db, collections["reservations"], conflict_checker.offending(conflicts), generation
+                    )
+            
+            if delta:
+                # Send only inserts, changes and deletes to the live collections
+                with span("upload.delta_apply"):
+                    await delta.apply()
+            else:
+                # Statistics are staged with the data they describe
+                with span("upload.stats"):
+                    if not quarantined:
+                        await write_stats(collections, stats_builder.build())
+                    else:
+                        await refresh_stats(collections)
+                
+                # Build the declared indexes before the collections go live
+                with span("upload.indexes"):
+                    await ensure_indexes(db, collections)
+                
+                # Switch readers over to the new generation
+                with span("upload.promote"):
+                    await promote(db, generation)
+        except BaseException:
+            if not delta:
+                await abort_import(db, generation)
+            raise
+        if delta:
+            # An unchanged feed keeps the generation, and with it every cached response
+            if delta.changed:
+                # Before the new generation number, so nothing caches old statistics for it
+                with span("upload.stats"):
+                    await refresh_stats(db, delta.touched_hotels)
+                generation = await bump_generation(db)
+                live = await generations.refresh(db)
+                snapshots.start_build(live, generation)
+        else:
+            live = await generations.refresh(db)
+            snapshots.start_build(live, generation)
+            guest_search_engine.publish(await run_in_threadpool(guest_index_builder.build, generation))
+            if not quarantined:
+                availability_engine.publish(await run_in_threadpool(index_builder.build, generation))
+            background_tasks.add_task(collect_garbage, db)
         
-        return {
+        response = {
             "message": "Data uploaded successfully",
-            "hotels_count": len(yaml_data["hotels"]),
-            "guests_count": len(yaml_data["guests"]),
-            "reservations_count": len(yaml_data["reservations"])
+            "hotels_count": stats.counts["hotels"],
+            "guests_count": stats.counts["guests"],
+            "reservations_count": stats.counts["reservations"] - quarantined,
+            "quarantined_count": quarantined,
+            "conflicts": summarize(conflicts),
+            "validation_errors": summarize_errors(schema_errors),
+            "generation": generation,
+            "throughput": stats.throughput()
         }
+        if delta:
+            response["changes"] = delta.counts
+        return response
         
+    except HTTPException:
+        raise
     except yaml.YAMLError:
         raise HTTPException(status_code=400, detail="Invalid YAML format")
+    except PyMongoError:
+        # Write errors carry the offending documents; they belong in the log, not the response
+        logger.exception("Upload failed")
+        raise HTTPException(status_code=500, detail="Database error while importing the dataset")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.get("/api/data")
-async def get_all_data():
+@app.post("/api/reservations/rollback")
+async def rollback_reservations(db=Depends(get_db)):
     try:
-        # Retrieve all data from collections
-        hotels = list(hotels_collection.find({}, {'_id': 0}))
-        guests = list(guests_collection.find({}, {'_id': 0}))
-        reservations = list(reservations_collection.find({}, {'_id': 0}))
+        # Statistics of the restored generation are brought up to date before readers switch to it
+        await refresh_stats(await rollback_target(db))
+        generation = await rollback(db)
+        await generations.refresh(db)
+        return {"message": "Dataset rolled back", "generation": generation}
+    except LookupError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except PyMongoError:
+        logger.exception("Rollback failed")
+        raise HTTPException(status_code=500, detail="Database error while rolling back the dataset")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/data")
+async def get_all_data(request: Request, db=Depends(get_db)):
+    async def build():
+        # Read-replica mode: decode the shared snapshot instead of querying MongoDB
+        snapshot = await snapshots.get(db)
+        if snapshot is not None:
+            with span("data.snapshot"):
+                sections = {section: await run_in_threadpool(snapshot.documents, section) for section in SECTIONS}
+            return {**sections, "counts": {section: snapshot.count(section) for section in SECTIONS}}
+        
+        # Retrieve all data from collections concurrently, counts come from collection metadata
+        with span("data.query"):
+            hotels, guests, reservations, *counts = await asyncio.gather(
+                db["hotels"].find({}, PUBLIC_PROJECTION).to_list(None),
+                db["guests"].find({}, PUBLIC_PROJECTION).to_list(None),
+                db["reservations"].find({}, PUBLIC_PROJECTION).to_list(None),
+                *(db[section].estimated_document_count() for section in SECTIONS),
+            )
+            # Hotels stored in the normalized layout get their rooms back
+            await attach_rooms(db, hotels)
         
         return {
             "hotels": hotels,
             "guests": guests,
             "reservations": reservations,
-            "counts": {
-                "hotels": len(hotels),
-                "guests": len(guests),
-                "reservations": len(reservations)
-            }
+            "counts": dict(zip(SECTIONS, counts))
         }
+    
+    try:
+        return await cached_json(request, db, build)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/api/yaml-to-csv")
-async def yaml_to_csv(file: UploadFile = File(...)):
+@app.get("/api/data/{section}")
+async def get_data_page(
+    request: Request,
+    section: str,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    fields: Optional[str] = None,
+    db=Depends(get_db),
+):
+    if section not in SECTIONS:
+        raise HTTPException(status_code=404, detail=f"Unknown section: {section}")
+    async def build():
+        projection = parse_fields(fields)
+        if section == "hotels" and wants_rooms(projection):
+            items, next_after = await fetch_page(db[section], limit, after, projection=hotels_projection(projection))
+            await attach_rooms(db, items, projection)
+        else:
+            items, next_after = await fetch_page(db[section], limit, after, projection=projection)
+        count = await db[section].estimated_document_count()
+        return {
+            "section": section,
+            "items": items,
+            "next_after": next_after,
+            "count": count
+        }
+    
     try:
-        # Read and parse YAML file
-        content = await file.read()
-        yaml_data = yaml.safe_load(content.decode('utf-8'))
-        
-        # Flatten all data into a single list
-        all_data = []
-        
-        # Process hotels and rooms
-        if 'hotels' in yaml_data:
-            for hotel in yaml_data['hotels']:
-                hotel_data = hotel.copy()
-                rooms = hotel_data.pop('rooms', [])
-                if rooms:
-                    for room in rooms:
-                        row = {
-                            'section': 'hotels',
-                            'hotel_name': hotel['name'],
-                            'hotel_location': hotel['location'],
-                            'hotel_stars': hotel['stars'],
-                            'room_number': room['number'],
-                            'room_type': room['type'],
-                            'room_price': room['price'],
-                            'room_available': room['available']
-                        }
-                        all_data.append(row)
-        
-        # Process guests
-        if 'guests' in yaml_data:
-            for guest in yaml_data['guests']:
-                row = {
-                    'section': 'guests',
-                    'first_name': guest.get('first_name', ''),
-                    'last_name': guest.get('last_name', ''),
-                    'email': guest.get('email', ''),
-                    'phone': guest.get('phone', '')
-                }
-                all_data.append(row)
-        
-        # Process reservations
-        if 'reservations' in yaml_data:
-            for reservation in yaml_data['reservations']:
-                row = {
-                    'section': 'reservations',
-                    'guest_email': reservation.get('guest_email', ''),
-                    'room_number': reservation.get('room_number', ''),
-                    'hotel_name': reservation.get('hotel_name', ''),
-                    'start_date': reservation.get('start_date', ''),
-                    'end_date': reservation.get('end_date', ''),
-                    'status': reservation.get('status', '')
-                }
-                all_data.append(row)
-        
-        # Convert to DataFrame
-        df = pd.DataFrame(all_data)
-        
-        # Create CSV in memory
-        output = io.StringIO()
-        df.to_csv(output, index=False, encoding='utf-8-sig')
-        
-        # Return CSV file
-        return Response(
-            content=output.getvalue().encode('utf-8-sig'),
-            media_type='text/csv',
-            headers={
-                'Content-Disposition': 'attachment; filename=converted_data.csv'
-            }
-        )
-            
-    except yaml.YAMLError as e:
-        raise HTTPException(status_code=400, detail=f"Invalid YAML format: {str(e)}")
+        return await cached_json(request, db, build)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/api/yaml-to-html")
-async def yaml_to_html(file: UploadFile = File(...)):
+@app.get("/api/stats")
+async def get_stats(request: Request, db=Depends(get_db)):
+    async def build():
+        # One read of the materialized per-hotel statistics
+        hotels = await db[STATS_COLLECTION].find({}, {"_id": 0, "price_total": 0}).sort("hotel_name", 1).to_list(None)
+        return summarize_stats(hotels)
+    
     try:
-        # Read and parse YAML file
-        content = await file.read()
-        yaml_data = yaml.safe_load(content.decode('utf-8'))
-        
-        # Start building HTML
-        html_content = """
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="UTF-8">
-            <title>Hotel Data Export</title>
-            <style>
-                body { font-family: Arial, sans-serif; margin: 20px; }
-                h2 { color: #333; margin-top: 30px; }
-                table { border-collapse: collapse; width: 100%; margin-bottom: 30px; }
-                th, td { border: 1px solid #ddd; padding: 8px; text-align: left; }
-                th { background-color: #f5f5f5; }
-                tr:nth-child(even) { background-color: #f9f9f9; }
-                tr:hover { background-color: #f0f0f0; }
-            </style>
-        </head>
-        <body>
-        """
-        
-        # Process hotels
-        if 'hotels' in yaml_data:
-            html_content += "<h2>Hotels and Rooms</h2>"
-            html_content += """
-            <table>
-                <tr>
-                    <th>Hotel Name</th>
-                    <th>Location</th>
-                    <th>Stars</th>
-                    <th>Room Number</th>
-                    <th>Room Type</th>
-                    <th>Price</th>
-                    <th>Available</th>
-                </tr>
-            """
-            
-            for hotel in yaml_data['hotels']:
-                rooms = hotel.get('rooms', [])
-                if rooms:
-                    for room in rooms:
-                        html_content += f"""
-                        <tr>
-                            <td>{hotel['name']}</td>
-                            <td>{hotel['location']}</td>
-                            <td>{hotel['stars']}</td>
-                            <td>{room['number']}</td>
-                            <td>{room['type']}</td>
-                            <td>{room['price']}</td>
-                            <td>{'Yes' if room['available'] else 'No'}</td>
-                        </tr>
-                        """
-            
-            html_content += "</table>"
-        
-        # Process guests
-        if 'guests' in yaml_data:
-            html_content += "<h2>Guests</h2>"
-            html_content += """
-            <table>
-                <tr>
-                    <th>First Name</th>
-                    <th>Last Name</th>
-                    <th>Email</th>
-                    <th>Phone</th>
-                </tr>
-            """
-            
-            for guest in yaml_data['guests']:
-                html_content += f"""
-                <tr>
-                    <td>{guest.get('first_name', '')}</td>
-                    <td>{guest.get('last_name', '')}</td>
-                    <td>{guest.get('email', '')}</td>
-                    <td>{guest.get('phone', '')}</td>
-                </tr>
-                """
-            
-            html_content += "</table>"
-        
-        # Process reservations
-        if 'reservations' in yaml_data:
-            html_content += "<h2>Reservations</h2>"
-            html_content += """
-            <table>
-                <tr>
-                    <th>Guest Email</th>
-                    <th>Room Number</th>
-                    <th>Hotel Name</th>
-                    <th>Start Date</th>
-                    <th>End Date</th>
-                    <th>Status</th>
-                </tr>
-            """
-            
-            for reservation in yaml_data['reservations']:
-                html_content += f"""
-                <tr>
-                    <td>{reservation.get('guest_email', '')}</td>
-                    <td>{reservation.get('room_number', '')}</td>
-                    <td>{reservation.get('hotel_name', '')}</td>
-                    <td>{reservation.get('start_date', '')}</td>
-                    <td>{reservation.get('end_date', '')}</td>
-                    <td>{reservation.get('status', '')}</td>
-                </tr>
-                """
-            
-            html_content += "</table>"
+        return await cached_json(request, db, build)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/data/{section}/stream")
+async def stream_data(section: str, fields: Optional[str] = None, db=Depends(get_db)):
+    if section not in SECTIONS:
+        raise HTTPException(status_code=404, detail=f"Unknown section: {section}")
+    if fields:
+        documents = iter_documents(db, section, parse_fields(fields), STREAM_BATCH_SIZE)
+    else:
+        documents = iter_section(db, section, STREAM_BATCH_SIZE)
+    return StreamingResponse(iter_ndjson(documents), media_type="application/x-ndjson")
+
+
+@app.get("/api/rooms")
+async def get_rooms(
+    request: Request,
+    hotel: Optional[str] = None,
+    room_type: Optional[str] = Query(None, alias="type"),
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    available: Optional[bool] = None,
+    db=Depends(get_db),
+):
+    async def build():
+        with span("rooms.query"):
+            rooms = await find_rooms(db, room_filter(hotel, room_type, min_price, max_price, available))
+        return {
+            "count": len(rooms),
+            "rooms": rooms
+        }
+    
+    try:
+        return await cached_json(request, db, build)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/guests/search")
+async def search_guests(
+    request: Request,
+    q: str = Query(..., min_length=1),
+    limit: int = Query(SEARCH_DEFAULT_LIMIT, ge=1, le=SEARCH_MAX_LIMIT),
+    db=Depends(get_db),
+):
+    async def build():
+        # Prefix index of guest names, emails and phones, built once per dataset generation
+        with span("guests.search"):
+            guests, more = await find_guests(db, q, limit)
+        return {
+            "q": q,
+            "count": len(guests),
+            "more": more,
+            "guests": guests
+        }
+    
+    try:
+        return await cached_json(request, db, build)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/guests/{email}/reservations")
+async def get_guest_reservations(request: Request, email: str, db=Depends(get_db)):
+    async def build():
+        with span("guests.reservations"):
+            guest, reservations = await asyncio.gather(
+                db["guests"].find_one({"email": email}, PUBLIC_PROJECTION),
+                guest_reservations(db, email),
+            )
+        if guest is None and not reservations:
+            raise HTTPException(status_code=404, detail=f"Unknown guest: {email}")
+        return {
+            "guest": guest,
+            "count": len(reservations),
+            "reservations": reservations
+        }
+    
+    try:
+        return await cached_json(request, db, build)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/availability")
+async def get_availability(
+    date_from: date = Query(..., alias="from"),
+    date_to: date = Query(..., alias="to"),
+    hotel: Optional[str] = None,
+    room_type: Optional[str] = Query(None, alias="type"),
+    max_price: Optional[float] = None,
+    db=Depends(get_db),
+):
+    if date_to <= date_from:
+        raise HTTPException(status_code=400, detail="'to' must be after 'from'")
+    try:
+        index = await availability_engine.get_index(db)
+        rooms = index.free_rooms(date_from, date_to, hotel, room_type, max_price)
+        return FastJSONResponse({
+            "from": date_from.isoformat(),
+            "to": date_to.isoformat(),
+            "count": len(rooms),
+            "rooms": rooms
+        })
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+class RoomChange(BaseModel):
+    hotel_name: str
+    room_number: int
+    price: Optional[Union[int, float]] = Field(None, ge=0)
+    available: Optional[bool] = None
+
+    @model_validator(mode="after")
+    def check_fields(self):
+        if self.price is None and self.available is None:
+            raise ValueError("Nothing to change: give 'price' and/or 'available'")
+        return self
+
+
+@app.patch("/api/rooms")
+async def patch_rooms(changes: List[RoomChange], db=Depends(get_db)):
+    if len(changes) > ROOM_CHANGES_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {ROOM_CHANGES_MAX} changes per request")
+    try:
+        # Written to the collections live now, not those the request was resolved for
+        db = await live_dataset(db)
+        previous = db.generation
+        with span("rooms.update"):
+            results, applied = await update_rooms(db, [change.model_dump() for change in changes])
         
-        # Close HTML
-        html_content += """
-        </body>
-        </html>
-        """
+        generation = previous
+        if applied:
+            # Derived data is patched or refreshed for the changed rooms only
+            with span("rooms.stats"):
+                await refresh_stats(db, {hotel for hotel, _ in applied})
+            generation = await bump_generation(db)
+            availability_engine.apply_room_changes(previous, generation, applied)
+            analytics_engine.apply_room_changes(previous, generation, applied)
+            guest_search_engine.carry_over(previous, generation)
+            await generations.refresh(db, unaffected=ROOM_INDEPENDENT_PATHS)
         
-        # Return HTML file
-        return Response(
-            content=html_content,
-            media_type='text/html',
-            headers={
-                'Content-Disposition': 'attachment; filename=converted_data.html'
-            }
-        )
-            
+        counts = {status: 0 for status in ("updated", "unchanged", "not_found")}
+        for result in results:
+            counts[result["status"]] += 1
+        return {
+            **counts,
+            "generation": generation,
+            "results": results
+        }
+    except PyMongoError:
+        logger.exception("Room update failed")
+        raise HTTPException(status_code=500, detail="Database error while updating rooms")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/analytics/occupancy")
+async def get_occupancy(
+    request: Request,
+    date_from: date = Query(..., alias="from"),
+    date_to: date = Query(..., alias="to"),
+    granularity: str = Query("day", pattern=f"^({'|'.join(GRANULARITIES)})$"),
+    group_by: str = Query("total", pattern=f"^({'|'.join(GROUPINGS)})$"),
+    hotel: Optional[str] = None,
+    db=Depends(get_db),
+):
+    if date_to <= date_from:
+        raise HTTPException(status_code=400, detail="'to' must be after 'from'")
+    if (date_to - date_from).days > ANALYTICS_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Range exceeds {ANALYTICS_MAX_DAYS} days")
+    async def build():
+        # Booking arrays are loaded once per dataset generation
+        arrays = await analytics_engine.get_arrays(db)
+        with span("analytics.occupancy"):
+            return await run_in_threadpool(occupancy, arrays, date_from, date_to, granularity, group_by, hotel)
+    
+    try:
+        return await cached_json(request, db, build)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    state = jobs.get(job_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return state
+
+
+@app.get("/api/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    path, state = jobs.artifact_path(job_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    if path is None:
+        raise HTTPException(status_code=409, detail=f"Job has no file to download (status: {state['status']})")
+    return FileResponse(path, media_type=state["media_type"], filename=state["filename"])
+
+
+@app.get("/api/export")
+async def export_data(
+    format: str = Query("csv", pattern=f"^({'|'.join(SECTION_RENDERERS)})$"),
+    sections: Optional[str] = None,
+    db=Depends(get_db),
+):
+    selected = list(dict.fromkeys(name.strip() for name in sections.split(","))) if sections else list(SECTIONS)
+    if not set(selected) <= set(SECTIONS):
+        raise HTTPException(status_code=400, detail=f"Unknown sections: {', '.join(sorted(set(selected) - set(SECTIONS)))}")
+    
+    # Stream a ZIP archive with one compressed member per section
+    return StreamingResponse(
+        iter_zip_export(db, selected, format),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f"attachment; filename=hotel_data_{format}.zip"
+        }
+    )
+
+
+@app.get("/api/export/parquet")
+async def export_parquet(
+    table: str = Query("reservations", pattern=f"^({'|'.join(TABLES)})$"),
+    db=Depends(get_db),
+):
+    # Write the table batch by batch into a temporary file, removed once it has been sent
+    fd, path = tempfile.mkstemp(suffix=".parquet")
+    os.close(fd)
+    try:
+        with span("export.parquet"):
+            await write_table(db, table, path, "parquet")
+    except Exception as e:
+        os.remove(path)
+        raise HTTPException(status_code=500, detail=str(e))
+    return FileResponse(
+        path,
+        media_type="application/vnd.apache.parquet",
+        filename=f"{table}.parquet",
+        background=BackgroundTask(os.remove, path)
+    )
+
+
+async def open_upload_records(file):
+    """Detach the uploaded file and return it with a lazy (section, document) iterator over it."""
+    source = detach_upload(file)
+    try:
+        # Parse up to the first record so malformed files are still rejected with a status code
+        records = iter_records(ChunkedReader(source))
+        first = await run_in_threadpool(next, records, None)
+        if first is not None:
+            records = itertools.chain([first], records)
+        return source, records
     except yaml.YAMLError as e:
+        source.close()
         raise HTTPException(status_code=400, detail=f"Invalid YAML format: {str(e)}")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}") 
\ No newline at end of file
+        source.close()
+        raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
+
+
+async def start_conversion(file, render, suffix, media_type):
+    """Spool an upload and convert it in a job into a file served by /api/jobs/{id}/result."""
+    job = await jobs.create("convert", file)
+    
+    async def work(job):
+        try:
+            await run_in_threadpool(write_artifact, job, render, suffix)
+        except yaml.YAMLError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid YAML format: {str(e)}")
+        job.media_type = media_type
+        job.filename = "converted_data" + suffix
+    
+    jobs.start(job, work)
+    return job_accepted(job)
+
+
+@app.post("/api/yaml-to-csv")
+async def yaml_to_csv(file: UploadFile = File(...), background: bool = False):
+    if background:
+        return await start_conversion(file, iter_csv, ".csv", "text/csv")
+    
+    source, records = await open_upload_records(file)
+    
+    # Stream CSV rows as they are parsed
+    return StreamingResponse(
+        iter_csv(records),
+        media_type='text/csv',
+        headers={
+            'Content-Disposition': 'attachment; filename=converted_data.csv'
+        },
+        background=BackgroundTask(source.close)
+    )
+
+
+@app.post("/api/yaml-to-html")
+async def yaml_to_html(
+    file: UploadFile = File(...),
+    sections: Optional[str] = None,
+    page: int = Query(1, ge=1),
+    page_size: Optional[int] = Query(None, ge=1),
+    background: bool = False,
+):
+    selected = {name.strip() for name in sections.split(",")} if sections else None
+    if selected and not selected <= set(SECTIONS):
+        raise HTTPException(status_code=400, detail=f"Unknown sections: {', '.join(sorted(selected - set(SECTIONS)))}")
+    
+    if background:
+        render = lambda records: iter_html(records, selected, page, page_size)
+        return await start_conversion(file, render, ".html", "text/html")
+    
+    source, records = await open_upload_records(file)
+    
+    # Stream the report table by table as it is rendered
+    return StreamingResponse(
+        iter_html(records, selected, page, page_size),
+        media_type='text/html',
+        headers={
+            'Content-Disposition': 'attachment; filename=converted_data.html'
+        },
+        background=BackgroundTask(source.close)
+    )
+
+
+startup_timer.imports_done()
@@ -0,0 +1,266 @@
+"""Request timing, stage spans, MongoDB command/pool monitoring and Prometheus text exposition.
+
+Metrics live in the memory of each worker process; every worker serves its
+own `/metrics` and Prometheus aggregates them per target.
+"""
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+# Mongo commands slower than this are logged and counted as slow
+SLOW_COMMAND_MS = float(os.getenv("MONGO_SLOW_COMMAND_MS", "100"))
+
+# Requests slower than this are logged with their stage breakdown
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "1000"))
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.values = {}
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        return self.header() + [f"{self.name}{_labels(self.label_names, k)} {v}" for k, v in sorted(self.values.items())]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, *labels, value):
+        with self._lock:
+            self.values[labels] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, *labels, value):
+        with self._lock:
+            entry = self.values.get(labels)
+            if entry is None:
+                entry = self.values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self):
+        lines = self.header()
+        names = self.label_names + ("le",)
+        for labels, (counts, total, count) in sorted(self.values.items()):
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{_labels(names, labels + (bound,))} {bucket_count}")
+            lines.append(f"{self.name}_bucket{_labels(names, labels + ('+Inf',))} {count}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {count}")
+        return lines
+
+
+registry = []
+
+REQUEST_DURATION = Histogram("http_request_duration_seconds", "HTTP request latency.", ("method", "route", "status"))
+REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests being served.")
+REQUEST_BYTES = Counter("http_request_bytes_total", "Request body bytes received.", ("route",))
+RESPONSE_BYTES = Counter("http_response_bytes_total", "Response body bytes sent.", ("route",))
+STAGE_DURATION = Histogram("stage_duration_seconds", "Duration of handler stages.", ("stage",))
+BYTES_PROCESSED = Counter("bytes_processed_total", "Bytes of input processed by a stage.", ("stage",))
+MONGO_COMMAND_DURATION = Histogram("mongo_command_duration_seconds", "MongoDB command latency.", ("command",))
+MONGO_COMMAND_FAILURES = Counter("mongo_command_failures_total", "Failed MongoDB commands.", ("command",))
+MONGO_SLOW_COMMANDS = Counter("mongo_slow_commands_total", f"MongoDB commands slower than {SLOW_COMMAND_MS:g} ms.", ("command",))
+MONGO_POOL_CONNECTIONS = Gauge("mongo_pool_connections", "Connections of the MongoDB pools.", ("state",))
+MONGO_POOL_WAIT = Histogram("mongo_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection.")
+MONGO_POOL_CHECKOUT_FAILURES = Counter("mongo_pool_checkout_failures_total", "Failed connection checkouts.", ("reason",))
+WORKER_IMPORT_SECONDS = Gauge("worker_import_seconds", "Time this worker spent importing the app.")
+WORKER_STARTUP_SECONDS = Gauge("worker_startup_seconds", "Time from process start until this worker was ready.")
+LAZY_IMPORT_SECONDS = Gauge("lazy_import_seconds", "Time spent importing a heavy module on first use.", ("module",))
+
+
+def render():
+    """Return all metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# Stage timings of the request being served, added to its Server-Timing header
+_request_timings = ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def span(stage, bytes_processed=None):
+    """Time one stage of a handler; repeated stages of a request are summed."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_DURATION.observe(stage, value=elapsed)
+        if bytes_processed:
+            BYTES_PROCESSED.inc(stage, amount=bytes_processed)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + elapsed
+
+
+def record_bytes(stage, amount):
+    BYTES_PROCESSED.inc(stage, amount=amount)
+
+
+class TimingMiddleware:
+    """ASGI middleware measuring latency, in-flight requests and body sizes per route.
+
+    Stage spans recorded before the response starts are sent in a
+    `Server-Timing` header; streamed bodies are timed until their last chunk.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        timings = {}
+        token = _request_timings.set(timings)
+        status = {"code": 500, "sent": 0, "received": 0}
+
+        async def receive_wrapper():
+            message = await receive()
+            if message["type"] == "http.request":
+                status["received"] += len(message.get("body", b""))
+            return message
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                if timings:
+                    header = ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items())
+                    message["headers"] = list(message.get("headers", [])) + [(b"server-timing", header.encode("latin-1"))]
+            elif message["type"] == "http.response.body":
+                status["sent"] += len(message.get("body", b""))
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc(amount=1)
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            REQUESTS_IN_FLIGHT.inc(amount=-1)
+            _request_timings.reset(token)
+            elapsed = time.perf_counter() - start
+            route = scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            REQUEST_DURATION.observe(scope["method"], path, status["code"], value=elapsed)
+            REQUEST_BYTES.inc(path, amount=status["received"])
+            RESPONSE_BYTES.inc(path, amount=status["sent"])
+            if elapsed * 1000 >= SLOW_REQUEST_MS:
+                logger.warning("Slow request %s %s: %.0f ms %s", scope["method"], scope["path"], elapsed * 1000,
+                               {name: round(seconds * 1000) for name, seconds in timings.items()})
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """Records the latency of every MongoDB command and flags slow ones."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._observe(event)
+
+    def failed(self, event):
+        MONGO_COMMAND_FAILURES.inc(event.command_name)
+        self._observe(event)
+
+    def _observe(self, event):
+        seconds = event.duration_micros / 1_000_000
+        MONGO_COMMAND_DURATION.observe(event.command_name, value=seconds)
+        if seconds * 1000 >= SLOW_COMMAND_MS:
+            MONGO_SLOW_COMMANDS.inc(event.command_name)
+            logger.warning("Slow MongoDB command %s on %s: %.0f ms", event.command_name, event.database_name, seconds * 1000)
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Tracks open and checked out connections of the MongoDB pools."""
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        MONGO_POOL_CONNECTIONS.inc("open")
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        MONGO_POOL_CONNECTIONS.inc("open", amount=-1)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        MONGO_POOL_CHECKOUT_FAILURES.inc(event.reason)
+
+    def connection_checked_out(self, event):
+        MONGO_POOL_CONNECTIONS.inc("checked_out")
+        duration = getattr(event, "duration", None)
+        if duration is not None:
+            MONGO_POOL_WAIT.observe(value=duration)
+
+    def connection_checked_in(self, event):
+        MONGO_POOL_CONNECTIONS.inc("checked_out", amount=-1)
+
+
+def event_listeners():
+    return [CommandMetrics(), PoolMetrics()]
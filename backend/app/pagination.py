@@ -0,0 +1,81 @@
+"""Keyset pagination and NDJSON streaming over the dataset collections."""
+import os
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+from .datasets import PUBLIC_PROJECTION
+from .responses import dumps
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Documents fetched per getMore while streaming NDJSON
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "500"))
+
+# NDJSON lines are sent (and compressed) in chunks of about this many bytes
+STREAM_CHUNK_BYTES = int(os.getenv("STREAM_CHUNK_BYTES", str(64 * 1024)))
+
+
+def parse_fields(fields):
+    """Turn a comma separated field list into a projection that never returns `_id` or the bookkeeping fields.
+
+    Requested hidden fields (and paths inside them) are ignored; an inclusion
+    projection returns nothing else anyway, and MongoDB does not allow mixing
+    in exclusions. Without any other field all public fields are returned.
+    """
+    names = [name.strip() for name in (fields or "").split(",") if name.strip()]
+    projection = {name: 1 for name in names if name.split(".")[0] not in PUBLIC_PROJECTION}
+    if not projection:
+        return dict(PUBLIC_PROJECTION)
+    projection["_id"] = 0
+    return projection
+
+
+def parse_cursor(after):
+    """Decode the opaque `after` cursor (the hex `_id` of the last document seen)."""
+    if not after:
+        return None
+    try:
+        return ObjectId(after)
+    except (InvalidId, TypeError):
+        raise ValueError(f"Invalid cursor: {after}")
+
+
+async def fetch_page(collection, limit=DEFAULT_PAGE_SIZE, after=None, fields=None, projection=None):
+    """Return one page of documents ordered by `_id` and the cursor of the next page.
+
+    The documents are read with `projection` if given, else with the projection of `fields`.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query = {}
+    last_id = parse_cursor(after)
+    if last_id is not None:
+        query["_id"] = {"$gt": last_id}
+
+    # `_id` is fetched for the cursor and stripped before returning
+    projection = dict(projection or parse_fields(fields))
+    projection.pop("_id", None)
+
+    # One extra document tells whether there is a next page
+    items = await collection.find(query, projection).sort("_id", 1).limit(limit + 1).to_list(None)
+    has_more = len(items) > limit
+    items = items[:limit]
+    next_after = str(items[-1]["_id"]) if has_more else None
+    for item in items:
+        del item["_id"]
+    return items, next_after
+
+
+async def iter_ndjson(cursor, chunk_bytes=STREAM_CHUNK_BYTES):
+    """Yield JSON lines straight from an async Mongo cursor (or document iterator), in chunks of whole lines."""
+    lines, size = [], 0
+    async for document in cursor:
+        line = dumps(document) + b"\n"
+        lines.append(line)
+        size += len(line)
+        if size >= chunk_bytes:
+            yield b"".join(lines)
+            lines, size = [], 0
+    if lines:
+        yield b"".join(lines)
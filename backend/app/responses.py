@@ -0,0 +1,36 @@
+"""JSON serialization of Mongo documents straight to UTF-8 bytes.
+
+orjson is used when installed and falls back to the standard library
+otherwise. Values JSON has no type for (ObjectId, datetime, Decimal128)
+are written as their `str()`, like `json.dumps(..., default=str)`.
+"""
+import json
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    # Datetimes go through `default` so they keep the `str()` format of the json fallback
+    _OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+def dumps(content):
+    """Serialize `content` to UTF-8 JSON bytes."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(content, default=str, option=_OPTIONS)
+        except TypeError:
+            # Integers beyond 64 bits, recursion deeper than orjson allows
+            pass
+    return json.dumps(content, ensure_ascii=False, default=str).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered by `dumps`; return it directly to skip FastAPI's `jsonable_encoder` pass."""
+
+    def render(self, content):
+        return dumps(content)
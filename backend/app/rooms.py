@@ -0,0 +1,261 @@
+"""Optional normalized storage of rooms in their own indexed `rooms` collection.
+
+With `ROOMS_LAYOUT=normalized` imports store hotels without their `rooms`
+array and one document per room (`hotel_name`, `number`, `type`, `price`,
+`available`) in the `rooms` collection. Room lookups and price/availability
+filters become index range scans and a room can be changed without rewriting
+its hotel. Readers reassemble the nested hotel shape per document: a hotel
+stored without `rooms` gets them from the collection, so both layouts (and a
+migration in progress) read the same.
+"""
+import os
+
+from pymongo import DeleteMany, InsertOne, UpdateMany, UpdateOne
+
+from .datasets import HASH_FIELD, PUBLIC_PROJECTION, ROOMS_COLLECTION
+
+LAYOUTS = ("embedded", "normalized")
+
+# Storage layout used for hotels written by imports
+ROOMS_LAYOUT = os.getenv("ROOMS_LAYOUT", "embedded")
+
+# Hotels whose rooms are looked up together
+HOTEL_BATCH_SIZE = 500
+
+# Room fields that can be changed through update_rooms
+UPDATABLE_FIELDS = ("price", "available")
+
+
+def split_hotels(hotels):
+    """Return copies of `hotels` without `rooms` and one document per room referencing its hotel by name."""
+    stored, rooms = [], []
+    for hotel in hotels:
+        hotel = dict(hotel)
+        for room in hotel.pop("rooms", None) or []:
+            rooms.append({"hotel_name": hotel.get("name"), **room})
+        stored.append(hotel)
+    return stored, rooms
+
+
+def _includes(projection):
+    """Whether a projection lists the fields to return rather than the ones to leave out."""
+    return any(value for name, value in projection.items() if name != "_id")
+
+
+def wants_rooms(projection):
+    """Whether a hotels projection returns the `rooms` field (or paths inside it)."""
+    if not projection:
+        return True
+    if not _includes(projection):
+        return projection.get("rooms", 1) != 0
+    return any(value for name, value in projection.items() if name == "rooms" or name.startswith("rooms."))
+
+
+def room_fields(projection):
+    """The room fields a hotels projection returns, or None for whole rooms."""
+    if not projection or not _includes(projection) or projection.get("rooms"):
+        return None
+    return [name.split(".", 1)[1] for name, value in projection.items() if value and name.startswith("rooms.")]
+
+
+def hotels_projection(projection):
+    """The projection to read hotels with before `attach_rooms`, which looks their rooms up by name."""
+    if wants_rooms(projection) and _includes(projection) and not projection.get("name"):
+        return dict(projection, name=1)
+    return projection
+
+
+async def attach_rooms(db, hotels, projection=None):
+    """Fill in `rooms` of hotels stored without them, in place, ordered by room number.
+
+    With the hotels `projection` the hotels were requested with, rooms keep
+    only the projected fields and a `name` added by `hotels_projection` is
+    removed again, so both layouts return the same documents.
+    """
+    fields = room_fields(projection)
+    rooms_projection = {"_id": 0} if fields is None else {"_id": 0, "hotel_name": 1, **dict.fromkeys(fields, 1)}
+    missing = {}
+    for hotel in hotels:
+        if "rooms" not in hotel:
+            hotel["rooms"] = []
+            missing.setdefault(hotel.get("name"), []).append(hotel)
+    if missing:
+        cursor = db[ROOMS_COLLECTION].find({"hotel_name": {"$in": list(missing)}}, rooms_projection)
+        async for room in cursor.sort([("hotel_name", 1), ("number", 1)]):
+            for hotel in missing[room.pop("hotel_name")]:
+                hotel["rooms"].append(dict(room))
+    if projection and hotels_projection(projection) is not projection:
+        for hotel in hotels:
+            hotel.pop("name", None)
+    return hotels
+
+
+async def iter_documents(db, section, projection=PUBLIC_PROJECTION, batch_size=HOTEL_BATCH_SIZE, query=None):
+    """Yield the documents of a section; hotels come in the nested shape whatever their layout."""
+    if section != "hotels" or not wants_rooms(projection):
+        async for document in db[section].find(query or {}, projection, batch_size=batch_size):
+            yield document
+        return
+
+    batch = []
+    async for hotel in db[section].find(query or {}, hotels_projection(projection), batch_size=batch_size):
+        batch.append(hotel)
+        if len(batch) >= batch_size:
+            for hotel in await attach_rooms(db, batch, projection):
+                yield hotel
+            batch = []
+    for hotel in await attach_rooms(db, batch, projection):
+        yield hotel
+
+
+async def insert_hotels(collections, hotels, layout=ROOMS_LAYOUT):
+    """Insert a batch of hotels into `collections` (section -> collection) in the given layout."""
+    if layout == "normalized":
+        hotels, rooms = split_hotels(hotels)
+        if rooms:
+            await collections[ROOMS_COLLECTION].insert_many(rooms, ordered=False)
+    await collections["hotels"].insert_many(hotels, ordered=False)
+
+
+def room_filter(hotel=None, room_type=None, min_price=None, max_price=None, available=None):
+    """Build a query on room fields (as stored in the `rooms` collection)."""
+    query = {}
+    if hotel is not None:
+        query["hotel_name"] = hotel
+    if room_type is not None:
+        query["type"] = room_type
+    if available is not None:
+        query["available"] = available
+    price = {}
+    if min_price is not None:
+        price["$gte"] = min_price
+    if max_price is not None:
+        price["$lte"] = max_price
+    if price:
+        query["price"] = price
+    return query
+
+
+async def find_rooms(db, query):
+    """Return rooms matching a `room_filter` query, sorted by hotel and number.
+
+    Normalized rooms are answered by an index scan of the `rooms` collection;
+    hotels still storing their rooms embedded are unwound as before.
+    """
+    rooms = await db[ROOMS_COLLECTION].find(query, {"_id": 0}).sort([("hotel_name", 1), ("number", 1)]).to_list(None)
+
+    hotel_match = {"rooms": {"$exists": True}}
+    if "hotel_name" in query:
+        hotel_match["name"] = query["hotel_name"]
+    room_match = {f"rooms.{name}": value for name, value in query.items() if name != "hotel_name"}
+    pipeline = [
+        {"$match": hotel_match},
+        {"$unwind": "$rooms"},
+        {"$match": room_match},
+        {"$project": {
+            "_id": 0, "hotel_name": "$name", "number": "$rooms.number", "type": "$rooms.type",
+            "price": "$rooms.price", "available": "$rooms.available",
+        }},
+        {"$sort": {"hotel_name": 1, "number": 1}},
+    ]
+    embedded = [room async for room in await db["hotels"].aggregate(pipeline)]
+    if rooms and embedded:
+        # Only while a migration is under way
+        return sorted(rooms + embedded, key=lambda room: (room.get("hotel_name") or "", room.get("number") or 0))
+    return rooms or embedded
+
+
+async def update_rooms(db, changes):
+    """Apply `{hotel_name, room_number, price?, available?}` changes to rooms in either layout.
+
+    The current values of the hotels in the batch are read first, so every
+    change gets a result (`updated`, `unchanged` or `not_found`) and only real
+    changes are written: embedded rooms through one unordered `bulk_write` with
+    a filtered positional `arrayFilters` update per room, normalized ones
+    through one on the `rooms` collection. Changed hotels lose their content
+    hash, so the next delta import compares them against the feed again.
+    Returns the per-change results and the applied values by (hotel, number).
+    """
+    names = list({change["hotel_name"] for change in changes})
+    fields = {f"rooms.{field}": 1 for field in ("number",) + UPDATABLE_FIELDS}
+    current = {}
+    embedded = set()
+    async for hotel in db["hotels"].find({"name": {"$in": names}}, {"_id": 0, "name": 1, **fields}):
+        if "rooms" in hotel:
+            embedded.add(hotel["name"])
+            for room in hotel["rooms"]:
+                current[(hotel["name"], room.get("number"))] = {field: room.get(field) for field in UPDATABLE_FIELDS}
+    normalized = [name for name in names if name not in embedded]
+    if normalized:
+        cursor = db[ROOMS_COLLECTION].find({"hotel_name": {"$in": normalized}}, {"_id": 0, "hotel_name": 1, "number": 1, **{field: 1 for field in UPDATABLE_FIELDS}})
+        async for room in cursor:
+            current[(room["hotel_name"], room.get("number"))] = {field: room.get(field) for field in UPDATABLE_FIELDS}
+
+    # Later changes of the same room in a batch see the earlier ones
+    results, applied = [], {}
+    for change in changes:
+        key = (change["hotel_name"], change["room_number"])
+        values = current.get(key)
+        if values is None:
+            status = "not_found"
+        else:
+            diff = {field: change[field] for field in UPDATABLE_FIELDS if change.get(field) is not None and values[field] != change[field]}
+            values.update(diff)
+            applied.setdefault(key, {}).update(diff)
+            status = "updated" if diff else "unchanged"
+        results.append({"hotel_name": key[0], "room_number": key[1], "status": status})
+    applied = {key: values for key, values in applied.items() if values}
+
+    hotel_operations, room_operations = [], []
+    for (hotel, number), values in applied.items():
+        if hotel in embedded:
+            hotel_operations.append(UpdateOne(
+                {"name": hotel},
+                {"$set": {f"rooms.$[room].{field}": value for field, value in values.items()}, "$unset": {HASH_FIELD: ""}},
+                array_filters=[{"room.number": number}],
+            ))
+        else:
+            room_operations.append(UpdateOne({"hotel_name": hotel, "number": number}, {"$set": values}))
+    normalized_changed = list({hotel for hotel, _ in applied if hotel not in embedded})
+    if normalized_changed:
+        hotel_operations.append(UpdateMany({"name": {"$in": normalized_changed}}, {"$unset": {HASH_FIELD: ""}}))
+    if room_operations:
+        await db[ROOMS_COLLECTION].bulk_write(room_operations, ordered=False)
+    if hotel_operations:
+        await db["hotels"].bulk_write(hotel_operations, ordered=False)
+    return results, applied
+
+
+async def migrate(db, layout, batch_size=HOTEL_BATCH_SIZE):
+    """Convert the live hotels to `layout` in place, batch by batch; safe to rerun after an interruption.
+
+    Rooms are written before they are removed from the other side, so readers
+    see every room at all times. Returns the number of hotels and rooms moved.
+    """
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown rooms layout: {layout}")
+    hotels, rooms = db["hotels"], db[ROOMS_COLLECTION]
+    query = {"rooms": {"$exists": layout == "normalized"}}
+    moved = {"hotels": 0, "rooms": 0}
+    last_id = None
+    while True:
+        batch_query = dict(query, _id={"$gt": last_id}) if last_id is not None else query
+        batch = await hotels.find(batch_query).sort("_id", 1).limit(batch_size).to_list(None)
+        if not batch:
+            return moved
+        last_id = batch[-1]["_id"]
+        names = list({hotel.get("name") for hotel in batch})
+
+        if layout == "normalized":
+            stored, room_documents = split_hotels(batch)
+            # Rooms left behind by an interrupted run are replaced
+            operations = [DeleteMany({"hotel_name": {"$in": names}})] + [InsertOne(room) for room in room_documents]
+            await rooms.bulk_write(operations, ordered=True)
+            await hotels.bulk_write([UpdateOne({"_id": hotel["_id"]}, {"$unset": {"rooms": ""}}) for hotel in stored], ordered=False)
+        else:
+            await attach_rooms(db, batch)
+            room_documents = [room for hotel in batch for room in hotel["rooms"]]
+            await hotels.bulk_write([UpdateOne({"_id": hotel["_id"]}, {"$set": {"rooms": hotel["rooms"]}}) for hotel in batch], ordered=False)
+            await rooms.delete_many({"hotel_name": {"$in": names}})
+        moved["hotels"] += len(batch)
+        moved["rooms"] += len(room_documents)
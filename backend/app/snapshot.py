@@ -0,0 +1,334 @@
+"""Optional read replica of the live dataset as memory-mapped Arrow files shared by all workers.
+
+With `SNAPSHOT_MODE=mmap` the first read of a new dataset generation starts
+building an immutable snapshot of it in `SNAPSHOT_DIR/g<generation>/`: one
+uncompressed Arrow IPC file per table (hotels, their rooms, guests and
+reservations). Strings are dictionary-encoded, so every distinct value is
+stored once; ISO dates become int32 day numbers; other values keep their
+type, and fields of mixed types are stored as JSON text. Hotels point at
+their rooms through the end offset of their slice of the rooms table.
+
+Every worker memory-maps the same files, so the data lives once in the page
+cache instead of once per worker, and `/api/data`, the ZIP exports and the
+analytics read it without a MongoDB round trip. Until the snapshot of the
+live generation exists, readers fall back to MongoDB.
+"""
+import asyncio
+import functools
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import time
+
+from starlette.concurrency import run_in_threadpool
+
+from .cache import generations
+from .columnar import read_table
+from .datasets import SECTIONS, current_generation, feed_in_threadpool
+from .pagination import STREAM_BATCH_SIZE
+from .responses import dumps
+from .rooms import iter_documents
+from .startup import LazyModule
+
+# Imported by the first snapshot build or load
+np = LazyModule("numpy")
+pa = LazyModule("pyarrow")
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_MODES = ("off", "mmap")
+
+# "mmap" serves reads from the shared snapshot of the live generation
+SNAPSHOT_MODE = os.getenv("SNAPSHOT_MODE", "off")
+
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR") or os.path.join(tempfile.gettempdir(), "hotel_reservations_snapshots")
+
+# Snapshots kept on disk, newest generations first
+SNAPSHOT_KEEP = int(os.getenv("SNAPSHOT_KEEP", "2"))
+
+# A build lock older than this is left over by a worker that died
+SNAPSHOT_LOCK_TIMEOUT = float(os.getenv("SNAPSHOT_LOCK_TIMEOUT", "600"))
+
+# Table holding the rooms of all hotels, in hotel order
+ROOMS_TABLE = "rooms"
+
+# Column of the hotels table holding the end offset of each hotel's rooms
+_ROOMS_END = "__rooms_end"
+
+# Column of the hotels table marking hotels stored without a `rooms` list
+_NO_ROOMS = "__no_rooms"
+
+_ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+# Marks a field a document does not have
+_MISSING = object()
+
+
+def _column_kind(values):
+    """The storage kind of a column: date, string, value (bool/int/float) or json."""
+    present = [value for value in values if value is not _MISSING]
+    if any(value is None for value in present):
+        return "json"
+    if all(type(value) is str for value in present):
+        return "date" if present and all(_ISO_DATE.match(value) for value in present) else "string"
+    for kind in (bool, int, float):
+        if all(type(value) is kind for value in present):
+            return "value"
+    return "json"
+
+
+def encode_column(values):
+    """Encode a list of values (`_MISSING` where absent) as an Arrow array; return it and its kind."""
+    kind = _column_kind(values)
+    if kind == "date":
+        try:
+            days = np.array([value if value is not _MISSING else "NaT" for value in values], dtype="datetime64[D]")
+            return pa.array(days, from_pandas=True), kind
+        except ValueError:
+            kind = "string"
+    if kind == "string":
+        strings = pa.array([None if value is _MISSING else value for value in values], type=pa.string())
+        return strings.dictionary_encode(), kind
+    if kind == "value":
+        try:
+            return pa.array([None if value is _MISSING else value for value in values]), kind
+        except (OverflowError, pa.ArrowException):
+            kind = "json"
+    return pa.array([None if value is _MISSING else dumps(value).decode("utf-8") for value in values], type=pa.string()), "json"
+
+
+def decode_column(array, kind):
+    """Python values of an encoded column, `_MISSING` where the document had no such field."""
+    if kind == "string":
+        dictionary = array.dictionary.to_pylist()
+        return [_MISSING if code is None else dictionary[code] for code in array.indices.to_pylist()]
+    if kind == "date":
+        array = array.cast(pa.string())
+    values = array.to_pylist()
+    if kind == "json":
+        return [_MISSING if value is None else json.loads(value) for value in values]
+    if array.null_count:
+        return [_MISSING if value is None else value for value in values]
+    return values
+
+
+class TableBuilder:
+    """Collects documents column by column, keeping the order in which fields first appear."""
+
+    def __init__(self):
+        self.columns = {}
+        self.rows = 0
+
+    def add(self, document):
+        for name, value in document.items():
+            column = self.columns.get(name)
+            if column is None:
+                column = self.columns[name] = [_MISSING] * self.rows
+            column.append(value)
+        self.rows += 1
+        for column in self.columns.values():
+            if len(column) < self.rows:
+                column.append(_MISSING)
+
+    def build(self):
+        arrays, kinds = {}, {}
+        for name, values in self.columns.items():
+            arrays[name], kinds[name] = encode_column(values)
+        schema = pa.schema([(name, array.type) for name, array in arrays.items()], metadata={"kinds": json.dumps(kinds)})
+        return pa.Table.from_arrays(list(arrays.values()), schema=schema)
+
+
+class SnapshotBuilder:
+    """Collects the documents of every section (hotels in the nested shape) into snapshot tables."""
+
+    def __init__(self):
+        self.tables = {section: TableBuilder() for section in SECTIONS + (ROOMS_TABLE,)}
+
+    def add(self, section, documents):
+        table = self.tables[section]
+        rooms = self.tables[ROOMS_TABLE]
+        for document in documents:
+            if section == "hotels":
+                if isinstance(document.get("rooms"), list):
+                    for room in document["rooms"]:
+                        rooms.add(room)
+                    document = {name: value for name, value in document.items() if name != "rooms"}
+                elif "rooms" not in document:
+                    # Read back without the field rather than with no rooms
+                    document = dict(document, **{_NO_ROOMS: True})
+                document = dict(document, **{_ROOMS_END: rooms.rows})
+            table.add(document)
+
+    def write(self, directory):
+        os.makedirs(directory)
+        for name, table in self.tables.items():
+            table = table.build()
+            with pa.OSFile(os.path.join(directory, f"{name}.arrow"), "wb") as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+
+
+class Snapshot:
+    """Read-only view over the memory-mapped tables of one dataset generation."""
+
+    __slots__ = ("generation", "path", "tables", "kinds")
+
+    def __init__(self, generation, path):
+        self.generation = generation
+        self.path = path
+        self.tables = {}
+        self.kinds = {}
+        for name in SECTIONS + (ROOMS_TABLE,):
+            table = read_table(os.path.join(path, f"{name}.arrow"))
+            self.tables[name] = table
+            self.kinds[name] = json.loads(table.schema.metadata[b"kinds"])
+
+    def count(self, section):
+        return self.tables[section].num_rows
+
+    def documents(self, section, start=0, stop=None):
+        """Rows [start, stop) of a section as documents; hotels come with their rooms."""
+        documents = self._decode(section, start, stop)
+        if section == "hotels":
+            self._attach_rooms(documents, start)
+        return documents
+
+    def _decode(self, name, start, stop):
+        table = self.tables[name].slice(start, None if stop is None else max(stop - start, 0))
+        kinds = self.kinds[name]
+        names = table.column_names
+        columns = [decode_column(table.column(field).combine_chunks(), kinds[field]) for field in names]
+        return [
+            {field: value for field, value in zip(names, row) if value is not _MISSING}
+            for row in zip(*columns)
+        ]
+
+    def _attach_rooms(self, hotels, start):
+        # Each hotel's rooms end where the next hotel's begin
+        first = self.tables["hotels"].column(_ROOMS_END)[start - 1].as_py() if start else 0
+        last = hotels[-1][_ROOMS_END] if hotels else first
+        rooms = self._decode(ROOMS_TABLE, first, last)
+        position = first
+        for hotel in hotels:
+            end = hotel.pop(_ROOMS_END)
+            if not hotel.pop(_NO_ROOMS, False) and "rooms" not in hotel:
+                hotel["rooms"] = rooms[position - first:end - first]
+            position = end
+
+    async def iter_documents(self, section, batch_size=STREAM_BATCH_SIZE):
+        """Yield the documents of a section, decoded a batch at a time in a worker thread."""
+        for start in range(0, self.count(section), batch_size):
+            for document in await run_in_threadpool(self.documents, section, start, start + batch_size):
+                yield document
+
+    def column(self, section, name):
+        """The Arrow array and kind of a field, or (None, None) if no document has it."""
+        table = self.tables[section]
+        if name not in table.column_names:
+            return None, None
+        return table.column(name).combine_chunks(), self.kinds[section][name]
+
+
+class SnapshotEngine:
+    """Per-worker handle on the snapshot of the live generation, built by one worker at a time."""
+
+    def __init__(self, directory=SNAPSHOT_DIR, mode=SNAPSHOT_MODE):
+        if mode not in SNAPSHOT_MODES:
+            raise ValueError(f"Unknown snapshot mode: {mode}")
+        self.directory = directory
+        self.enabled = mode == "mmap"
+        self.snapshot = None
+        self._building = None
+
+    def path(self, generation):
+        return os.path.join(self.directory, f"g{generation}")
+
+    async def get(self, db):
+        """The snapshot of the live generation, or None (and a build started) while it does not exist."""
+        if not self.enabled:
+            return None
+        generation = await generations.get(db)
+        if self.snapshot is not None and self.snapshot.generation == generation:
+            return self.snapshot
+        path = self.path(generation)
+        if os.path.isdir(path):
+            try:
+                self.snapshot = await run_in_threadpool(Snapshot, generation, path)
+                return self.snapshot
+            except Exception as e:
+                logger.warning("Could not open snapshot %s: %s", path, e)
+                return None
+        self.start_build(db, generation)
+        return None
+
+    def start_build(self, db, generation):
+        if self.enabled and (self._building is None or self._building.done()):
+            self._building = asyncio.create_task(self.build(db, generation))
+
+    def _acquire(self, lock):
+        try:
+            os.close(os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock) > SNAPSHOT_LOCK_TIMEOUT:
+                    os.remove(lock)
+                    return self._acquire(lock)
+            except FileNotFoundError:
+                pass
+            return False
+
+    async def build(self, db, generation):
+        """Write the snapshot of `generation` unless it exists or another worker is writing it."""
+        path = self.path(generation)
+        os.makedirs(self.directory, exist_ok=True)
+        lock = path + ".lock"
+        if os.path.isdir(path) or not self._acquire(lock):
+            return
+        staging = f"{path}.{os.getpid()}.tmp"
+        try:
+            start = time.perf_counter()
+            builder = SnapshotBuilder()
+            for section in SECTIONS:
+                # Splitting documents into columns is per-field Python work, done in worker threads
+                documents = iter_documents(db, section, batch_size=STREAM_BATCH_SIZE)
+                await feed_in_threadpool(documents, functools.partial(builder.add, section), STREAM_BATCH_SIZE)
+            # An import that finished meanwhile would leave a mix of two generations
+            if await current_generation(db) != generation:
+                return
+            await run_in_threadpool(builder.write, staging)
+            os.replace(staging, path)
+            logger.info("Snapshot of generation %s written in %.1f s", generation, time.perf_counter() - start)
+            self.prune()
+        except Exception as e:
+            logger.warning("Could not build snapshot of generation %s: %s", generation, e)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+            try:
+                os.remove(lock)
+            except FileNotFoundError:
+                pass
+
+    def prune(self, keep=SNAPSHOT_KEEP):
+        """Remove all but the `keep` newest snapshots; files still mapped by a worker stay until unmapped."""
+        found = []
+        for name in os.listdir(self.directory):
+            if re.fullmatch(r"g\d+", name):
+                found.append(int(name[1:]))
+        for generation in sorted(found, reverse=True)[keep:]:
+            # Windows refuses to delete mapped files; they are retried by the next prune
+            shutil.rmtree(self.path(generation), ignore_errors=True)
+
+
+engine = SnapshotEngine()
+
+
+async def iter_section(db, section, batch_size=STREAM_BATCH_SIZE):
+    """Yield the public documents of a section from the snapshot when there is one, else from MongoDB."""
+    snapshot = await engine.get(db)
+    documents = snapshot.iter_documents(section, batch_size) if snapshot else iter_documents(db, section, batch_size=batch_size)
+    async for document in documents:
+        yield document
@@ -0,0 +1,72 @@
+"""Import and startup timings of API worker processes, and lazily imported heavy modules.
+
+`app.main` imports this module first, so the import time of a worker covers
+FastAPI and every application module. Heavy libraries (pandas, NumPy,
+pyarrow, jsonschema) are bound to `LazyModule` stand-ins and imported by the
+first request that needs them instead of by every worker on start.
+"""
+import importlib
+import logging
+import os
+import sys
+import time
+
+# Taken before anything else of the app is imported
+_IMPORT_STARTED = time.perf_counter()
+
+from .metrics import LAZY_IMPORT_SECONDS, WORKER_IMPORT_SECONDS, WORKER_STARTUP_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class LazyModule:
+    """Stand-in for a module that is imported on first attribute access."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attribute):
+        module = self._module
+        if module is None:
+            module = self._load()
+        return getattr(module, attribute)
+
+    def _load(self):
+        loaded = self._name in sys.modules
+        start = time.perf_counter()
+        module = importlib.import_module(self._name)
+        if not loaded:
+            elapsed = time.perf_counter() - start
+            LAZY_IMPORT_SECONDS.set(self._name, value=round(elapsed, 4))
+            logger.info("Imported %s on first use in %.0f ms", self._name, elapsed * 1000)
+        self._module = module
+        return module
+
+
+class StartupTimer:
+    """Measures how long a worker took to import the app and to become ready."""
+
+    def __init__(self):
+        self.import_started = _IMPORT_STARTED
+        self.import_seconds = None
+        self.startup_seconds = None
+
+    def imports_done(self):
+        self.import_seconds = time.perf_counter() - self.import_started
+        WORKER_IMPORT_SECONDS.set(value=round(self.import_seconds, 4))
+
+    def ready(self):
+        """Record the time from process start (interpreter included) to a running lifespan."""
+        import psutil
+
+        self.startup_seconds = time.time() - psutil.Process().create_time()
+        WORKER_STARTUP_SECONDS.set(value=round(self.startup_seconds, 4))
+        logger.info(
+            "Worker %d ready in %.0f ms (app imports %.0f ms)",
+            os.getpid(), self.startup_seconds * 1000, (self.import_seconds or 0) * 1000,
+        )
+        return self.startup_seconds
+
+
+startup_timer = StartupTimer()
@@ -0,0 +1,145 @@
+"""Materialized per-hotel statistics kept in the `stats` collection.
+
+The collection belongs to the dataset generation like the sections: imports
+write it into their staging collections and in-place changes update it before
+the generation number moves, so `/api/stats` never caches old numbers for a
+new generation.
+"""
+from pymongo import DeleteOne, ReplaceOne
+
+from .datasets import STATS_COLLECTION
+from .rooms import iter_documents
+
+# Same buckets as the price chart of the dashboard
+PRICE_RANGES = [(300, "0-300"), (500, "301-500"), (800, "501-800"), (1000, "801-1000"), (None, "1000+")]
+
+
+def price_range(price):
+    for limit, label in PRICE_RANGES:
+        if limit is None or price <= limit:
+            return label
+
+
+def _increment(counter, key, amount=1):
+    counter[key] = counter.get(key, 0) + amount
+
+
+class StatsBuilder:
+    """Accumulates per-hotel statistics from hotels and reservations, possibly batch by batch."""
+
+    def __init__(self):
+        self.hotels = {}
+
+    def _entry(self, name):
+        if name not in self.hotels:
+            self.hotels[name] = {
+                "_id": name,
+                "hotel_name": name,
+                "location": None,
+                "stars": None,
+                "rooms": 0,
+                "available_rooms": 0,
+                "price_total": 0,
+                "room_types": {},
+                "price_ranges": {},
+                "reservations": 0,
+                "reservations_by_status": {},
+            }
+        return self.hotels[name]
+
+    def add_hotels(self, hotels):
+        for hotel in hotels:
+            entry = self._entry(hotel.get("name"))
+            entry["location"] = hotel.get("location")
+            entry["stars"] = hotel.get("stars")
+            for room in hotel.get("rooms") or []:
+                entry["rooms"] += 1
+                entry["available_rooms"] += bool(room.get("available"))
+                _increment(entry["room_types"], room.get("type") or "unknown")
+                price = room.get("price")
+                if price is not None:
+                    entry["price_total"] += price
+                    _increment(entry["price_ranges"], price_range(price))
+
+    def add_status_count(self, hotel_name, status, count):
+        entry = self._entry(hotel_name)
+        entry["reservations"] += count
+        _increment(entry["reservations_by_status"], status or "unknown", count)
+
+    def add_reservations(self, reservations):
+        for reservation in reservations:
+            self.add_status_count(reservation.get("hotel_name"), reservation.get("status"), 1)
+
+    def build(self):
+        for entry in self.hotels.values():
+            entry["average_price"] = round(entry["price_total"] / entry["rooms"], 2) if entry["rooms"] else None
+        return self.hotels
+
+
+async def write_stats(db, documents, hotel_names=None):
+    """Store freshly built statistics, writing only the hotels whose numbers changed.
+
+    Hotels in scope (`hotel_names`, or all of them) without a new document are removed.
+    """
+    collection = db[STATS_COLLECTION]
+    query = {} if hotel_names is None else {"_id": {"$in": list(hotel_names)}}
+    existing = {doc["_id"]: doc async for doc in collection.find(query)}
+
+    operations = [
+        ReplaceOne({"_id": name}, document, upsert=True)
+        for name, document in documents.items()
+        if existing.get(name) != document
+    ]
+    operations += [DeleteOne({"_id": name}) for name in existing if name not in documents]
+    if operations:
+        await collection.bulk_write(operations, ordered=False)
+    return len(operations)
+
+
+async def refresh_stats(db, hotel_names=None):
+    """Recompute statistics from the collections of `db` for some hotels (or all of them)."""
+    builder = StatsBuilder()
+    hotel_query = {} if hotel_names is None else {"name": {"$in": list(hotel_names)}}
+    projection = {"_id": 0, "name": 1, "location": 1, "stars": 1, "rooms": 1}
+    async for hotel in iter_documents(db, "hotels", projection, query=hotel_query):
+        builder.add_hotels([hotel])
+
+    pipeline = [{"$group": {"_id": {"hotel": "$hotel_name", "status": "$status"}, "count": {"$sum": 1}}}]
+    if hotel_names is not None:
+        pipeline.insert(0, {"$match": {"hotel_name": {"$in": list(hotel_names)}}})
+    async for group in await db["reservations"].aggregate(pipeline):
+        builder.add_status_count(group["_id"].get("hotel"), group["_id"].get("status"), group["count"])
+
+    return await write_stats(db, builder.build(), hotel_names)
+
+
+async def ensure_stats(db):
+    """Compute the statistics of a dataset stored before they were staged with it."""
+    if db.names[STATS_COLLECTION] not in await db.list_collection_names():
+        await refresh_stats(db)
+
+
+def summarize_stats(hotels):
+    """Combine per-hotel statistics documents into the dashboard totals."""
+    totals = {
+        "hotels": 0,
+        "rooms": 0,
+        "available_rooms": 0,
+        "reservations": 0,
+        "reservations_by_status": {},
+        "room_types": {},
+        "price_ranges": {},
+        "hotels_by_location": {},
+    }
+    for hotel in hotels:
+        totals["rooms"] += hotel["rooms"]
+        totals["available_rooms"] += hotel["available_rooms"]
+        totals["reservations"] += hotel["reservations"]
+        for field in ("reservations_by_status", "room_types", "price_ranges"):
+            for key, count in hotel[field].items():
+                _increment(totals[field], key, count)
+        # Entries created only from reservations have no hotel document behind them
+        if hotel["location"] is not None:
+            totals["hotels"] += 1
+            _increment(totals["hotels_by_location"], hotel["location"])
+    return {"totals": totals, "hotels": hotels}
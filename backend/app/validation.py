@@ -0,0 +1,123 @@
+"""JSON Schema validation of dataset records with a compiled, cached validator."""
+import asyncio
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from .datasets import SECTIONS
+from .startup import LazyModule
+
+# Imported by the first validation, in the API process and in each pool worker
+jsonschema = LazyModule("jsonschema")
+
+SCHEMA_PATH = os.getenv(
+    "SCHEMA_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "data", "schema", "hotel_reservation_schema.json"),
+)
+
+# Records are validated in worker processes once a dataset has at least this many
+PARALLEL_THRESHOLD = int(os.getenv("VALIDATION_PARALLEL_THRESHOLD", "5000"))
+VALIDATION_WORKERS = int(os.getenv("VALIDATION_WORKERS", "0")) or os.cpu_count() or 1
+VALIDATION_CHUNK_SIZE = int(os.getenv("VALIDATION_CHUNK_SIZE", "2000"))
+
+# Errors listed in API responses; the count is always complete
+VALIDATION_REPORT_LIMIT = int(os.getenv("VALIDATION_REPORT_LIMIT", "100"))
+
+_executor = None
+
+
+@lru_cache(maxsize=None)
+def get_validators(schema_path=SCHEMA_PATH):
+    """Load the schema once and compile one item validator per section."""
+    with open(schema_path, "r", encoding="utf-8") as file:
+        schema = json.load(file)
+    Draft7Validator = jsonschema.Draft7Validator
+    Draft7Validator.check_schema(schema)
+    return {
+        section: Draft7Validator(schema["properties"][section]["items"], format_checker=Draft7Validator.FORMAT_CHECKER)
+        for section in SECTIONS
+    }
+
+
+def _pointer(parts):
+    return "/" + "/".join(str(part).replace("~", "~0").replace("/", "~1") for part in parts)
+
+
+def validate_chunk(section, offset, documents):
+    """Validate consecutive records of one section starting at index `offset`; return all errors."""
+    validator = get_validators()[section]
+    errors = []
+    for index, document in enumerate(documents, start=offset):
+        for error in validator.iter_errors(document):
+            errors.append({
+                "section": section,
+                "index": index,
+                "path": _pointer([section, index, *error.absolute_path]),
+                "message": error.message,
+            })
+    return errors
+
+
+def validate_batch(section, offset, documents):
+    """`validate_chunk` for inserted documents, whose `_id`s added by insert_many are not part of the schema."""
+    return validate_chunk(section, offset, [{k: v for k, v in document.items() if k != "_id"} for document in documents])
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        # Spawned workers do not inherit the event loop or open sockets of the API process
+        _executor = ProcessPoolExecutor(VALIDATION_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+
+def iter_chunks(data, chunk_size=VALIDATION_CHUNK_SIZE):
+    """Yield (section, offset, documents) slices of a loaded dataset."""
+    for section in SECTIONS:
+        documents = data.get(section) or []
+        for offset in range(0, len(documents), chunk_size):
+            yield section, offset, documents[offset:offset + chunk_size]
+
+
+def validate_dataset(data):
+    """Validate every record of a loaded dataset, fanning out to processes for large inputs."""
+    chunks = list(iter_chunks(data))
+    total = sum(len(documents) for _, _, documents in chunks)
+    if total < PARALLEL_THRESHOLD or VALIDATION_WORKERS < 2:
+        results = [validate_chunk(*chunk) for chunk in chunks]
+    else:
+        results = _get_executor().map(validate_chunk, *zip(*chunks))
+    return [error for errors in results for error in errors]
+
+
+class BatchValidator:
+    """Validates batches as an upload streams in, never on the event loop.
+
+    Batches go to worker processes once the upload is large (and more than one
+    is configured), otherwise to the default thread pool.
+    """
+
+    def __init__(self):
+        self.offsets = {section: 0 for section in SECTIONS}
+        self.pending = []
+        self.errors = []
+
+    def submit(self, section, documents):
+        offset = self.offsets[section]
+        self.offsets[section] += len(documents)
+        parallel = offset + len(documents) >= PARALLEL_THRESHOLD and VALIDATION_WORKERS >= 2
+        loop = asyncio.get_running_loop()
+        self.pending.append(loop.run_in_executor(_get_executor() if parallel else None, validate_batch, section, offset, documents))
+
+    async def result(self):
+        for errors in await asyncio.gather(*self.pending):
+            self.errors.extend(errors)
+        self.pending = []
+        self.errors.sort(key=lambda error: (SECTIONS.index(error["section"]), error["index"]))
+        return self.errors
+
+
+def summarize_errors(errors, limit=VALIDATION_REPORT_LIMIT):
+    return {"count": len(errors), "items": errors[:limit]}
@@ -1,4 +1,71 @@
+"""Start the API with the development (auto-reload) or production (multi-worker) profile."""
+import argparse
+import os
+
 import uvicorn
 
+PROFILES = ("dev", "prod")
+SERVERS = ("uvicorn", "gunicorn")
+
+
+def default_workers():
+    return int(os.getenv("WEB_CONCURRENCY", "0")) or os.cpu_count() or 1
+
+
+def run_gunicorn(host, port, workers, access_log):
+    """Pre-fork Uvicorn workers from a master that has imported the app once."""
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        raise SystemExit("gunicorn is not installed (pip install gunicorn); it only runs on Linux/macOS, use --server uvicorn otherwise")
+
+    from app.main import app
+
+    class Application(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"{host}:{port}")
+            self.cfg.set("workers", workers)
+            self.cfg.set("worker_class", "uvicorn.workers.UvicornWorker")
+            # Workers are forked from the imported app; the MongoDB client is
+            # only created by each worker's lifespan (see app/db.py)
+            self.cfg.set("preload_app", True)
+            if access_log:
+                self.cfg.set("accesslog", "-")
+
+        def load(self):
+            return app
+
+    Application().run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the Hotel Reservations API")
+    parser.add_argument("--profile", choices=PROFILES, default=os.getenv("RUN_PROFILE", "dev"),
+                        help="dev: one auto-reloading process; prod: several workers without reload")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes in prod (default: WEB_CONCURRENCY or CPU count)")
+    parser.add_argument("--server", choices=SERVERS, default=os.getenv("RUN_SERVER", "uvicorn"),
+                        help="Process manager of the prod workers")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--access-log", action=argparse.BooleanOptionalAction, default=None,
+                        help="Log every request (default: on in dev, off in prod)")
+    args = parser.parse_args()
+
+    if args.profile == "dev":
+        uvicorn.run("app.main:app", host=args.host, port=args.port, reload=True, access_log=args.access_log is not False)
+        return
+
+    workers = args.workers or default_workers()
+    access_log = bool(args.access_log)
+    # Share the cores between the API workers and their validation pools; at least two
+    # processes, so large uploads still fan out (a pool is only started by a large upload)
+    os.environ.setdefault("VALIDATION_WORKERS", str(max(2, (os.cpu_count() or 1) // workers)))
+
+    if args.server == "gunicorn":
+        run_gunicorn(args.host, args.port, workers, access_log)
+    else:
+        uvicorn.run("app.main:app", host=args.host, port=args.port, workers=workers, access_log=access_log)
+
+
 if __name__ == "__main__":
-    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
+    main()
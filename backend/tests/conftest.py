@@ -0,0 +1,209 @@
+import functools
+import os
+import re
+import sys
+import uuid
+
+import pytest
+from anyio.from_thread import start_blocking_portal
+from pymongo import DeleteOne, InsertOne, ReplaceOne, UpdateMany, UpdateOne
+
+# Tests import the API package as `app`, like the scripts do
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# Runs the database tests against a real server instead of mongomock when set
+MONGO_TEST_URI = os.getenv("MONGO_TEST_URI")
+
+requires_server = pytest.mark.skipif(not MONGO_TEST_URI, reason="needs MONGO_TEST_URI (not supported by mongomock)")
+
+
+class AsyncCursor:
+    """Async iteration over a mongomock cursor, shaped like a PyMongo async cursor."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def sort(self, *args, **kwargs):
+        self._cursor = self._cursor.sort(*args, **kwargs)
+        return self
+
+    def limit(self, count):
+        self._cursor = self._cursor.limit(count)
+        return self
+
+    async def to_list(self, length=None):
+        documents = list(self._cursor)
+        return documents if length is None else documents[:length]
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for document in self._cursor:
+            yield document
+
+
+class AsyncCollection:
+    """Awaitable methods over a mongomock collection, as `AsyncMongoClient` collections have them."""
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    @property
+    def name(self):
+        return self._collection.name
+
+    def find(self, *args, **kwargs):
+        return AsyncCursor(self._collection.find(*args, **kwargs))
+
+    async def aggregate(self, pipeline, **kwargs):
+        return AsyncCursor(self._collection.aggregate(pipeline, **kwargs))
+
+    async def index_information(self):
+        information = self._collection.index_information()
+        for info in information.values():
+            info["key"] = list(info["key"])
+        return information
+
+    async def create_indexes(self, indexes):
+        names = []
+        for index in indexes:
+            document = dict(index.document)
+            names.append(self._collection.create_index(list(document.pop("key").items()), **document))
+        return names
+
+    async def bulk_write(self, operations, ordered=True):
+        # mongomock's own bulk_write does not know the `sort` option of newer PyMongo operations
+        collection = self._collection
+        for operation in operations:
+            if isinstance(operation, InsertOne):
+                collection.insert_one(operation._doc)
+            elif isinstance(operation, ReplaceOne):
+                collection.replace_one(operation._filter, operation._doc, upsert=operation._upsert)
+            elif isinstance(operation, (UpdateOne, UpdateMany)) and operation._array_filters:
+                _update_with_array_filters(collection, operation)
+            elif isinstance(operation, (UpdateOne, UpdateMany)):
+                update = collection.update_one if isinstance(operation, UpdateOne) else collection.update_many
+                update(operation._filter, operation._doc, upsert=operation._upsert)
+            elif isinstance(operation, DeleteOne):
+                collection.delete_one(operation._filter)
+            else:
+                collection.delete_many(operation._filter)
+
+    def __getattr__(self, name):
+        method = getattr(self._collection, name)
+
+        @functools.wraps(method)
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+
+        return call
+
+
+def _update_with_array_filters(collection, operation):
+    """mongomock has no `arrayFilters`: apply `$set` of `array.$[name].field` and top-level `$unset` in Python.
+
+    Only equality filters (`{"name.field": value}`) are supported, which is all the API uses.
+    """
+    cursor = collection.find(operation._filter)
+    if isinstance(operation, UpdateOne):
+        cursor = cursor.limit(1)
+    for document in list(cursor):
+        for path, value in operation._doc.get("$set", {}).items():
+            array, identifier, field = re.fullmatch(r"(\w+)\.\$\[(\w+)\]\.(\w+)", path).groups()
+            conditions = {
+                key.split(".", 1)[1]: expected
+                for array_filter in operation._array_filters
+                for key, expected in array_filter.items()
+                if key.split(".", 1)[0] == identifier
+            }
+            for element in document.get(array) or []:
+                if all(element.get(key) == expected for key, expected in conditions.items()):
+                    element[field] = value
+        for path in operation._doc.get("$unset", {}):
+            document.pop(path, None)
+        unsupported = set(operation._doc) - {"$set", "$unset"}
+        if unsupported:
+            raise NotImplementedError(f"array filters with {sorted(unsupported)}")
+        collection.replace_one({"_id": document["_id"]}, document)
+
+
+class AsyncDatabase:
+    """An async facade of a mongomock database for the code written against `AsyncMongoClient`."""
+
+    def __init__(self, database):
+        self._database = database
+
+    @property
+    def name(self):
+        return self._database.name
+
+    def __getitem__(self, name):
+        return AsyncCollection(self._database[name])
+
+    async def list_collection_names(self):
+        return self._database.list_collection_names()
+
+    async def create_collection(self, name, **kwargs):
+        return AsyncCollection(self._database.create_collection(name, **kwargs))
+
+    async def drop_collection(self, name):
+        self._database.drop_collection(name)
+
+
+@pytest.fixture
+def portal():
+    """An event loop in a background thread that the whole test runs its coroutines on."""
+    with start_blocking_portal() as portal:
+        yield portal
+
+
+@pytest.fixture
+def run(portal):
+    """`run(async_function, *args)` calls it on the test's event loop and returns the result."""
+    return portal.call
+
+
+@pytest.fixture
+def mongo(portal):
+    """A fresh, empty database: a throwaway one on MONGO_TEST_URI, else an in-memory mongomock one."""
+    if MONGO_TEST_URI:
+        from pymongo import AsyncMongoClient
+
+        client = AsyncMongoClient(MONGO_TEST_URI)
+        name = f"hotel_reservations_test_{uuid.uuid4().hex[:8]}"
+        yield client[name]
+        portal.call(_drop, client, name)
+    else:
+        import mongomock
+
+        yield AsyncDatabase(mongomock.MongoClient()[f"test_{uuid.uuid4().hex[:8]}"])
+
+
+async def _drop(client, name):
+    await client.drop_database(name)
+    await client.close()
+
+
+@pytest.fixture
+def api(mongo, portal, tmp_path, monkeypatch):
+    """A TestClient of the API on the `mongo` database, with every per-worker cache reset."""
+    from fastapi.testclient import TestClient
+
+    from app import analytics, availability, guests, snapshot
+    from app.cache import cache, generations
+    from app.jobs import jobs
+    from app.main import app
+
+    cache.clear()
+    generations.live = None
+    monkeypatch.setattr(availability.engine, "index", None)
+    monkeypatch.setattr(guests.engine, "index", None)
+    monkeypatch.setattr(analytics.engine, "arrays", None)
+    monkeypatch.setattr(snapshot.engine, "enabled", False)
+    monkeypatch.setattr(jobs, "directory", str(tmp_path / "jobs"))
+    monkeypatch.setattr(app.state, "db", mongo, raising=False)
+    client = TestClient(app)
+    # Requests share the test's event loop; the lifespan (and its real MongoDB client) does not run
+    client.portal = portal
+    return client
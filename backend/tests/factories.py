@@ -0,0 +1,53 @@
+"""Small datasets for the tests, as Python dicts and as upload files."""
+import yaml
+
+from app.datasets import live_dataset
+from app.rooms import migrate
+
+
+def hotel(name, rooms=(101, 102), location="Zakopane", price=400, available=True):
+    return {
+        "name": name,
+        "location": location,
+        "stars": 4,
+        "rooms": [{"number": number, "type": "double", "price": price, "available": available} for number in rooms],
+    }
+
+
+def guest(email, first_name="Anna", last_name="Nowak"):
+    return {"first_name": first_name, "last_name": last_name, "email": email, "phone": "+48600100200"}
+
+
+def reservation(email, hotel_name, room_number, start, end, status="confirmed"):
+    return {
+        "guest_email": email,
+        "hotel_name": hotel_name,
+        "room_number": room_number,
+        "start_date": start,
+        "end_date": end,
+        "status": status,
+    }
+
+
+def dataset(hotel_name="H", email="anna.nowak@example.com"):
+    """One hotel with two rooms, one guest and one confirmed reservation of room 101."""
+    return {
+        "hotels": [hotel(hotel_name)],
+        "guests": [guest(email)],
+        "reservations": [reservation(email, hotel_name, 101, "2025-06-01", "2025-06-07")],
+    }
+
+
+def to_yaml(data):
+    return yaml.safe_dump(data, sort_keys=False).encode("utf-8")
+
+
+def upload(api, data, **params):
+    """POST a dataset to the upload endpoint; returns the response."""
+    content = data if isinstance(data, bytes) else to_yaml(data)
+    return api.post("/api/reservations/upload", params=params, files={"file": ("data.yaml", content)})
+
+
+def normalize(mongo, run):
+    """Move the rooms of the live hotels into the `rooms` collection."""
+    run(migrate, run(live_dataset, mongo), "normalized")
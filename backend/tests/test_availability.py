@@ -0,0 +1,124 @@
+import asyncio
+from datetime import date
+
+from app import analytics, availability
+from app.availability import IndexBuilder
+from app.datasets import live_dataset
+from app.conflicts import find_conflicts
+from factories import dataset, guest, hotel, normalize, reservation, upload
+
+EMAIL = "anna.nowak@example.com"
+
+
+def build(hotels, reservations):
+    builder = IndexBuilder()
+    builder.add_hotels(hotels)
+    builder.add_reservations(reservations)
+    return builder.build(1)
+
+
+def free(index, start="2025-06-01", end="2025-06-07", **filters):
+    return [room["room_number"] for room in index.free_rooms(date.fromisoformat(start), date.fromisoformat(end), **filters)]
+
+
+def test_overlapping_reservations_block_their_room():
+    index = build([hotel("H")], [reservation(EMAIL, "H", 101, "2025-06-05", "2025-06-10")])
+    assert free(index) == [102]
+    # Checkout day is free again
+    assert free(index, "2025-06-10", "2025-06-12") == [101, 102]
+    assert free(index, "2025-05-01", "2025-06-05") == [101, 102]
+
+
+def test_rooms_marked_unavailable_are_never_free():
+    index = build([hotel("H", rooms=(101,)), hotel("G", rooms=(201,), available=False)], [])
+    assert free(index) == [101]
+    assert free(index, hotel="G") == []
+
+
+def test_pending_blocks_and_cancelled_does_not():
+    reservations = [
+        reservation(EMAIL, "H", 101, "2025-06-01", "2025-06-07", status="pending"),
+        reservation(EMAIL, "H", 102, "2025-06-01", "2025-06-07", status="cancelled"),
+    ]
+    assert free(build([hotel("H")], reservations)) == [102]
+
+
+def test_double_booking_check_uses_the_same_statuses():
+    data = {
+        "hotels": [hotel("H")],
+        "guests": [guest(EMAIL)],
+        "reservations": [
+            reservation(EMAIL, "H", 101, "2025-06-01", "2025-06-07"),
+            reservation(EMAIL, "H", 101, "2025-06-03", "2025-06-05", status="pending"),
+            reservation(EMAIL, "H", 101, "2025-06-02", "2025-06-04", status="cancelled"),
+        ],
+    }
+    overlaps = find_conflicts(data)["overlaps"]
+    assert [(entry["index"], entry["conflicts_with"]) for entry in overlaps] == [(1, 0)]
+
+
+def test_filters_by_type_and_price():
+    index = build([hotel("H", rooms=(101,), price=300), hotel("G", rooms=(201,), price=900)], [])
+    assert free(index, max_price=500) == [101]
+    assert free(index, room_type="single") == []
+
+
+def test_availability_endpoint(api):
+    data = dataset("H")
+    data["hotels"].append(hotel("Closed", rooms=(301,), available=False))
+    upload(api, data)
+
+    response = api.get("/api/availability", params={"from": "2025-06-02", "to": "2025-06-03"})
+    assert response.status_code == 200, response.text
+    assert [(room["hotel_name"], room["room_number"]) for room in response.json()["rooms"]] == [("H", 102)]
+    assert api.get("/api/availability", params={"from": "2025-06-03", "to": "2025-06-02"}).status_code == 400
+
+
+def test_availability_follows_room_changes(api, mongo, run):
+    upload(api, dataset("H"))
+    # mongomock has no arrayFilters for embedded rooms
+    normalize(mongo, run)
+    api.patch("/api/rooms", json=[{"hotel_name": "H", "room_number": 102, "available": False}])
+
+    response = api.get("/api/availability", params={"from": "2025-06-02", "to": "2025-06-03"})
+    assert response.json()["rooms"] == []
+
+
+def test_occupancy_counts_pending_reservations(api):
+    data = dataset("H")
+    data["reservations"].append(reservation(EMAIL, "H", 102, "2025-06-01", "2025-06-07", status="pending"))
+    data["reservations"].append(reservation(EMAIL, "H", 102, "2025-06-10", "2025-06-12", status="cancelled"))
+    upload(api, data)
+
+    response = api.get("/api/analytics/occupancy", params={"from": "2025-06-01", "to": "2025-06-15", "granularity": "year"})
+    assert response.status_code == 200, response.text
+    assert response.json()["groups"][0]["totals"]["occupied_room_nights"] == 12
+
+
+def test_indexes_are_built_off_the_event_loop(api, mongo, run, monkeypatch):
+    on_loop = set()
+
+    def watch(cls, name):
+        method = getattr(cls, name)
+
+        def wrapper(self, *args):
+            try:
+                asyncio.get_running_loop()
+                on_loop.add(f"{cls.__name__}.{name}")
+            except RuntimeError:
+                pass
+            return method(self, *args)
+        monkeypatch.setattr(cls, name, wrapper)
+
+    for cls in (availability.IndexBuilder, analytics.BookingArraysBuilder):
+        for name in ("add_hotels", "add_reservations", "build"):
+            watch(cls, name)
+    upload(api, dataset("H"))
+    on_loop.clear()
+
+    live = run(live_dataset, mongo)
+    index = run(availability.build_index, live, live.generation)
+    arrays = run(analytics.load_arrays, live, live.generation)
+    assert on_loop == set()
+    assert free(index, "2025-06-02", "2025-06-03") == [102]
+    assert arrays.generation == live.generation
@@ -0,0 +1,79 @@
+from starlette.requests import Request
+
+from app.cache import ResponseCache, cache, generations
+from app.datasets import begin_import, promote
+from factories import dataset, hotel, upload
+
+
+def request(path, query=b""):
+    return Request({"type": "http", "method": "GET", "path": path, "query_string": query, "headers": []})
+
+
+def test_cache_keys_ignore_the_order_of_query_parameters():
+    assert ResponseCache.key(request("/api/data", b"a=1&b=2"), 3) == ResponseCache.key(request("/api/data", b"b=2&a=1"), 3)
+    assert ResponseCache.key(request("/api/data"), 3) != ResponseCache.key(request("/api/data"), 4)
+
+
+def test_cache_evicts_the_least_recently_used_bodies():
+    lru = ResponseCache(max_bytes=10)
+    lru.put(("a", (), 1), b"12345")
+    lru.put(("b", (), 1), b"12345")
+    lru.get(("a", (), 1))
+    lru.put(("c", (), 1), b"12345")
+    assert list(lru.entries) == [("a", (), 1), ("c", (), 1)]
+    assert lru.size == 10
+    # Bodies larger than the cache are served but never stored
+    lru.put(("d", (), 1), b"x" * 11)
+    assert ("d", (), 1) not in lru.entries
+
+
+def test_carry_over_and_discard_older():
+    lru = ResponseCache()
+    lru.put(("/kept", (), 1), b"kept")
+    lru.put(("/dropped", (), 1), b"dropped")
+    lru.carry_over(2, ("/kept",))
+    lru.discard_older(2)
+    assert list(lru.entries) == [("/kept", (), 2)]
+    assert lru.size == len(b"kept")
+
+
+def test_etag_answers_304_until_the_next_import(api):
+    upload(api, dataset("H"))
+    first = api.get("/api/data/hotels")
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert api.get("/api/data/hotels", headers={"If-None-Match": etag}).status_code == 304
+
+    upload(api, dataset("G"))
+    second = api.get("/api/data/hotels", headers={"If-None-Match": etag})
+    assert second.status_code == 200
+    assert second.headers["etag"] != etag
+    assert [item["name"] for item in second.json()["items"]] == ["G"]
+    # Only responses of the live generation stay cached
+    assert {key[-1] for key in cache.entries} == {generations.generation}
+
+
+def test_unchanged_delta_keeps_the_cached_responses(api):
+    upload(api, dataset("H"))
+    etag = api.get("/api/data/hotels").headers["etag"]
+
+    response = upload(api, dataset("H"), mode="delta")
+    assert response.status_code == 200, response.text
+    assert api.get("/api/data/hotels", headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_imports_by_another_worker_are_seen_after_the_ttl(api, mongo, run):
+    upload(api, dataset("H"))
+    api.get("/api/data/hotels")
+
+    async def import_elsewhere():
+        generation, staging = await begin_import(mongo)
+        await staging["hotels"].insert_many([hotel("G")])
+        await promote(mongo, generation)
+
+    run(import_elsewhere)
+    # Within the TTL this worker keeps answering from its last look at the pointer
+    generations.checked_at = float("inf")
+    assert [item["name"] for item in api.get("/api/data/hotels").json()["items"]] == ["H"]
+    generations.checked_at = 0.0
+    assert [item["name"] for item in api.get("/api/data/hotels").json()["items"]] == ["G"]
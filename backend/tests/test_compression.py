@@ -0,0 +1,79 @@
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.compression import CompressionMiddleware, negotiate, vary_on_encoding
+
+app = FastAPI()
+app.add_middleware(CompressionMiddleware, minimum_size=100)
+
+
+@app.get("/small")
+def small():
+    return PlainTextResponse("small")
+
+
+@app.get("/large")
+def large():
+    return PlainTextResponse("x" * 1000, headers={"Vary": "Origin"})
+
+
+@app.get("/stream")
+def stream():
+    return StreamingResponse(iter([b"a" * 500, b"b" * 500]), media_type="application/x-ndjson")
+
+
+@app.get("/zip")
+def archive():
+    return Response(b"PK" * 100, media_type="application/zip")
+
+
+client = TestClient(app)
+
+
+def vary(response):
+    return [value.strip() for value in response.headers.get("vary", "").split(",") if value.strip()]
+
+
+def test_negotiate_prefers_the_highest_weight():
+    assert negotiate("gzip, deflate") == "gzip"
+    assert negotiate("gzip;q=0.5, deflate") == "deflate"
+    assert negotiate("gzip;q=0, br") is None
+    assert negotiate("*") == "gzip"
+    assert negotiate(None) is None
+
+
+def test_vary_is_merged_without_duplicates():
+    assert vary_on_encoding([]) == [(b"vary", b"Accept-Encoding")]
+    assert vary_on_encoding([(b"vary", b"Origin")]) == [(b"vary", b"Origin, Accept-Encoding")]
+    assert vary_on_encoding([(b"vary", b"accept-encoding")]) == [(b"vary", b"accept-encoding")]
+    assert vary_on_encoding([(b"vary", b"*")]) == [(b"vary", b"*")]
+
+
+def test_large_bodies_are_compressed():
+    response = client.get("/large", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert vary(response) == ["Origin", "Accept-Encoding"]
+    assert response.text == "x" * 1000
+
+
+def test_streams_are_compressed_chunk_by_chunk():
+    response = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.content == b"a" * 500 + b"b" * 500
+
+
+def test_uncompressed_responses_still_vary_on_accept_encoding():
+    # An empty header stands for none: the test client always sends one
+    for path, accept in (("/small", "gzip"), ("/large", "identity"), ("/large", "")):
+        response = client.get(path, headers={"Accept-Encoding": accept})
+        assert "content-encoding" not in response.headers
+        assert "Accept-Encoding" in vary(response), (path, accept)
+
+
+def test_compressed_formats_pass_through():
+    response = client.get("/zip", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert "vary" not in response.headers
+    assert response.content == b"PK" * 100
+
@@ -0,0 +1,156 @@
+from app.conflicts import ConflictChecker, find_conflicts, summarize
+from factories import dataset, guest, hotel, reservation, upload
+
+EMAIL = "anna.nowak@example.com"
+
+
+def conflicts(reservations, hotels=None):
+    return find_conflicts({"hotels": hotels or [hotel("H")], "guests": [guest(EMAIL)], "reservations": reservations})
+
+
+def pairs(report):
+    return sorted((entry["index"], entry["conflicts_with"]) for entry in report["overlaps"])
+
+
+def test_back_to_back_bookings_do_not_overlap():
+    report = conflicts([
+        reservation(EMAIL, "H", 101, "2025-06-01", "2025-06-05"),
+        reservation(EMAIL, "H", 101, "2025-06-05", "2025-06-09"),
+    ])
+    assert report["total"] == 0
+
+
+def test_overlaps_name_the_booking_holding_the_latest_end():
+    report = conflicts([
+        reservation(EMAIL, "H", 101, "2025-06-01", "2025-06-30"),
+        reservation(EMAIL, "H", 101, "2025-06-05", "2025-06-07"),
+        # Clashes with the long booking only, although the short one ended before it
+        reservation(EMAIL, "H", 101, "2025-06-10", "2025-06-12"),
+        # Another room is swept separately
+        reservation(EMAIL, "H", 102, "2025-06-05", "2025-06-07"),
+    ])
+    assert pairs(report) == [(1, 0), (2, 0)]
+
+
+def test_input_order_does_not_matter():
+    report = conflicts([
+        reservation(EMAIL, "H", 101, "2025-06-03", "2025-06-08"),
+        reservation(EMAIL, "H", 101, "2025-06-01", "2025-06-04"),
+    ])
+    assert pairs(report) == [(0, 1)]
+
+
+def test_reference_and_date_checks():
+    report = conflicts([
+        reservation("nobody@example.com", "H", 101, "2025-06-01", "2025-06-02"),
+        reservation(EMAIL, "Nowhere", 101, "2025-06-01", "2025-06-02"),
+        reservation(EMAIL, "H", 999, "2025-06-01", "2025-06-02"),
+        reservation(EMAIL, "H", 102, "2025-06-05", "2025-06-01"),
+        reservation(EMAIL, "H", 102, "not a date", "2025-06-01"),
+    ])
+    assert [entry["index"] for entry in report["unknown_guest"]] == [0]
+    assert [entry["index"] for entry in report["unknown_hotel"]] == [1]
+    assert [entry["index"] for entry in report["unknown_room"]] == [2]
+    assert [entry["index"] for entry in report["invalid_dates"]] == [3, 4]
+    assert report["overlaps"] == [] and report["total"] == 5
+
+
+def test_batches_are_checked_together():
+    checker = ConflictChecker(id_field="id")
+    checker.add_hotels([hotel("H")])
+    checker.add_guests([guest(EMAIL)])
+    checker.add_reservations([dict(reservation(EMAIL, "H", 101, "2025-06-01", "2025-06-05"), id="a")])
+    checker.add_reservations([dict(reservation(EMAIL, "H", 101, "2025-06-04", "2025-06-06"), id="b")])
+
+    report = checker.check()
+    assert pairs(report) == [(1, 0)]
+    assert checker.offending(report) == {"b": ["overlaps"]}
+
+
+def test_summarize_limits_entries_but_not_counts():
+    report = conflicts([reservation(EMAIL, "H", 101, "2025-06-01", "2025-06-30")] + [
+        reservation(EMAIL, "H", 101, "2025-06-02", "2025-06-03") for _ in range(3)
+    ])
+    summary = summarize(report, limit=2)
+    assert summary["overlaps"]["count"] == 3 and len(summary["overlaps"]["items"]) == 2
+    assert summary["total"] == 3
+
+
+def double_booked():
+    data = dataset("H")
+    data["reservations"].append(reservation(EMAIL, "H", 101, "2025-06-03", "2025-06-05"))
+    return data
+
+
+def test_upload_reports_conflicts_by_default(api):
+    response = upload(api, double_booked())
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["conflicts"]["overlaps"]["count"] == 1
+    assert body["reservations_count"] == 2
+
+
+def test_upload_rejects_conflicts_and_keeps_the_live_data(api):
+    upload(api, dataset("H"))
+    response = upload(api, double_booked(), on_conflict="reject")
+    assert response.status_code == 409
+    assert response.json()["detail"]["conflicts"]["overlaps"]["count"] == 1
+    assert len(api.get("/api/data/reservations").json()["items"]) == 1
+
+
+def test_upload_quarantines_conflicting_reservations(api, mongo, run):
+    response = upload(api, double_booked(), on_conflict="quarantine")
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert (body["reservations_count"], body["quarantined_count"]) == (1, 1)
+
+    quarantined = run(mongo["reservations_quarantine"].find_one, {})
+    assert quarantined["start_date"].startswith("2025-06-03")
+    assert quarantined["quarantine"]["reasons"] == ["overlaps"]
+
+
+def test_repeated_guest_emails_are_reported_and_skipped():
+    checker = ConflictChecker()
+    assert checker.add_guests([guest(EMAIL), guest("b@example.com")]) == [guest(EMAIL), guest("b@example.com")]
+    assert checker.add_guests([guest(EMAIL, first_name="Anka")]) == []
+
+    report = checker.check()
+    assert report["duplicate_guest"] == [{"index": 2, "email": EMAIL}]
+    assert report["total"] == 1 and checker.offending(report) == {}
+
+
+def with_duplicate_guest():
+    data = dataset("H")
+    data["guests"].append(guest(EMAIL, first_name="Anka"))
+    return data
+
+
+def test_upload_with_repeated_guest_emails_keeps_the_first(api):
+    # The second upload copies the unique email index onto its staging collections
+    upload(api, dataset("H"))
+    response = upload(api, with_duplicate_guest())
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["guests_count"] == 1
+    assert body["conflicts"]["duplicate_guest"]["items"] == [{"index": 1, "email": EMAIL}]
+    assert [item["first_name"] for item in api.get("/api/data/guests").json()["items"]] == ["Anna"]
+
+
+def test_upload_rejects_repeated_guest_emails(api):
+    response = upload(api, with_duplicate_guest(), on_conflict="reject")
+    assert response.status_code == 409
+    assert response.json()["detail"]["conflicts"]["duplicate_guest"]["count"] == 1
+
+
+def test_write_errors_do_not_echo_documents(api, monkeypatch):
+    from pymongo.errors import BulkWriteError
+
+    import app.main
+
+    async def fail(collections, batch):
+        raise BulkWriteError({"writeErrors": [{"op": {"email": "secret@example.com"}}]})
+
+    monkeypatch.setattr(app.main, "insert_hotels", fail)
+    response = upload(api, dataset("H"))
+    assert response.status_code == 500
+    assert "secret" not in response.text
@@ -0,0 +1,169 @@
+import pytest
+
+from app.datasets import (
+    META_COLLECTION, DatasetView, ImportLease, abort_import, begin_import, bump_generation, collect_garbage,
+    current_generation, lease_id, live_dataset, promote, read_current, rollback,
+)
+
+
+async def load(db, hotel_name):
+    """Stage a generation holding one hotel and promote it; returns its generation."""
+    generation, staging = await begin_import(db)
+    await staging["hotels"].insert_many([{"name": hotel_name}])
+    await promote(db, generation)
+    return generation
+
+
+async def hotel_names(db):
+    live = await live_dataset(db)
+    return [hotel["name"] async for hotel in live["hotels"].find({}, {"_id": 0})]
+
+
+def test_unversioned_collections_are_live_before_the_first_import(mongo, run):
+    run(mongo["hotels"].insert_many, [{"name": "Legacy"}])
+
+    live = run(live_dataset, mongo)
+    assert isinstance(live, DatasetView)
+    assert live.names["hotels"] == "hotels"
+    assert live.generation == 0
+    assert run(hotel_names, mongo) == ["Legacy"]
+
+
+def test_readers_keep_the_live_generation_until_promote(mongo, run):
+    run(load, mongo, "A")
+
+    async def stage():
+        generation, staging = await begin_import(mongo)
+        await staging["hotels"].insert_many([{"name": "B"}])
+        return generation
+
+    generation = run(stage)
+    assert run(hotel_names, mongo) == ["A"]
+
+    run(promote, mongo, generation)
+    assert run(hotel_names, mongo) == ["B"]
+    assert run(current_generation, mongo) == generation
+
+
+def test_promote_keeps_the_replaced_collections_and_switches_with_one_pointer(mongo, run):
+    first = run(load, mongo, "A")
+    second = run(load, mongo, "B")
+
+    names = run(mongo.list_collection_names)
+    assert f"hotels__gen_{first}" in names and f"hotels__gen_{second}" in names
+    assert not [name for name in names if "__staging_" in name]
+    current = run(read_current, mongo)
+    assert (current["generation"], current["storage"], current["previous"]) == (second, second, first)
+
+
+def test_a_view_stays_on_its_generation(mongo, run):
+    run(load, mongo, "A")
+    pinned = run(live_dataset, mongo)
+    run(load, mongo, "B")
+
+    async def names(view):
+        return [hotel["name"] async for hotel in view["hotels"].find({}, {"_id": 0})]
+
+    assert run(names, pinned) == ["A"]
+
+
+def test_rollback_restores_the_previous_generation_under_a_new_number(mongo, run):
+    first = run(load, mongo, "A")
+    second = run(load, mongo, "B")
+
+    generation = run(rollback, mongo)
+    assert generation > second
+    assert run(hotel_names, mongo) == ["A"]
+    assert run(read_current, mongo)["storage"] == first
+
+    # Rolling back again returns to the newer generation
+    run(rollback, mongo)
+    assert run(hotel_names, mongo) == ["B"]
+
+
+def test_rollback_returns_to_the_unversioned_collections(mongo, run):
+    run(mongo["hotels"].insert_many, [{"name": "Legacy"}])
+    for section in ("guests", "reservations"):
+        run(mongo.create_collection, section)
+    run(load, mongo, "A")
+
+    run(rollback, mongo)
+    assert run(hotel_names, mongo) == ["Legacy"]
+
+
+def test_rollback_without_a_previous_generation_fails(mongo, run):
+    with pytest.raises(LookupError):
+        run(rollback, mongo)
+    run(load, mongo, "A")
+    # The unversioned collections never existed
+    with pytest.raises(LookupError):
+        run(rollback, mongo)
+
+
+def test_bump_generation_keeps_the_collections(mongo, run):
+    first = run(load, mongo, "A")
+    generation = run(bump_generation, mongo)
+
+    current = run(read_current, mongo)
+    assert generation > first
+    assert (current["generation"], current["storage"]) == (generation, first)
+    assert run(hotel_names, mongo) == ["A"]
+
+
+def test_begin_import_copies_live_indexes_to_staging(mongo, run):
+    run(load, mongo, "A")
+
+    async def index_names():
+        live = await live_dataset(mongo)
+        await live["hotels"].create_index([("name", 1)], name="by_name")
+        generation, staging = await begin_import(mongo)
+        return set(await staging["hotels"].index_information())
+
+    assert "by_name" in run(index_names)
+
+
+def test_collect_garbage_keeps_the_live_and_rollback_generations(mongo, run):
+    first = run(load, mongo, "A")
+    second = run(load, mongo, "B")
+    third = run(load, mongo, "C")
+
+    dropped = run(collect_garbage, mongo)
+    names = run(mongo.list_collection_names)
+    assert f"hotels__gen_{first}" in dropped
+    assert f"hotels__gen_{second}" in names and f"hotels__gen_{third}" in names
+    assert run(hotel_names, mongo) == ["C"]
+
+
+def test_collect_garbage_spares_a_running_import_older_than_the_live_generation(mongo, run):
+    run(load, mongo, "A")
+    older, _ = run(begin_import, mongo)
+    run(load, mongo, "B")
+
+    run(collect_garbage, mongo)
+    assert f"hotels__staging_{older}" in run(mongo.list_collection_names)
+
+    # The older import can still finish
+    run(promote, mongo, older)
+    assert run(hotel_names, mongo) == []
+
+
+def test_collect_garbage_reaps_staging_with_an_expired_or_missing_lease(mongo, run):
+    expired, _ = run(begin_import, mongo)
+    run(ImportLease(mongo, expired, seconds=-1).renew, True)
+    crashed, _ = run(begin_import, mongo)
+    run(mongo[META_COLLECTION].delete_one, {"_id": lease_id(crashed)})
+
+    dropped = run(collect_garbage, mongo)
+    assert f"hotels__staging_{expired}" in dropped
+    assert f"hotels__staging_{crashed}" in dropped
+    assert run(mongo[META_COLLECTION].find_one, {"_id": lease_id(expired)}) is None
+
+
+def test_promote_and_abort_release_the_lease(mongo, run):
+    generation = run(load, mongo, "A")
+    aborted, _ = run(begin_import, mongo)
+    run(abort_import, mongo, aborted)
+
+    for released in (generation, aborted):
+        assert run(mongo[META_COLLECTION].find_one, {"_id": lease_id(released)}) is None
+    assert not [name for name in run(mongo.list_collection_names) if "__staging_" in name]
@@ -0,0 +1,82 @@
+from app.datasets import KEY_FIELD, live_dataset
+from app.delta import DeltaImport, content_hash, fingerprint, natural_key
+from factories import dataset, guest, hotel, reservation, upload
+
+EMAIL = "anna.nowak@example.com"
+
+
+def test_content_hash_ignores_key_order_and_bookkeeping_fields():
+    document = guest(EMAIL)
+    reordered = dict(reversed(list(document.items())))
+    assert content_hash(document) == content_hash(reordered)
+    assert content_hash(document) == content_hash({**document, "_id": 1, "_key": "k", "_hash": "h"})
+    assert content_hash(document) != content_hash({**document, "phone": "+48600000000"})
+
+
+def test_natural_keys_identify_documents_across_feeds():
+    assert natural_key("guests", guest(EMAIL)) == natural_key("guests", guest(EMAIL, first_name="Anka"))
+    assert natural_key("hotels", hotel("H")) != natural_key("hotels", hotel("G"))
+    booking = reservation(EMAIL, "H", 101, "2025-06-01", "2025-06-07")
+    # Older feeds name the dates check_in/check_out
+    older = {k: v for k, v in booking.items() if k not in ("start_date", "end_date")}
+    older.update(check_in="2025-06-01", check_out="2025-06-07")
+    assert natural_key("reservations", booking) == natural_key("reservations", older)
+
+
+def test_unchanged_feed_writes_nothing(mongo, run):
+    async def plan():
+        live = await live_dataset(mongo)
+        await live["guests"].insert_many(fingerprint("guests", [guest(EMAIL)]))
+        delta = DeltaImport(live)
+        await delta.add("guests", fingerprint("guests", [guest(EMAIL)]))
+        return delta, await delta.apply(["guests"])
+
+    delta, counts = run(plan)
+    assert counts["guests"] == {"unchanged": 1, "upserted": 0, "removed": 0}
+    assert not delta.changed
+
+
+def test_a_repeated_key_keeps_its_last_version(mongo, run):
+    async def plan():
+        delta = DeltaImport(await live_dataset(mongo))
+        await delta.add("guests", fingerprint("guests", [guest(EMAIL), guest(EMAIL, first_name="Anka")]))
+        return delta.pending["guests"]
+
+    pending = run(plan)
+    assert [document["first_name"] for document in pending.values()] == ["Anka"]
+
+
+def test_delta_upload_writes_only_the_differences(api, mongo, run):
+    data = dataset("H")
+    data["guests"].append(guest("b@example.com"))
+    upload(api, data)
+    etag = api.get("/api/data/hotels").headers["etag"]
+
+    data["guests"] = [guest(EMAIL, first_name="Anka"), guest("c@example.com")]
+    response = upload(api, data, mode="delta")
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["changes"]["guests"] == {"unchanged": 0, "upserted": 2, "removed": 1}
+    assert body["changes"]["hotels"] == {"unchanged": 1, "upserted": 0, "removed": 0}
+    assert body["changes"]["reservations"]["upserted"] == 0
+
+    guests = {item["email"]: item["first_name"] for item in api.get("/api/data/guests").json()["items"]}
+    assert guests == {EMAIL: "Anka", "c@example.com": "Anna"}
+    # Upserted by natural key, never duplicated
+    keys = run(guest_keys, mongo)
+    assert len(keys) == len(set(keys)) == 2
+    # A changed feed moves to a new generation
+    assert api.get("/api/data/hotels").headers["etag"] != etag
+
+
+async def guest_keys(mongo):
+    live = await live_dataset(mongo)
+    return [document[KEY_FIELD] async for document in live["guests"].find({})]
+
+
+def test_delta_upload_replaces_documents_stored_without_a_key(api, mongo, run):
+    run(mongo["hotels"].insert_many, [hotel("H")])
+    response = upload(api, dataset("H"), mode="delta")
+    assert response.status_code == 200, response.text
+    assert response.json()["changes"]["hotels"] == {"unchanged": 0, "upserted": 1, "removed": 1}
+    assert len(api.get("/api/data/hotels").json()["items"]) == 1
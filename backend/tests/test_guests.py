@@ -0,0 +1,127 @@
+import asyncio
+
+from app.datasets import live_dataset
+from app.guests import GuestIndexBuilder, build_index, guest_reservations
+from conftest import AsyncCursor, requires_server
+from factories import dataset, guest, hotel, normalize, reservation, upload
+
+EMAIL = "anna.nowak@example.com"
+
+
+def search(guests, q, limit=20):
+    builder = GuestIndexBuilder()
+    builder.add_guests(guests)
+    return builder.build(1).search(q, limit)
+
+
+def test_search_by_prefixes_ignores_accents_and_case():
+    guests = [guest(EMAIL), guest("lukasz@example.com", "Łukasz", "Nowak")]
+    assert search(guests, "luk now") == (["lukasz@example.com"], False)
+    assert search(guests, "NOWAK", limit=1) == ([EMAIL], True)
+    assert search(guests, "600100200") == ([EMAIL, "lukasz@example.com"], False)
+
+
+def test_search_index_is_built_off_the_event_loop(api, mongo, run, monkeypatch):
+    upload(api, dataset("H"))
+    on_loop = []
+    add_guests = GuestIndexBuilder.add_guests
+
+    def watch(self, guests):
+        try:
+            asyncio.get_running_loop()
+            on_loop.append(guests)
+        except RuntimeError:
+            pass
+        return add_guests(self, guests)
+
+    monkeypatch.setattr(GuestIndexBuilder, "add_guests", watch)
+    live = run(live_dataset, mongo)
+    index = run(build_index, live, live.generation)
+    assert on_loop == []
+    assert index.search("anna") == ([EMAIL], False)
+
+
+def history():
+    data = dataset("H")
+    data["hotels"].append(hotel("G", rooms=(201,), location="Kraków"))
+    data["reservations"].append(reservation(EMAIL, "G", 201, "2025-05-01", "2025-05-03"))
+    return data
+
+
+def check_history(api):
+    response = api.get(f"/api/guests/{EMAIL}/reservations")
+    assert response.status_code == 200, response.text
+    reservations = response.json()["reservations"]
+    assert [(item["hotel"]["name"], item["room"]["number"]) for item in reservations] == [("G", 201), ("H", 101)]
+    assert reservations[0]["hotel"] == {"name": "G", "location": "Kraków", "stars": 4}
+    assert reservations[0]["room"] == {"number": 201, "type": "double", "price": 400, "available": True}
+
+
+@requires_server
+def test_history_joins_the_booked_hotel_and_room(api):
+    upload(api, history())
+    check_history(api)
+
+
+@requires_server
+def test_history_joins_normalized_rooms(api, mongo, run):
+    upload(api, history())
+    normalize(mongo, run)
+    check_history(api)
+
+
+class Aggregated:
+    """A collection whose aggregations return fixed documents and record their pipeline."""
+
+    def __init__(self, name, documents=()):
+        self.name = name
+        self.documents = list(documents)
+        self.pipeline = None
+
+    async def aggregate(self, pipeline):
+        self.pipeline = pipeline
+        return AsyncCursor(iter(self.documents))
+
+
+def aggregated_history(run, hotel_rooms, rooms):
+    """`guest_reservations` over the lookup results MongoDB gives for one booking of room 201 in G."""
+    booking = reservation(EMAIL, "G", 201, "2025-05-01", "2025-05-03")
+    found = {**booking, "hotel": [{"name": "G", "location": "Kraków", "stars": 4, "rooms": hotel_rooms}], "hotel_rooms": rooms}
+    db = {name: Aggregated(f"g7_{name}") for name in ("hotels", "rooms")}
+    db["reservations"] = Aggregated("g7_reservations", [found])
+    return run(guest_reservations, db, EMAIL), db["reservations"].pipeline
+
+
+def test_history_looks_up_only_the_booked_hotel_and_room(run):
+    _, pipeline = aggregated_history(run, [], [])
+    assert pipeline[0] == {"$match": {"guest_email": EMAIL}}
+    assert not [stage for stage in pipeline if "$unwind" in stage]
+    hotel_lookup, room_lookup = [stage["$lookup"] for stage in pipeline if "$lookup" in stage]
+    booking = {"hotel_name": "$hotel_name", "room_number": "$room_number"}
+
+    # The booked hotel by name, with only the booked room of its embedded rooms
+    assert (hotel_lookup["from"], hotel_lookup["let"]) == ("g7_hotels", booking)
+    assert hotel_lookup["pipeline"][:2] == [{"$match": {"$expr": {"$eq": ["$name", "$$hotel_name"]}}}, {"$limit": 1}]
+    projection = hotel_lookup["pipeline"][2]["$project"]
+    assert projection["rooms"]["$filter"]["cond"] == {"$eq": ["$$room.number", "$$room_number"]}
+    assert {"name", "location", "stars"} <= set(projection)
+
+    # The booked room of a normalized hotel by hotel name and number
+    assert (room_lookup["from"], room_lookup["let"]) == ("g7_rooms", booking)
+    assert room_lookup["pipeline"][:2] == [
+        {"$match": {"$expr": {"$and": [{"$eq": ["$hotel_name", "$$hotel_name"]}, {"$eq": ["$number", "$$room_number"]}]}}},
+        {"$limit": 1},
+    ]
+
+
+def test_history_picks_the_booked_room_in_either_layout(run):
+    room = {"number": 201, "type": "double", "price": 400, "available": True}
+    embedded, _ = aggregated_history(run, [room], [])
+    normalized, _ = aggregated_history(run, [], [{**room, "hotel_name": "G"}])
+    for reservations in (embedded, normalized):
+        assert reservations[0]["hotel"] == {"name": "G", "location": "Kraków", "stars": 4}
+        assert reservations[0]["room"] == room
+        assert "hotel_rooms" not in reservations[0]
+
+    missing, _ = aggregated_history(run, [], [])
+    assert missing[0]["room"] is None
@@ -0,0 +1,71 @@
+import io
+
+import pytest
+import yaml
+
+from app.ingest import ChunkedReader, iter_batches, iter_records, iter_tree_records
+
+DATASET = b"""
+hotels:
+  - name: Hotel Giewont
+    rooms:
+      - number: 101
+        price: 400
+guests:
+  - email: anna.nowak@example.com
+reservations:
+  - guest_email: anna.nowak@example.com
+    hotel_name: Hotel Giewont
+    room_number: 101
+    start_date: 2025-06-01
+    end_date: 2025-06-07
+"""
+
+
+def records(content, sections_seen=None):
+    return list(iter_records(ChunkedReader(io.BytesIO(content), chunk_size=16), sections_seen))
+
+
+def test_records_are_yielded_per_section_with_iso_dates():
+    seen = set()
+    result = records(DATASET, seen)
+    assert [section for section, _ in result] == ["hotels", "guests", "reservations"]
+    assert result[2][1]["start_date"] == "2025-06-01"
+    assert seen == {"hotels", "guests", "reservations"}
+
+
+def test_unknown_sections_are_skipped():
+    result = records(b"comment: {a: 1}\nguests:\n  - email: a@example.com\n")
+    assert result == [("guests", {"email": "a@example.com"})]
+
+
+def test_sections_without_a_list_are_present_but_empty():
+    content = b"hotels: []\nguests: {}\nreservations:\n"
+    seen = set()
+    assert records(content, seen) == []
+    assert seen == {"hotels", "guests", "reservations"}
+    assert list(iter_tree_records(yaml.safe_load(content))) == []
+
+
+def test_empty_stream_yields_nothing():
+    assert records(b"") == []
+
+
+def test_multi_document_stream_is_rejected():
+    content = DATASET + b"---\nguests:\n  - email: b@example.com\n"
+    with pytest.raises(yaml.YAMLError, match="Multi-document"):
+        records(content)
+
+
+def test_explicit_single_document_is_accepted():
+    assert len(records(b"---\n" + DATASET + b"...\n")) == 3
+
+
+def test_top_level_must_be_a_mapping():
+    with pytest.raises(yaml.YAMLError):
+        records(b"- a\n- b\n")
+
+
+def test_batches_split_on_section_and_size():
+    items = [("hotels", 1), ("hotels", 2), ("hotels", 3), ("guests", 4)]
+    assert list(iter_batches(items, 2)) == [("hotels", [1, 2]), ("hotels", [3]), ("guests", [4])]
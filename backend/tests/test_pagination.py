@@ -0,0 +1,57 @@
+from app.datasets import PUBLIC_PROJECTION
+from app.pagination import parse_fields
+from factories import dataset, guest, upload
+
+
+def test_parse_fields_builds_an_inclusion_projection_without_id():
+    assert parse_fields("email, first_name") == {"email": 1, "first_name": 1, "_id": 0}
+
+
+def test_parse_fields_ignores_hidden_fields():
+    assert parse_fields("email,_key,_hash,_id,_key.x") == {"email": 1, "_id": 0}
+
+
+def test_parse_fields_falls_back_to_the_public_projection():
+    for fields in (None, "", " , ", "_id", "_key,_hash"):
+        assert parse_fields(fields) == PUBLIC_PROJECTION
+
+
+def test_pages_never_return_bookkeeping_fields(api):
+    upload(api, dataset("H"))
+    for fields in ("_key,_hash", "_id", "email,_hash", None):
+        response = api.get("/api/data/guests", params={"fields": fields} if fields else {})
+        assert response.status_code == 200, response.text
+        for item in response.json()["items"]:
+            assert not {"_id", "_key", "_hash"} & set(item)
+            assert item["email"] == "anna.nowak@example.com"
+
+
+def test_pages_follow_the_cursor(api):
+    data = dataset("H")
+    data["guests"] = [guest(f"guest{number}@example.com") for number in range(5)]
+    data["reservations"] = []
+    upload(api, data)
+
+    emails, after = [], None
+    while True:
+        params = {"limit": 2, "fields": "email"}
+        if after:
+            params["after"] = after
+        page = api.get("/api/data/guests", params=params).json()
+        emails += [item["email"] for item in page["items"]]
+        after = page["next_after"]
+        if after is None:
+            break
+    assert emails == [f"guest{number}@example.com" for number in range(5)]
+
+
+def test_invalid_cursor_is_rejected(api):
+    upload(api, dataset("H"))
+    assert api.get("/api/data/guests", params={"after": "nope"}).status_code == 400
+
+
+def test_stream_never_returns_bookkeeping_fields(api):
+    upload(api, dataset("H"))
+    response = api.get("/api/data/guests/stream", params={"fields": "_key,_hash"})
+    assert response.status_code == 200
+    assert b"_hash" not in response.content and b"anna.nowak" in response.content
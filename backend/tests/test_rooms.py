@@ -0,0 +1,103 @@
+import json
+
+from app.datasets import HASH_FIELD, live_dataset
+from factories import dataset, hotel, normalize, upload
+
+
+def rooms(api, hotel_name="H"):
+    response = api.get("/api/rooms", params={"hotel": hotel_name})
+    assert response.status_code == 200, response.text
+    return {room["number"]: room for room in response.json()["rooms"]}
+
+
+def patch(api, *changes):
+    return api.patch("/api/rooms", json=list(changes))
+
+
+def check_room_changes(api):
+    response = patch(
+        api,
+        {"hotel_name": "H", "room_number": 101, "price": 550},
+        {"hotel_name": "H", "room_number": 102, "available": True},
+        {"hotel_name": "H", "room_number": 999, "price": 1},
+        # A later change of the same room sees the earlier one
+        {"hotel_name": "H", "room_number": 101, "price": 550, "available": False},
+    )
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert (body["updated"], body["unchanged"], body["not_found"]) == (2, 1, 1)
+    assert [result["status"] for result in body["results"]] == ["updated", "unchanged", "not_found", "updated"]
+
+    room = rooms(api)[101]
+    assert (room["price"], room["available"]) == (550, False)
+    assert rooms(api)[102]["price"] == 400
+    return body["generation"]
+
+
+def test_room_changes_in_the_normalized_layout(api, mongo, run):
+    first = upload(api, dataset("H")).json()["generation"]
+    normalize(mongo, run)
+    assert check_room_changes(api) > first
+
+    # The changed hotel is compared with the next delta feed again
+    live = run(live_dataset, mongo)
+    assert HASH_FIELD not in run(live["hotels"].find_one, {"name": "H"})
+
+
+def test_room_changes_in_the_embedded_layout(api, mongo, run):
+    first = upload(api, dataset("H")).json()["generation"]
+    assert check_room_changes(api) > first
+
+    # Only the changed room of the hotel is written, its content hash is dropped
+    live = run(live_dataset, mongo)
+    stored = run(live["hotels"].find_one, {"name": "H"})
+    assert [(room["number"], room["price"], room["available"]) for room in stored["rooms"]] == [(101, 550, False), (102, 400, True)]
+    assert HASH_FIELD not in stored
+
+
+def test_changes_without_effect_keep_the_generation(api, mongo, run):
+    generation = upload(api, dataset("H")).json()["generation"]
+    normalize(mongo, run)
+    response = patch(api, {"hotel_name": "H", "room_number": 101, "price": 400}, {"hotel_name": "X", "room_number": 1, "available": True})
+    assert response.json()["generation"] == generation
+    assert response.json()["updated"] == 0
+
+
+def test_room_changes_keep_the_cached_guest_pages(api, mongo, run):
+    data = dataset("H")
+    data["hotels"].append(hotel("G"))
+    upload(api, data)
+    normalize(mongo, run)
+    etag = api.get("/api/data/guests").headers["etag"]
+
+    patch(api, {"hotel_name": "G", "room_number": 101, "price": 700})
+    assert api.get("/api/data/guests", headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_invalid_changes_are_rejected(api, monkeypatch):
+    import app.main
+
+    assert patch(api, {"hotel_name": "H", "room_number": 101}).status_code == 422
+    assert patch(api, {"hotel_name": "H", "room_number": 101, "price": -1}).status_code == 422
+    monkeypatch.setattr(app.main, "ROOM_CHANGES_MAX", 1)
+    changes = [{"hotel_name": "H", "room_number": number, "price": 1} for number in (101, 102)]
+    assert patch(api, *changes).status_code == 413
+
+
+def test_projections_into_rooms_read_the_same_in_both_layouts(api, mongo, run):
+    upload(api, dataset("H"))
+
+    def read(fields):
+        page = api.get("/api/data/hotels", params={"fields": fields}).json()["items"]
+        stream = api.get("/api/data/hotels/stream", params={"fields": fields}).text.splitlines()
+        assert [json.loads(line) for line in stream] == page
+        return page
+
+    projections = ("rooms.number", "name,rooms.price", "rooms", "location")
+    embedded = [read(fields) for fields in projections]
+    assert embedded[0] == [{"rooms": [{"number": 101}, {"number": 102}]}]
+    assert embedded[1] == [{"name": "H", "rooms": [{"price": 400}, {"price": 400}]}]
+    assert embedded[3] == [{"location": "Zakopane"}]
+
+    normalize(mongo, run)
+    assert [read(fields) for fields in projections] == embedded
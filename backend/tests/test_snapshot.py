@@ -0,0 +1,38 @@
+import asyncio
+
+from app.datasets import current_generation, live_dataset
+from app.snapshot import Snapshot, SnapshotBuilder, SnapshotEngine
+from factories import dataset, hotel, upload
+
+
+def test_hotels_read_back_with_the_rooms_they_were_stored_with(tmp_path):
+    hotels = [hotel("H"), hotel("G", rooms=()), {"name": "F", "location": "Zakopane"}, hotel("E", rooms=(7,))]
+    builder = SnapshotBuilder()
+    builder.add("hotels", hotels)
+    builder.write(str(tmp_path / "g1"))
+
+    stored = Snapshot(1, str(tmp_path / "g1"))
+    assert stored.documents("hotels") == hotels
+    # Reading from the middle finds where the rooms of the first hotel read begin
+    assert stored.documents("hotels", 2) == hotels[2:]
+
+
+def test_snapshot_is_built_off_the_event_loop(api, mongo, run, tmp_path, monkeypatch):
+    upload(api, dataset("H"))
+    on_loop = []
+    add = SnapshotBuilder.add
+
+    def watched(self, section, documents):
+        try:
+            asyncio.get_running_loop()
+            on_loop.append(section)
+        except RuntimeError:
+            pass
+        return add(self, section, documents)
+
+    monkeypatch.setattr(SnapshotBuilder, "add", watched)
+    engine = SnapshotEngine(directory=str(tmp_path), mode="mmap")
+    generation = run(current_generation, mongo)
+    run(engine.build, run(live_dataset, mongo), generation)
+    assert on_loop == []
+    assert [document["name"] for document in Snapshot(generation, engine.path(generation)).documents("hotels")] == ["H"]
@@ -0,0 +1,63 @@
+from app.datasets import begin_import, live_dataset, promote
+from app.stats import STATS_COLLECTION, ensure_stats
+from factories import dataset, hotel, normalize, upload
+
+
+def hotel_stats(api):
+    response = api.get("/api/stats")
+    assert response.status_code == 200, response.text
+    return {entry["hotel_name"]: entry for entry in response.json()["hotels"]}
+
+
+def test_stats_are_staged_with_the_generation(api, mongo, run):
+    upload(api, dataset("H"))
+    pinned = run(live_dataset, mongo)
+    upload(api, dataset("G"))
+    assert list(hotel_stats(api)) == ["G"]
+
+    # Readers still on the replaced generation keep its statistics
+    async def names(view):
+        return [entry["hotel_name"] async for entry in view[STATS_COLLECTION].find({})]
+
+    assert run(names, pinned) == ["H"]
+
+
+def test_stats_follow_a_rollback(api):
+    upload(api, dataset("H"))
+    upload(api, dataset("G"))
+    assert api.post("/api/reservations/rollback").status_code == 200
+    assert list(hotel_stats(api)) == ["H"]
+
+
+def test_stats_follow_a_delta_import(api):
+    upload(api, dataset("H"))
+    assert hotel_stats(api)["H"]["average_price"] == 400
+
+    data = dataset("H")
+    data["hotels"] = [hotel("H", price=600)]
+    assert upload(api, data, mode="delta").status_code == 200
+    assert hotel_stats(api)["H"]["average_price"] == 600
+
+
+def test_stats_follow_room_changes(api, mongo, run):
+    upload(api, dataset("H"))
+    normalize(mongo, run)
+    assert hotel_stats(api)["H"]["available_rooms"] == 2
+
+    response = api.patch("/api/rooms", json=[{"hotel_name": "H", "room_number": 101, "available": False}])
+    assert response.status_code == 200, response.text
+    assert hotel_stats(api)["H"]["available_rooms"] == 1
+
+
+def test_ensure_stats_fills_a_generation_promoted_without_them(mongo, run):
+    async def load():
+        generation, staging = await begin_import(mongo)
+        await staging["hotels"].insert_many([hotel("H")])
+        await promote(mongo, generation)
+        live = await live_dataset(mongo)
+        await mongo.drop_collection(live.names[STATS_COLLECTION])
+        return live
+
+    live = run(load)
+    run(ensure_stats, live)
+    assert [entry["hotel_name"] for entry in run(live[STATS_COLLECTION].find({}).to_list, None)] == ["H"]
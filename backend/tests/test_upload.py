@@ -0,0 +1,116 @@
+import asyncio
+import time
+
+import app.main
+import app.validation
+from factories import dataset, to_yaml, upload
+
+
+def hotel_names(api):
+    return [hotel["name"] for hotel in api.get("/api/data").json()["hotels"]]
+
+
+def test_upload_replaces_the_live_dataset(api):
+    first = upload(api, dataset("H"))
+    assert first.status_code == 200, first.text
+    assert first.json()["hotels_count"] == 1
+    assert hotel_names(api) == ["H"]
+
+    second = upload(api, dataset("H2"))
+    assert second.json()["generation"] > first.json()["generation"]
+    assert hotel_names(api) == ["H2"]
+
+
+def test_streaming_upload_matches_the_buffered_one(api):
+    response = upload(api, dataset("H"), stream="true")
+    assert response.status_code == 200, response.text
+    assert response.json()["reservations_count"] == 1
+    assert hotel_names(api) == ["H"]
+
+
+def test_streaming_upload_rejects_multiple_documents(api):
+    upload(api, dataset("H"))
+    content = to_yaml(dataset("H2")) + b"---\n" + to_yaml(dataset("H3"))
+    for stream in ("true", "false"):
+        response = upload(api, content, stream=stream)
+        assert response.status_code == 400, response.text
+    # Nothing of the rejected uploads went live
+    assert hotel_names(api) == ["H"]
+
+
+def test_missing_section_is_rejected(api):
+    data = dataset("H")
+    del data["guests"]
+    for stream in ("true", "false"):
+        response = upload(api, data, stream=stream)
+        assert response.status_code == 400
+        assert "guests" in response.json()["detail"]
+
+
+def test_both_modes_accept_empty_sections(api):
+    content = to_yaml(dataset("H"))
+    for value in (b"null", b"{}", b"[]"):
+        file = content.replace(b"reservations:\n", b"reservations: " + value + b"\nignored:\n", 1)
+        for stream in ("true", "false"):
+            response = upload(api, file, stream=stream)
+            assert response.status_code == 200, (value, stream, response.text)
+            assert response.json()["reservations_count"] == 0
+
+
+def test_rollback_endpoint_restores_the_previous_upload(api):
+    upload(api, dataset("H"))
+    upload(api, dataset("H2"))
+
+    response = api.post("/api/reservations/rollback")
+    assert response.status_code == 200, response.text
+    assert hotel_names(api) == ["H"]
+
+
+def test_rollback_without_previous_upload_is_a_conflict(api):
+    assert api.post("/api/reservations/rollback").status_code == 409
+
+
+def test_upload_work_runs_off_the_event_loop(api, monkeypatch):
+    on_loop = {}
+
+    def watch(module, name):
+        function = getattr(module, name)
+
+        def wrapper(*args):
+            try:
+                asyncio.get_running_loop()
+                on_loop[name] = True
+            except RuntimeError:
+                on_loop.setdefault(name, False)
+            return function(*args)
+        monkeypatch.setattr(module, name, wrapper)
+
+    watch(app.main, "convert_dates_to_iso")
+    watch(app.main, "fingerprint")
+    # Small uploads are validated in a thread, large ones in worker processes
+    watch(app.validation, "validate_chunk")
+    for stream in ("true", "false"):
+        assert upload(api, dataset("H"), stream=stream).status_code == 200
+    assert on_loop == {"convert_dates_to_iso": False, "fingerprint": False, "validate_chunk": False}
+
+
+def test_small_uploads_are_still_validated(api):
+    data = dataset("H")
+    data["guests"][0]["email"] = 42
+    response = upload(api, data, validation="reject")
+    assert response.status_code == 422
+    assert response.json()["detail"]["errors"]["items"][0]["path"] == "/guests/0/email"
+
+
+def test_background_upload_reports_its_result(api):
+    response = upload(api, dataset("H"), background="true")
+    assert response.status_code == 202, response.text
+    status_url = response.json()["status_url"]
+    for _ in range(100):
+        job = api.get(status_url).json()
+        if job["status"] not in ("queued", "running"):
+            break
+        time.sleep(0.05)
+    assert job["status"] == "succeeded", job
+    assert job["result"]["hotels_count"] == 1
+    assert hotel_names(api) == ["H"]
@@ -0,0 +1,137 @@
+import argparse
+import datetime
+import json
+import os
+import random
+import yaml
+
+CITIES = ["Zakopane", "Gdańsk", "Warszawa", "Kraków", "Sopot", "Karpacz", "Wrocław", "Szczecin", "Białystok", "Gdynia",
+          "Poznań", "Łódź", "Lublin", "Toruń", "Kołobrzeg", "Mikołajki", "Szklarska Poręba", "Ustka"]
+HOTEL_WORDS = ["Grand", "Park", "Royal", "Baltic", "Tatra", "Old Town", "City", "Riverside", "Forest", "Amber",
+               "Panorama", "Central", "Harbor", "Mountain", "Garden", "Palace"]
+FIRST_NAMES = ["Anna", "Jan", "Katarzyna", "Piotr", "Maria", "Tomasz", "Agnieszka", "Paweł", "Magdalena", "Michał",
+               "Joanna", "Krzysztof", "Ewa", "Marcin", "Zofia", "Jakub", "Aleksandra", "Adam", "Monika", "Łukasz"]
+LAST_NAMES = ["Nowak", "Kowalski", "Wiśniewski", "Wójcik", "Kowalczyk", "Kamiński", "Lewandowski", "Zieliński",
+              "Szymański", "Woźniak", "Dąbrowski", "Kozłowski", "Jankowski", "Mazur", "Kwiatkowski", "Krawczyk"]
+
+ROOM_TYPES = ["single", "double", "suite", "deluxe"]
+ROOM_TYPE_WEIGHTS = [0.25, 0.45, 0.2, 0.1]
+BASE_PRICES = {"single": 220, "double": 320, "suite": 600, "deluxe": 850}
+
+STATUSES = ["confirmed", "pending", "cancelled"]
+STATUS_WEIGHTS = [0.7, 0.15, 0.15]
+
+# Obłożenie w sezonie letnim i zimowym (waga startu pobytu wg miesiąca)
+MONTH_WEIGHTS = [1.4, 1.3, 0.8, 0.8, 1.0, 1.5, 2.2, 2.3, 1.1, 0.8, 0.7, 1.3]
+
+ASCII = str.maketrans("ąćęłńóśźżĄĆĘŁŃÓŚŹŻ", "acelnoszzACELNOSZZ")
+
+
+def stay_length(rng):
+    # Krótkie pobyty są najczęstsze, długie rzadkie (1-21 nocy)
+    return min(21, 1 + int(rng.expovariate(1 / 3)))
+
+
+def seasonal_day(rng, start, days):
+    # Losowanie dnia z wagą miesiąca
+    while True:
+        day = start + datetime.timedelta(days=rng.randrange(days))
+        if rng.random() * max(MONTH_WEIGHTS) <= MONTH_WEIGHTS[day.month - 1]:
+            return day
+
+
+def generate(hotels, rooms_per_hotel, guests, reservations, seed, start_date, days):
+    rng = random.Random(seed)
+
+    # ===== Hotele i pokoje =====
+    hotel_docs = []
+    for i in range(hotels):
+        city = CITIES[i % len(CITIES)]
+        stars = rng.choices([2, 3, 4, 5], [0.15, 0.4, 0.3, 0.15])[0]
+        rooms = []
+        for r in range(rooms_per_hotel):
+            room_type = rng.choices(ROOM_TYPES, ROOM_TYPE_WEIGHTS)[0]
+            price = round(BASE_PRICES[room_type] * (0.6 + 0.2 * stars) * rng.uniform(0.85, 1.2) / 10) * 10
+            rooms.append({
+                "number": (r // 50 + 1) * 100 + r % 50 + 1,
+                "type": room_type,
+                "price": price,
+                "available": rng.random() < 0.7,
+            })
+        hotel_docs.append({
+            "name": f"Hotel {rng.choice(HOTEL_WORDS)} {city} {i + 1}",
+            "location": city,
+            "stars": stars,
+            "rooms": rooms,
+        })
+
+    # ===== Goście (unikalne adresy e-mail) =====
+    guest_docs = []
+    for i in range(guests):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        guest_docs.append({
+            "first_name": first,
+            "last_name": last,
+            "email": f"{first}.{last}.{i + 1}@example.com".lower().translate(ASCII),
+            "phone": "+48" + "".join(str(rng.randrange(10)) for _ in range(9)),
+        })
+
+    # ===== Rezerwacje bez nakładania się terminów w tym samym pokoju =====
+    occupied = {}
+    reservation_docs = []
+    for _ in range(reservations):
+        guest = rng.choice(guest_docs)
+        length = stay_length(rng)
+        status = rng.choices(STATUSES, STATUS_WEIGHTS)[0]
+        for attempt in range(20):
+            hotel = rng.choice(hotel_docs)
+            room = rng.choice(hotel["rooms"])
+            check_in = seasonal_day(rng, start_date, days - length)
+            offset = (check_in - start_date).days
+            booked = occupied.setdefault((hotel["name"], room["number"]), bytearray(days))
+            if status == "cancelled" or not any(booked[offset:offset + length]):
+                break
+        else:
+            # Pokój zajęty - rezerwacja zapisana jako anulowana
+            status = "cancelled"
+        if status != "cancelled":
+            booked[offset:offset + length] = b"\x01" * length
+        reservation_docs.append({
+            "guest_email": guest["email"],
+            "room_number": room["number"],
+            "hotel_name": hotel["name"],
+            "check_in": check_in,
+            "check_out": check_in + datetime.timedelta(days=length),
+            "status": status,
+        })
+    reservation_docs.sort(key=lambda r: r["check_in"])
+
+    return {"hotels": hotel_docs, "guests": guest_docs, "reservations": reservation_docs}
+
+
+def write(data, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as file:
+        if path.endswith(".json"):
+            json.dump(data, file, ensure_ascii=False, default=str)
+        else:
+            dumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+            yaml.dump(data, file, Dumper=dumper, allow_unicode=True, sort_keys=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generator danych testowych zgodnych ze schematem")
+    parser.add_argument("--hotels", type=int, default=100)
+    parser.add_argument("--rooms-per-hotel", type=int, default=50)
+    parser.add_argument("--guests", type=int, default=10_000)
+    parser.add_argument("--reservations", type=int, default=50_000)
+    parser.add_argument("--seed", type=int, default=42, help="to samo ziarno daje identyczny zbiór danych")
+    parser.add_argument("--start-date", type=datetime.date.fromisoformat, default=datetime.date(2025, 1, 1))
+    parser.add_argument("--days", type=int, default=365, help="zakres dat rezerwacji od --start-date")
+    parser.add_argument("--output", default="data/generated/hotel_data.yaml", help="plik .yaml lub .json")
+    args = parser.parse_args()
+
+    data = generate(args.hotels, args.rooms_per_hotel, args.guests, args.reservations, args.seed, args.start_date, args.days)
+    write(data, args.output)
+    print(f"✅ Wygenerowano {len(data['hotels'])} hoteli, {len(data['guests'])} gości "
+          f"i {len(data['reservations'])} rezerwacji: {args.output}")
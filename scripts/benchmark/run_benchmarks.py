@@ -0,0 +1,216 @@
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import runpy
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+import psutil
+from dotenv import load_dotenv
+
+from generate_data import generate, write
+
+# The API runs in-process; its modules live in the backend package
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(SCRIPTS_DIR, "..", "backend"))
+
+# Load environment variables from .env file
+load_dotenv()
+
+RESULTS_DIR = "data/benchmarks"
+QUERIES_SCRIPT = os.path.join(SCRIPTS_DIR, "queries.py")
+
+# Generator settings (hotels, rooms per hotel, guests, reservations)
+SIZES = {
+    "small": (20, 20, 1_000, 5_000),
+    "medium": (100, 50, 10_000, 50_000),
+    "large": (500, 100, 100_000, 500_000),
+}
+
+
+class PeakRSS:
+    """Samples the resident memory of this process and its workers while a benchmark runs."""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.process = psutil.Process()
+        self.peak = 0
+        self._stop = threading.Event()
+
+    def sample(self):
+        rss = self.process.memory_info().rss
+        for child in self.process.children(recursive=True):
+            with contextlib.suppress(psutil.Error):
+                rss += child.memory_info().rss
+        self.peak = max(self.peak, rss)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def __enter__(self):
+        self.sample()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.sample()
+
+
+def measure(name, run, repeat, documents=None, size=None):
+    runs = []
+    peak = 0
+    for _ in range(repeat):
+        with PeakRSS() as rss:
+            start = time.perf_counter()
+            run()
+            runs.append(time.perf_counter() - start)
+        peak = max(peak, rss.peak)
+
+    wall = statistics.median(runs)
+    result = {
+        "wall_seconds": round(wall, 4),
+        "runs": [round(r, 4) for r in runs],
+        "peak_rss_mb": round(peak / 1024 / 1024, 1),
+    }
+    if documents:
+        result["documents_per_second"] = round(documents / wall, 1)
+    if size:
+        result["megabytes_per_second"] = round(size / wall / 1024 / 1024, 2)
+    print(f"⏱️ {name}: {wall:.3f} s, szczyt RSS {result['peak_rss_mb']} MB")
+    return result
+
+
+def run_suite(client, dataset, repeat, queries=True):
+    """Run every benchmark against an API test client; return (dataset counts, results)."""
+    from app.cache import cache
+
+    with open(dataset, "rb") as file:
+        content = file.read()
+    size = len(content)
+
+    def post(path):
+        response = client.post(path, files={"file": (os.path.basename(dataset), content)})
+        response.raise_for_status()
+        return response
+
+    # Pierwszy import ładuje dane i podaje liczbę dokumentów
+    uploaded = post("/api/reservations/upload").json()
+    counts = {section: uploaded[f"{section}_count"] for section in ("hotels", "guests", "reservations")}
+    documents = sum(counts.values())
+
+    def get_data():
+        cache.clear()
+        client.get("/api/data").raise_for_status()
+
+    def get_occupancy():
+        # Roczny zakres w miesiącach dla każdego hotelu (tablice rezerwacji już wczytane)
+        cache.clear()
+        client.get("/api/analytics/occupancy?from=2025-01-01&to=2026-01-01&granularity=month&group_by=hotel").raise_for_status()
+
+    def search_guests():
+        # Wyszukiwanie po prefiksie imienia, nazwiska, e-maila i telefonu (indeks już zbudowany)
+        cache.clear()
+        for q in ("a", "nowak", "anna now", "+48 6"):
+            client.get("/api/guests/search", params={"q": q}).raise_for_status()
+
+    results = {
+        "upload": measure("upload", lambda: post("/api/reservations/upload"), repeat, documents, size),
+        "upload_stream": measure("upload_stream", lambda: post("/api/reservations/upload?stream=true"), repeat, documents, size),
+        "upload_delta_unchanged": measure("upload_delta_unchanged", lambda: post("/api/reservations/upload?mode=delta"), repeat, documents, size),
+        "api_data": measure("api_data", get_data, repeat, documents),
+        "api_data_cached": measure("api_data_cached", lambda: client.get("/api/data").raise_for_status(), repeat, documents),
+        "analytics_occupancy": measure("analytics_occupancy", get_occupancy, repeat, counts["reservations"]),
+        "guests_search": measure("guests_search", search_guests, repeat),
+        "yaml_to_csv": measure("yaml_to_csv", lambda: post("/api/yaml-to-csv"), repeat, documents, size),
+        "yaml_to_html": measure("yaml_to_html", lambda: post("/api/yaml-to-html"), repeat, documents, size),
+    }
+    if queries:
+        def run_queries():
+            with contextlib.redirect_stdout(io.StringIO()):
+                runpy.run_path(QUERIES_SCRIPT, run_name="__main__")
+        results["queries_py"] = measure("queries_py", run_queries, repeat)
+    return counts, results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(previous_path, report):
+    with open(previous_path, "r", encoding="utf-8") as file:
+        previous = json.load(file)
+    print(f"\n📊 Porównanie z {previous.get('commit')} ({previous_path}):")
+    for name, result in report["results"].items():
+        before = previous.get("results", {}).get(name)
+        if not before:
+            print(f"  - {name}: brak poprzedniego wyniku")
+            continue
+        ratio = result["wall_seconds"] / before["wall_seconds"] if before["wall_seconds"] else float("inf")
+        print(f"  - {name}: {before['wall_seconds']:.3f} s -> {result['wall_seconds']:.3f} s ({ratio:.2f}x), "
+              f"RSS {before['peak_rss_mb']} -> {result['peak_rss_mb']} MB")
+
+
+def main(args):
+    # Zbiór danych: podany plik albo wygenerowany deterministycznie z ziarna
+    dataset = args.dataset
+    if not dataset:
+        dataset = f"data/generated/benchmark-{args.size}-{args.seed}.yaml"
+        if not os.path.exists(dataset):
+            print(f"🔄 Generowanie zbioru {args.size}...")
+            write(generate(*SIZES[args.size], args.seed, datetime.date(2025, 1, 1), 365), dataset)
+
+    # Osobna baza, żeby benchmark nie nadpisał danych aplikacji
+    os.environ["DB_NAME"] = args.db_name
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    with TestClient(app) as client:
+        counts, results = run_suite(client, dataset, args.repeat, queries=not args.skip_queries)
+
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "dataset": {"path": dataset, "bytes": os.path.getsize(dataset), "seed": None if args.dataset else args.seed, "counts": counts},
+        "repeat": args.repeat,
+        "results": results,
+    }
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit or 'local'}-{report['created_at'][:19].replace(':', '')}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2, ensure_ascii=False)
+    print(f"\n✅ Wyniki zapisane: {output}")
+
+    if args.compare:
+        compare(args.compare, report)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark API i zapytań na danych syntetycznych")
+    parser.add_argument("--dataset", help="plik YAML; domyślnie generowany zbiór o rozmiarze --size")
+    parser.add_argument("--size", choices=list(SIZES), default="small")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=3, help="liczba powtórzeń (raportowana jest mediana)")
+    parser.add_argument("--db-name", default="hotel_reservations_benchmark", help="baza MongoDB używana przez benchmark")
+    parser.add_argument("--skip-queries", action="store_true", help="pomiń scripts/queries.py")
+    parser.add_argument("--output", help="plik wyników JSON")
+    parser.add_argument("--compare", help="poprzedni plik wyników do porównania")
+    main(parser.parse_args())
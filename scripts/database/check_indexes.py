@@ -0,0 +1,42 @@
+import asyncio
+import os
+import sys
+from dotenv import load_dotenv
+
+# Shared index definitions live in the backend package
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "backend"))
+from app.datasets import live_dataset
+from app.db import create_client, get_database
+from app.indexes import ensure_indexes, explain_known_queries
+
+
+async def check_indexes():
+    # Load environment variables
+    load_dotenv()
+
+    client = create_client()
+    try:
+        # Kolekcje żywej generacji (wskaźnik w dataset_meta)
+        db = await live_dataset(get_database(client))
+        print("🔄 Creating missing indexes...")
+        created = await ensure_indexes(db)
+        for collection, names in created.items():
+            print(f"  - {collection}: {', '.join(names)}")
+
+        print("\n🔍 Query plans:")
+        results = await explain_known_queries(db)
+        for result in results:
+            marker = "❌" if result["collscan"] else "✅"
+            print(f"{marker} {result['collection']}: {result['query']} -> {' > '.join(result['stages'])}")
+    finally:
+        await client.close()
+        print("\n🔌 Connection closed")
+
+    if any(result["collscan"] for result in results):
+        print("\n❌ Some queries fall back to COLLSCAN")
+        sys.exit(1)
+    print("\n✅ All known queries use indexes")
+
+
+if __name__ == "__main__":
+    asyncio.run(check_indexes())
@@ -3,8 +3,13 @@ import yaml
 from pymongo import MongoClient
 
 import os
+import sys
 from dotenv import load_dotenv
 
+# Shared dataset helpers live in the backend package
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "backend"))
+from app.datasets import live_collection
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -16,10 +21,18 @@ DB_NAME = os.getenv("DB_NAME")
 client = MongoClient(MONGO_URI)
 db = client[DB_NAME]
 
-# Pobierz dane z kolekcji
-hotels = list(db.hotels.find({}, {'_id': 0}))
-guests = list(db.guests.find({}, {'_id': 0}))
-reservations = list(db.reservations.find({}, {'_id': 0}))
+# Pobierz dane z kolekcji żywej generacji (wskaźnik w dataset_meta)
+hotels = list(live_collection(db, "hotels").find({}, {'_id': 0, '_key': 0, '_hash': 0}))
+guests = list(live_collection(db, "guests").find({}, {'_id': 0, '_key': 0, '_hash': 0}))
+reservations = list(live_collection(db, "reservations").find({}, {'_id': 0, '_key': 0, '_hash': 0}))
+
+# Pokoje z osobnej kolekcji (ROOMS_LAYOUT=normalized) wracają do dokumentów hoteli
+stored_rooms = {}
+for room in live_collection(db, "rooms").find({}, {'_id': 0}).sort([('hotel_name', 1), ('number', 1)]):
+    stored_rooms.setdefault(room.pop('hotel_name'), []).append(room)
+for hotel in hotels:
+    if 'rooms' not in hotel:
+        hotel['rooms'] = stored_rooms.get(hotel['name'], [])
 
 # Zbiorczy słownik
 data = {
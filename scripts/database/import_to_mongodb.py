@@ -1,37 +1,107 @@
+import argparse
+import asyncio
 import json
-from pymongo import MongoClient
+import sys
 import os
 from dotenv import load_dotenv
 
+# Shared dataset helpers live in the backend package
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "backend"))
+from app.datasets import SECTIONS, ImportLease, abort_import, begin_import, bump_generation, collect_garbage, live_dataset, promote
+from app.db import create_client, get_database
+from app.delta import DELTA_BATCH_SIZE, DeltaImport, fingerprint
+from app.indexes import ensure_indexes
+from app.rooms import ROOMS_LAYOUT, insert_hotels
+from app.stats import refresh_stats
+
 # Load environment variables from .env file
 load_dotenv()
 
-# Get MongoDB configuration from environment variables
-MONGO_URI = os.getenv("MONGO_URI")
-DB_NAME = os.getenv("DB_NAME")
 
-# Establish connection
-client = MongoClient(MONGO_URI)
-db = client[DB_NAME]
+async def import_full(db, data):
+    # Import danych do kolekcji tymczasowych nowej generacji
+    generation, staging = await begin_import(db)
+    lease = ImportLease(db, generation)
+    try:
+        for section in SECTIONS:
+            if not data[section]:
+                continue
+            await lease.renew()
+            documents = fingerprint(section, data[section])
+            if section == "hotels":
+                # Pokoje osobno w kolekcji rooms, jeśli ROOMS_LAYOUT=normalized
+                await insert_hotels(staging, documents)
+            else:
+                await staging[section].insert_many(documents, ordered=False)
+
+        # Statystyki hoteli zapisywane razem z danymi nowej generacji
+        await refresh_stats(staging)
+
+        # Budowa indeksów na kolekcjach tymczasowych
+        await ensure_indexes(db, staging)
+
+        # Podmiana kolekcji na żywe (poprzednia generacja zostaje do rollbacku)
+        await promote(db, generation)
+    except BaseException:
+        await abort_import(db, generation)
+        raise
+
+    # Usunięcie starszych generacji
+    await collect_garbage(db)
+    print(f"✅ Import zakończony pomyślnie (generacja {generation}, układ pokoi: {ROOMS_LAYOUT}).")
+
+
+async def import_delta(db, data):
+    # Porównanie skrótów dokumentów z danymi w bazie (kolekcje żywej generacji)
+    db = await live_dataset(db)
+    delta = DeltaImport(db)
+    sections = [section for section in SECTIONS if section in data]
+    for section in sections:
+        documents = data[section]
+        for start in range(0, len(documents), DELTA_BATCH_SIZE):
+            await delta.add(section, fingerprint(section, documents[start:start + DELTA_BATCH_SIZE]))
+
+    # Zapis tylko nowych, zmienionych i usuniętych dokumentów
+    counts = await delta.apply(sections)
+    for section in sections:
+        section_counts = counts[section]
+        print(f"📄 {section}: bez zmian {section_counts['unchanged']}, "
+              f"zapisane {section_counts['upserted']}, usunięte {section_counts['removed']}")
+
+    if not delta.changed:
+        print("✅ Brak zmian do zaimportowania.")
+        return
+
+    # Statystyki tylko dla zmienionych hoteli, przed nowym numerem generacji unieważniającym cache API
+    await refresh_stats(db, delta.touched_hotels)
+    generation = await bump_generation(db)
+    print(f"✅ Import przyrostowy zakończony pomyślnie (generacja {generation}).")
 
 
-# Kolekcje
-hotels_collection = db["hotels"]
-guests_collection = db["guests"]
-reservations_collection = db["reservations"]
+async def main(delta):
+    # Establish connection (pool settings as in the API)
+    client = create_client()
+    db = get_database(client)
 
-# Wczytanie danych JSON z pliku
-with open("data/processed/json_output.json", "r", encoding="utf-8") as file:
-    data = json.load(file)
+    # Wczytanie danych JSON z pliku
+    with open("data/processed/json_output.json", "r", encoding="utf-8") as file:
+        data = json.load(file)
 
-# Czyszczenie kolekcji (opcjonalne)
-hotels_collection.delete_many({})
-guests_collection.delete_many({})
-reservations_collection.delete_many({})
+    try:
+        if delta:
+            await import_delta(db, data)
+        else:
+            await import_full(db, data)
+    finally:
+        await client.close()
 
-# Import danych
-hotels_collection.insert_many(data["hotels"])
-guests_collection.insert_many(data["guests"])
-reservations_collection.insert_many(data["reservations"])
 
-print("✅ Import zakończony pomyślnie.")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import danych JSON do MongoDB")
+    parser.add_argument(
+        "--delta",
+        action="store_true",
+        help="zapisz tylko nowe, zmienione i usunięte dokumenty zamiast podmiany całej bazy",
+    )
+    args = parser.parse_args()
+    asyncio.run(main(args.delta))
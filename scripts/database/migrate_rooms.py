@@ -0,0 +1,47 @@
+import argparse
+import asyncio
+import sys
+import os
+from dotenv import load_dotenv
+
+# Shared dataset helpers live in the backend package
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "backend"))
+from app.datasets import live_dataset
+from app.db import create_client, get_database
+from app.indexes import ensure_indexes
+from app.rooms import LAYOUTS, migrate
+
+# Load environment variables from .env file
+load_dotenv()
+
+
+async def main(layout):
+    # Establish connection (pool settings as in the API)
+    client = create_client()
+
+    try:
+        # Migracja działa na kolekcjach żywej generacji
+        db = await live_dataset(get_database(client))
+
+        # Indeksy kolekcji rooms przed przeniesieniem pokoi
+        await ensure_indexes(db)
+
+        # Przeniesienie pokoi partiami hoteli; ponowne uruchomienie dokończy przerwaną migrację
+        moved = await migrate(db, layout)
+    finally:
+        await client.close()
+
+    print(f"✅ Migracja do układu {layout}: {moved['hotels']} hoteli, {moved['rooms']} pokoi.")
+    print(f"ℹ️ Ustaw ROOMS_LAYOUT={layout}, aby kolejne importy zapisywały dane w tym układzie.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migracja pokoi między dokumentami hoteli a kolekcją rooms")
+    parser.add_argument(
+        "--to",
+        choices=list(LAYOUTS),
+        default="normalized",
+        help="normalized: osobna, indeksowana kolekcja rooms; embedded: pokoje w tablicy rooms hotelu",
+    )
+    args = parser.parse_args()
+    asyncio.run(main(args.to))
@@ -0,0 +1,45 @@
+import argparse
+import asyncio
+import sys
+import os
+from dotenv import load_dotenv
+
+# Shared dataset helpers live in the backend package
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "backend"))
+from app.columnar import FORMATS, export_tables
+from app.datasets import live_dataset
+from app.db import create_client, get_database
+
+# Load environment variables from .env file
+load_dotenv()
+
+OUTPUT_DIR = "data/processed/columnar"
+
+
+async def main(format):
+    # Establish connection (pool settings as in the API)
+    client = create_client()
+
+    try:
+        # Kolekcje żywej generacji (wskaźnik w dataset_meta)
+        db = await live_dataset(get_database(client))
+
+        # Eksport pokoi, gości i rezerwacji do plików kolumnowych, partiami z kursorów MongoDB
+        written = await export_tables(db, OUTPUT_DIR, format)
+    finally:
+        await client.close()
+
+    for table, (path, rows) in written.items():
+        print(f"✅ Eksport {table} ({rows} wierszy): {path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Eksport danych z MongoDB do plików Arrow IPC lub Parquet")
+    parser.add_argument(
+        "--format",
+        choices=list(FORMATS),
+        default="arrow",
+        help="arrow: pliki do mapowania w pamięci (bez kopiowania), parquet: pliki skompresowane",
+    )
+    args = parser.parse_args()
+    asyncio.run(main(args.format))
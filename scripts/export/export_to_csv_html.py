@@ -1,8 +1,13 @@
 from pymongo import MongoClient
 import pandas as pd
 import os
+import sys
 from dotenv import load_dotenv
 
+# Shared dataset helpers live in the backend package
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "backend"))
+from app.datasets import live_collection
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -15,22 +20,26 @@ client = MongoClient(MONGO_URI)
 db = client[DB_NAME]
 
 # ===== Eksport rezerwacji do CSV =====
-reservations = list(db["reservations"].find({}, {"_id": 0}))
+reservations = list(live_collection(db, "reservations").find({}, {"_id": 0, "_key": 0, "_hash": 0}))
 df_res = pd.DataFrame(reservations)
 df_res.to_csv("data/processed/export_reservations.csv", index=False)
 print("✅ Eksport rezerwacji do CSV: export_reservations.csv")
 
 # ===== Eksport gości do HTML =====
-guests = list(db["guests"].find({}, {"_id": 0}))
+guests = list(live_collection(db, "guests").find({}, {"_id": 0, "_key": 0, "_hash": 0}))
 df_guests = pd.DataFrame(guests)
 df_guests.to_html("data/processed/export_guests.html", index=False)
 print("✅ Eksport gości do HTML: export_guests.html")
 
 # ===== Eksport pokoi (wszystkich) do CSV =====
-hotels = list(db["hotels"].find({}, {"_id": 0}))
+hotels = list(live_collection(db, "hotels").find({}, {"_id": 0, "_key": 0, "_hash": 0}))
+# Hotele bez tablicy rooms mają pokoje w osobnej kolekcji (ROOMS_LAYOUT=normalized)
+stored_rooms = {}
+for room in live_collection(db, "rooms").find({}, {"_id": 0}).sort([("hotel_name", 1), ("number", 1)]):
+    stored_rooms.setdefault(room.pop("hotel_name"), []).append(room)
 rooms_data = []
 for hotel in hotels:
-    for room in hotel["rooms"]:
+    for room in hotel.get("rooms", stored_rooms.get(hotel["name"], [])):
         room["hotel_name"] = hotel["name"]
         room["location"] = hotel["location"]
         rooms_data.append(room)
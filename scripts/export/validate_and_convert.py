@@ -1,7 +1,14 @@
+import argparse
+import os
+import sys
 import yaml
 import json
 import datetime
-from jsonschema import validate, ValidationError
+
+# Shared validation and conflict checks live in the backend package
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "backend"))
+from app.conflicts import ConflictChecker
+from app.validation import validate_dataset
 
 def convert_dates(obj):
     if isinstance(obj, dict):
@@ -13,25 +20,66 @@ def convert_dates(obj):
     else:
         return obj
 
-# Wczytanie YAML
-with open("data/raw/hotel_data.yaml", "r", encoding="utf-8") as file:
-    yaml_data = yaml.safe_load(file)
+def validate_and_convert(on_conflict):
+    # Wczytanie YAML
+    with open("data/raw/hotel_data.yaml", "r", encoding="utf-8") as file:
+        yaml_data = yaml.safe_load(file)
+
+    # Konwersja dat na stringi ISO
+    yaml_data = convert_dates(yaml_data)
 
-# Konwersja dat na stringi ISO
-yaml_data = convert_dates(yaml_data)
+    # Walidacja (schemat kompilowany raz, wszystkie błędy rekord po rekordzie)
+    missing = [section for section in ("hotels", "guests", "reservations") if section not in yaml_data]
+    errors = validate_dataset(yaml_data)
+    if missing or errors:
+        print("❌ Błąd walidacji:")
+        for section in missing:
+            print(f"  - /: brak sekcji '{section}'")
+        for error in errors:
+            print(f"  - {error['path']}: {error['message']}")
+    else:
+        print("✅ YAML poprawnie zwalidowany!")
 
-# Wczytanie JSON Schema
-with open("data/schema/hotel_reservation_schema.json", "r", encoding="utf-8") as file:
-    schema = json.load(file)
+    # Kontrola spójności rezerwacji (podwójne rezerwacje, brakujące odwołania)
+    reservations = yaml_data.get("reservations") or []
+    checker = ConflictChecker()
+    checker.add_hotels(yaml_data.get("hotels") or [])
+    if yaml_data.get("guests"):
+        # Powtórzone adresy e-mail są zgłaszane i pomijane, jak przy uploadzie przez API
+        yaml_data["guests"] = checker.add_guests(yaml_data["guests"])
+    checker.add_reservations({**reservation, "_id": index} for index, reservation in enumerate(reservations))
+    conflicts = checker.check()
+
+    if conflicts["total"]:
+        print(f"⚠️ Znaleziono konflikty rezerwacji: {conflicts['total']}")
+        for check, entries in conflicts.items():
+            if isinstance(entries, list):
+                for entry in entries:
+                    print(f"  - {check}: {entry}")
+        if on_conflict == "reject":
+            print("❌ Konwersja przerwana z powodu konfliktów.")
+            sys.exit(1)
+        if on_conflict == "quarantine":
+            reasons = checker.offending(conflicts)
+            quarantined = [{**reservations[i], "quarantine": {"reasons": reasons[i]}} for i in sorted(reasons)]
+            yaml_data["reservations"] = [r for i, r in enumerate(reservations) if i not in reasons]
+            with open("data/processed/quarantine.json", "w", encoding="utf-8") as file:
+                json.dump(quarantined, file, indent=2, ensure_ascii=False)
+            print(f"🚧 Przeniesiono {len(quarantined)} rezerwacji do quarantine.json")
+    else:
+        print("✅ Brak konfliktów rezerwacji.")
 
-# Walidacja
-try:
-    validate(instance=yaml_data, schema=schema)
-    print("✅ YAML poprawnie zwalidowany!")
-except ValidationError as e:
-    print("❌ Błąd walidacji:")
-    print(e)
+    # Zapis do JSON
+    with open("data/processed/json_output.json", "w", encoding="utf-8") as file:
+        json.dump(yaml_data, file, indent=2, ensure_ascii=False)
 
-# Zapis do JSON
-with open("data/processed/json_output.json", "w", encoding="utf-8") as file:
-    json.dump(yaml_data, file, indent=2, ensure_ascii=False)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Walidacja YAML i konwersja do JSON")
+    parser.add_argument(
+        "--on-conflict",
+        choices=["report", "reject", "quarantine"],
+        default="report",
+        help="co zrobić z rezerwacjami w konflikcie (nakładające się terminy, nieistniejący gość/hotel/pokój)",
+    )
+    args = parser.parse_args()
+    validate_and_convert(args.on_conflict)
@@ -1,7 +1,12 @@
 from pymongo import MongoClient
 import os
+import sys
 from dotenv import load_dotenv
 
+# Shared dataset helpers live in the backend package
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from app.datasets import live_collection
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -14,31 +19,50 @@ client = MongoClient(MONGO_URI)
 db = client[DB_NAME]
 
 
-hotels = db["hotels"]
-guests = db["guests"]
-reservations = db["reservations"]
+# Kolekcje żywej generacji (wskaźnik w dataset_meta)
+hotels = live_collection(db, "hotels")
+guests = live_collection(db, "guests")
+reservations = live_collection(db, "reservations")
+rooms = live_collection(db, "rooms")
+
+# Układ wykrywany per hotel jak w API: hotel bez pola rooms ma pokoje w kolekcji rooms
+# (obie postaci współistnieją np. w trakcie migracji)
+normalized = {hotel["name"]: hotel.get("location") for hotel in hotels.find({"rooms": {"$exists": False}}, {"name": 1, "location": 1})}
+normalized_rooms = {"hotel_name": {"$in": list(normalized)}}
 
 # 1. Lista dostępnych pokoi
 print("\nDostępne pokoje:")
-for hotel in hotels.find():
+for hotel in hotels.find({"rooms": {"$exists": True}}):
     print(f"\n🏨 {hotel['name']} ({hotel['location']})")
-    for room in hotel.get("rooms", []):
+    for room in hotel.get("rooms") or []:
         if room.get("available"):
             print(f"  - Pokój {room['number']} | Typ: {room['type']} | Cena: {room['price']} zł")
+# Skan zakresu indeksu available_price zamiast przeglądania wszystkich hoteli
+current_hotel = None
+for room in rooms.find({"available": True, **normalized_rooms}).sort([("hotel_name", 1), ("number", 1)]):
+    if room["hotel_name"] != current_hotel:
+        current_hotel = room["hotel_name"]
+        print(f"\n🏨 {current_hotel} ({normalized.get(current_hotel)})")
+    print(f"  - Pokój {room['number']} | Typ: {room['type']} | Cena: {room['price']} zł")
 
 # 2. Średnia cena pokoi w hotelach
 print("\nŚrednia cena pokoi w hotelach:")
-pipeline = [
+embedded_pipeline = [
     {"$unwind": "$rooms"},
     {
         "$group": {
             "_id": "$name",
             "average_price": {"$avg": "$rooms.price"}
         }
-    },
-    {"$sort": {"_id": 1}}
+    }
 ]
-for result in hotels.aggregate(pipeline):
+# Bez $unwind - jeden dokument na pokój
+normalized_pipeline = [
+    {"$match": normalized_rooms},
+    {"$group": {"_id": "$hotel_name", "average_price": {"$avg": "$price"}}}
+]
+results = list(hotels.aggregate(embedded_pipeline)) + list(rooms.aggregate(normalized_pipeline))
+for result in sorted(results, key=lambda result: result["_id"]):
     print(f"{result['_id']}: Średnia cena = {round(result['average_price'], 2)} zł")
 
 # 3. Rezerwacje danego gościa
@@ -62,6 +86,14 @@ for result in reservations.aggregate(pipeline):
 
 # 5. Liczba dostępnych pokoi w każdym hotelu
 print("\nDostępność pokoi:")
-for hotel in hotels.find():
-    available_rooms = [r for r in hotel.get("rooms", []) if r.get("available")]
-    print(f"{hotel['name']} – dostępnych pokoi: {len(available_rooms)}")
+pipeline = [
+    {"$match": {"available": True, **normalized_rooms}},
+    {"$group": {"_id": "$hotel_name", "count": {"$sum": 1}}}
+]
+available_counts = {result["_id"]: result["count"] for result in rooms.aggregate(pipeline)}
+for hotel in hotels.find({}, {"name": 1, "rooms": 1}):
+    if "rooms" in hotel:
+        available = len([r for r in hotel["rooms"] or [] if r.get("available")])
+    else:
+        available = available_counts.get(hotel["name"], 0)
+    print(f"{hotel['name']} – dostępnych pokoi: {available}")
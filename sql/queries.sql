@@ -60,3 +60,25 @@ db.reservations.aggregate([
   { $sort: { _id: 1 } }
 ]);
 
+
+// Normalized layout (ROOMS_LAYOUT=normalized): one document per room, no $unwind
+
+db.rooms.find(
+  { "available": true },
+  { "_id": 0, "hotel_name": 1, "number": 1, "type": 1, "price": 1 }
+).sort({ "hotel_name": 1, "number": 1 });
+
+db.rooms.aggregate([
+  { 
+    $group: {
+      _id: "$hotel_name",
+      average_price: { $avg: "$price" }
+    }
+  },
+  { $sort: { _id: 1 } }
+]);
+
+db.rooms.find(
+  { "available": true, "price": { $gte: 200, $lte: 500 } },
+  { "_id": 0 }
+).sort({ "price": 1 });